@@ -0,0 +1,129 @@
+"""Crawl repartido (cola_trabajos.py) con varios trabajadores contra el servidor falso local.
+
+Uso:
+    python benchmarks/bench_distribuido.py --trabajadores 4 --medicamentos 40
+    python benchmarks/bench_distribuido.py --trabajadores 3 --matar 1 --lease 3
+
+Encola los medicamentos del servidor falso, arranca N procesos trabajadores (cada uno con
+su propio limitador por host) y el coordinador que fusiona los resultados. Con `--matar`
+se mata ese número de trabajadores a mitad de lote para comprobar que sus trabajos
+vuelven a la cola al caducar el lease. Al final se comprueba que medicamentos.db tiene
+una fila por medicamento.
+
+Antes del crawl se comprueba (sin red) que un trabajo cuyo trabajador muere en el último
+intento acaba fallido en vez de dejar la cola sin terminar para siempre.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_server import FakeDrugSite, FakeSiteConfig, nombres_medicamentos  # noqa: E402
+
+
+def comprobar_intentos_agotados(directorio: str):
+    """Trabajador muerto en el último intento (lease caducado o huérfano): el trabajo falla"""
+    from cola_trabajos import ColaTrabajos
+    from lista_trabajo import EntradaTrabajo
+
+    cola = ColaTrabajos(os.path.join(directorio, "agotados.db"), lease_segundos=0.05, max_intentos=2)
+    try:
+        cola.encolar("comprehensive", [EntradaTrabajo("lease"), EntradaTrabajo("huerfano")])
+        cola.reclamar("vm:1", "comprehensive", 2)
+        cola.fallar("comprehensive", "lease", "vm:1", "sin datos")
+        cola.fallar("comprehensive", "huerfano", "vm:1", "sin datos")
+        cola.reclamar("vm:1", "comprehensive", 2)
+        # "huerfano": su trabajador es un proceso muerto de esta máquina
+        with cola.conn:
+            cola.conn.execute("UPDATE trabajos SET trabajador = ?, lease_hasta = 9e12 WHERE medicamento = 'huerfano'",
+                              (f"{socket.gethostname()}:{2 ** 22 + 1}",))
+        assert cola.liberar_huerfanos() == 1
+        time.sleep(0.1)
+        assert cola.reclamar("vm:2", "comprehensive", 2) == []
+        assert cola.stats("comprehensive") == {"failed": 2}, cola.stats("comprehensive")
+        assert cola.terminada("comprehensive")
+    finally:
+        cola.close()
+    print("✅ Trabajos con los intentos agotados: fallidos, la cola termina")
+
+
+def _trabajador(argv):
+    import cola_trabajos
+    cola_trabajos.main(argv)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trabajadores", type=int, default=4)
+    parser.add_argument("--medicamentos", type=int, default=40)
+    parser.add_argument("--lote", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=2, help="Medicamentos en paralelo por trabajador")
+    parser.add_argument("--host-rate", type=float, default=1000, help="Ritmo inicial de cada trabajador")
+    parser.add_argument("--lease", type=float, default=5)
+    parser.add_argument("--matar", type=int, default=0, help="Trabajadores a matar a mitad del crawl")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--page-kb", type=float, default=20)
+    args = parser.parse_args()
+
+    sitio = FakeDrugSite(FakeSiteConfig(latency_ms=args.latency_ms, page_kb=args.page_kb,
+                                        medicamentos=args.medicamentos))
+    sitio.start()
+    nombres = nombres_medicamentos(args.medicamentos)
+    contexto = multiprocessing.get_context("spawn")
+
+    try:
+        with tempfile.TemporaryDirectory() as directorio:
+            comprobar_intentos_agotados(directorio)
+            lista = os.path.join(directorio, "lista.csv")
+            with open(lista, "w") as f:
+                f.write("nombre\n" + "\n".join(nombres) + "\n")
+            comunes = ["--scraper", "comprehensive", "--cola", os.path.join(directorio, "cola.db"),
+                       "--lease", str(args.lease)]
+            db_path = os.path.join(directorio, "medicamentos.db")
+            _trabajador(["coordinador", *comunes, "--db", db_path, "--lista", lista, "--solo-encolar"])
+
+            inicio = time.perf_counter()
+            procesos = []
+            for i in range(args.trabajadores):
+                argv = ["trabajador", *comunes, "--lote", str(args.lote), "--workers", str(args.workers),
+                        "--host-rate", str(args.host_rate), "--max-host-rate", str(max(args.host_rate, 2.0)),
+                        "--parse-workers", "0", "--espera", "0.5", "--base-url", sitio.base_url,
+                        "--rate-state", os.path.join(directorio, f"rate_state_{i}.json")]
+                proceso = contexto.Process(target=_trabajador, args=(argv,))
+                proceso.start()
+                procesos.append(proceso)
+
+            if args.matar:
+                # A mitad de lote: los trabajos reservados quedan en curso hasta que caduque el lease
+                time.sleep(1.5)
+                for proceso in procesos[:args.matar]:
+                    os.kill(proceso.pid, signal.SIGKILL)
+                print(f"💀 {args.matar} trabajadores matados")
+
+            _trabajador(["coordinador", *comunes, "--db", db_path, "--lista", lista, "--intervalo", "0.5"])
+            for proceso in procesos:
+                proceso.join()
+            segundos = time.perf_counter() - inicio
+
+            conn = sqlite3.connect(db_path)
+            filas = conn.execute("SELECT COUNT(*) FROM medicamentos").fetchone()[0]
+            conn.close()
+    finally:
+        sitio.stop()
+
+    print(f"🧪 {args.trabajadores} trabajadores: {filas}/{len(nombres)} medicamentos fusionados "
+          f"en {segundos:.1f} s ({sitio.servidas()} páginas servidas)")
+    if filas != len(nombres):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
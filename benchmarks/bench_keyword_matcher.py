@@ -0,0 +1,182 @@
+"""Micro-benchmark: motor de palabras clave vs. búsqueda patrón por patrón.
+
+Uso:
+    python benchmarks/bench_keyword_matcher.py --pages ruta/a/paginas_guardadas
+Sin --pages se generan páginas sintéticas con el vocabulario de e-lactancia
+(--densidad = fracción de palabras que son términos médicos).
+También mide, como referencia, una regex con alternancia de todas las palabras.
+"""
+import argparse
+import glob
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from elactancia_embarazo_scraper import (  # noqa: E402
+    ELactanciaEmbarazoScraper, KEYWORDS_EMBARAZO, KEYWORDS_MEDICOS, KEYWORDS_RECOMENDACIONES,
+    MOTOR_EMBARAZO, PATRONES_RIESGO
+)
+from parsed_page import ParsedPage  # noqa: E402
+
+VOCABULARIO = (
+    "the drug pregnancy embarazo risk riesgo compatible fetal maternal trimester first second third "
+    "safe seguro primer trimestre avoid evitar caution alternative recommend instead low very high "
+    "moderate probably use with contraindicated contraindicado bajo alto muy paracetamol gestation "
+    "prenatal teratogenic"
+).split()
+NEUTRAS = (
+    "the of and in to is a for with this that by on are be as from at its was or an not have has "
+    "which were these their but been other than can may into more also after only such there when "
+    "breastfeeding lactancia milk leche dose dosis infant lactante plasma levels hours study cases"
+).split()
+
+
+# Implementación anterior (una búsqueda por patrón / palabra), como referencia
+def legacy_es_pagina_valida(contenido, nombre):
+    menciones = contenido.count(nombre.lower())
+    return menciones >= 1 and sum(1 for k in KEYWORDS_MEDICOS if k in contenido) >= 3
+
+
+def legacy_nivel_riesgo(contenido):
+    for patron, nivel in PATRONES_RIESGO:
+        if re.search(patron, contenido):
+            return nivel
+    return None
+
+
+def legacy_trimestres(contenido):
+    trimestres = {'trimestre 1': False, 'trimestre 2': False, 'trimestre 3': False}
+    patrones = [
+        r'first trimester.*safe', r'primer trimestre.*seguro', r'second trimester.*safe',
+        r'segundo trimestre.*seguro', r'third trimester.*safe', r'tercer trimestre.*seguro',
+        r'safe.*first trimester', r'seguro.*primer trimestre'
+    ]
+    for patron in patrones:
+        if re.search(patron, contenido):
+            if 'first' in patron or 'primer' in patron:
+                trimestres['trimestre 1'] = True
+            elif 'second' in patron or 'segundo' in patron:
+                trimestres['trimestre 2'] = True
+            elif 'third' in patron or 'tercer' in patron:
+                trimestres['trimestre 3'] = True
+    seguros = [t for t, seguro in trimestres.items() if seguro]
+    return ', '.join(seguros) if seguros else None
+
+
+def legacy_parrafos(texto, separador, keywords, minimo, minimo_limpio, corte, limite, union):
+    resultado = []
+    for parrafo in texto.split(separador):
+        parrafo = parrafo.strip()
+        if len(parrafo) > minimo:
+            for keyword in keywords:
+                if keyword.lower() in parrafo.lower():
+                    limpio = re.sub(r'\s+', ' ', parrafo)
+                    if len(limpio) > minimo_limpio:
+                        resultado.append(limpio[:corte])
+                    break
+    return union.join(resultado[:limite]) if resultado else None
+
+
+def legacy_extraer(texto, nombre):
+    contenido = texto.lower()
+    return (
+        legacy_es_pagina_valida(contenido, nombre),
+        legacy_nivel_riesgo(contenido),
+        legacy_parrafos(texto, '\n', KEYWORDS_EMBARAZO, 100, 150, 400, 3, ' || '),
+        legacy_trimestres(contenido),
+        legacy_parrafos(texto, '.', KEYWORDS_RECOMENDACIONES, 50, 80, 250, 2, ' | '),
+    )
+
+
+def nuevo_extraer(scraper, pagina, nombre):
+    return (
+        scraper.es_pagina_valida(pagina, nombre),
+        scraper.extraer_nivel_riesgo(pagina),
+        scraper.extraer_detalles_embarazo(pagina),
+        scraper.extraer_trimestres_seguros(pagina),
+        scraper.extraer_recomendaciones(pagina),
+    )
+
+
+def pagina_sintetica(seed, densidad, parrafos=300):
+    rnd = random.Random(seed)
+    partes = ['<html><body><h1>Paracetamol</h1>']
+    for _ in range(parrafos):
+        palabras = (rnd.choice(VOCABULARIO if rnd.random() < densidad else NEUTRAS)
+                    for _ in range(rnd.randint(8, 60)))
+        frase = ' '.join(palabras)
+        partes.append(f'<p>{frase}.</p>\n')
+    partes.append('</body></html>')
+    return ''.join(partes)
+
+
+def cargar_paginas(ruta, densidad=0.1):
+    if not ruta:
+        return [pagina_sintetica(seed, densidad) for seed in range(20)]
+    paginas = []
+    for fichero in sorted(glob.glob(os.path.join(ruta, '*.htm*'))):
+        with open(fichero, encoding='utf-8', errors='replace') as f:
+            paginas.append(f.read())
+    return paginas
+
+
+def medir(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', help="Directorio con páginas HTML guardadas de e-lactancia")
+    parser.add_argument('--nombre', default='paracetamol', help="Medicamento para la comprobación de validez")
+    parser.add_argument('--densidad', type=float, default=0.1)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    paginas = cargar_paginas(args.pages, args.densidad)
+    if not paginas:
+        sys.exit(f"No hay páginas HTML en {args.pages}")
+
+    scraper = ELactanciaEmbarazoScraper()
+    parseadas = [ParsedPage(html) for html in paginas]
+    textos = [pagina.text for pagina in parseadas]
+
+    def pagina_fresca(parseada):
+        # Reutiliza el parseo para medir solo la extracción
+        pagina = ParsedPage(parseada.html)
+        pagina.__dict__.update(soup=parseada.soup, text=parseada.text)
+        return pagina
+
+    for parseada, texto in zip(parseadas, textos):
+        esperado = legacy_extraer(texto, args.nombre)
+        obtenido = nuevo_extraer(scraper, pagina_fresca(parseada), args.nombre)
+        assert esperado == obtenido, f"Resultados distintos:\n{esperado}\n{obtenido}"
+
+    legacy = medir(lambda: [legacy_extraer(t, args.nombre) for t in textos], args.repeticiones)
+    nuevo = medir(lambda: [nuevo_extraer(scraper, pagina_fresca(p), args.nombre) for p in parseadas],
+                  args.repeticiones)
+
+    # Referencia: palabras presentes con una única regex de alternancia
+    alternancia = re.compile('|'.join(re.escape(k) for k in sorted(MOTOR_EMBARAZO.keywords, key=len, reverse=True)))
+    minusculas = [t.lower() for t in textos]
+    regex = medir(lambda: [set(alternancia.findall(t)) for t in minusculas], args.repeticiones)
+    motor = medir(lambda: [MOTOR_EMBARAZO.found(t) for t in minusculas], args.repeticiones)
+
+    n = len(paginas)
+    total_kb = sum(len(t) for t in textos) / 1024
+    print(f"📄 {n} páginas, {total_kb:.0f} KB de texto")
+    print(f"🐢 Extracción patrón por patrón: {legacy / n * 1000:.3f} ms/página")
+    print(f"🚀 Extracción con el motor:      {nuevo / n * 1000:.3f} ms/página")
+    print(f"📈 Aceleración: x{legacy / nuevo:.2f}")
+    print(f"🔎 Palabras presentes (validez + riesgo): motor {motor / n * 1000:.3f} ms/página, "
+          f"regex de alternancia {regex / n * 1000:.3f} ms/página")
+
+
+if __name__ == "__main__":
+    main()
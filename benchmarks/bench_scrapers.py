@@ -0,0 +1,219 @@
+"""Benchmark de extremo a extremo de los scrapers contra el servidor falso local.
+
+Uso:
+    python benchmarks/bench_scrapers.py --medicamentos 40 --latency-ms 50 --page-kb 40
+    python benchmarks/bench_scrapers.py --solo comprehensive,fda --p429 0.02 --json resultados.json
+
+Cada scraper se ejecuta en un proceso nuevo (para medir su pico de RSS por separado)
+contra benchmarks/fake_server.py, con su base de datos en un directorio temporal.
+Por scraper se informa: páginas/s, ms de parseo por página (medidos aparte, sobre las
+mismas páginas sin red), filas escritas por segundo y pico de RSS.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_server import (  # noqa: E402
+    FakeDrugSite, FakeSiteConfig, nombres_medicamentos, pagina_elactancia, pagina_fda, pagina_ficha_drugs
+)
+
+SCRAPERS = ["comprehensive", "elactancia_embarazo", "fda", "drugs_pregnancy"]
+
+
+def _filas(db_path: str) -> int:
+    if not os.path.exists(db_path):
+        return 0
+    conn = sqlite3.connect(db_path)
+    try:
+        return sum(conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+                   for tabla in ("medicamentos", "evidencias"))
+    finally:
+        conn.close()
+
+
+def _ms_por_pagina(parsear, paginas, repeticiones: int = 3) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for pagina in paginas:
+            parsear(pagina)
+    return (time.perf_counter() - inicio) * 1000 / (repeticiones * len(paginas))
+
+
+def bench_comprehensive(base_url, args, db_path):
+    from comprehensive_scraper import ComprehensiveMedScraper
+    from parsed_page import ParsedPage
+
+    # Ritmo adaptativo desde un techo alto y sin estado guardado: mide el scraper, no el límite
+    scraper = ComprehensiveMedScraper(db_path=db_path, workers=args.workers, host_rate=args.host_rate,
+                                      base_url=base_url, max_host_rate=1000, rate_state_path=None,
+                                      parse_workers=args.parse_workers)
+    scraper.logger.setLevel("WARNING")
+    nombres = nombres_medicamentos(args.medicamentos)
+    scraper.medications = nombres
+    inicio = time.perf_counter()
+    asyncio.run(scraper.run_comprehensive_scraping())
+    segundos = time.perf_counter() - inicio
+
+    def parsear(html):
+        page = ParsedPage(html)
+        scraper.extract_fda_category(page)
+        scraper.extract_pregnancy_info(page)
+
+    paginas = [pagina_ficha_drugs(nombre, args.page_kb) for nombre in nombres[:20]]
+    return segundos, _ms_por_pagina(parsear, paginas)
+
+
+def bench_elactancia_embarazo(base_url, args, db_path):
+    from elactancia_embarazo_scraper import ELactanciaEmbarazoScraper
+    from parsed_page import ParsedPage
+    from rate_limiter import HostRateLimiter
+
+    # Con limitador las pausas fijas entre búsquedas y medicamentos desaparecen
+    scraper = ELactanciaEmbarazoScraper(db_path=db_path, limiter=HostRateLimiter(rate=1000, burst=10),
+                                        base_url=base_url, workers=args.workers, parse_workers=args.parse_workers)
+    scraper.logger.setLevel("WARNING")
+    nombres = nombres_medicamentos(args.medicamentos)
+    scraper.medications = {nombre: nombre + "es" for nombre in nombres}
+    inicio = time.perf_counter()
+    asyncio.run(scraper.run_embarazo_scraping())
+    segundos = time.perf_counter() - inicio
+
+    def parsear(html):
+        pagina = ParsedPage(html)
+        if scraper.es_pagina_valida(pagina, "med"):
+            scraper.extraer_info_embarazo(pagina, "med", "", "inglés")
+
+    paginas = [pagina_elactancia(nombre, args.page_kb) for nombre in nombres[:20]]
+    return segundos, _ms_por_pagina(parsear, paginas)
+
+
+def bench_fda(base_url, args, db_path):
+    from fda_orange_book_scraper import FDAOrangeBookScraper
+    from http_client import sesion_async
+
+    scraper = FDAOrangeBookScraper(base_url=base_url + "/scripts/cder/ob")
+    nombres = nombres_medicamentos(args.medicamentos)
+
+    async def buscar_todos():
+        async with sesion_async(limite=args.workers, limite_por_host=args.workers) as session:
+            await asyncio.gather(*(scraper.buscar_medicamento_fda_async(session, n) for n in nombres))
+
+    inicio = time.perf_counter()
+    asyncio.run(buscar_todos())
+    segundos = time.perf_counter() - inicio
+
+    paginas = [pagina_fda(nombre) for nombre in nombres[:20]]
+    return segundos, _ms_por_pagina(lambda html: scraper._parsear_fda_response(html, "med"), paginas)
+
+
+def bench_drugs_pregnancy(base_url, args, db_path):
+    import elactancia_scraper
+
+    directorio = os.path.dirname(db_path)
+    inicio = time.perf_counter()
+    elactancia_scraper.main(reiniciar=True, base_url=base_url, db_path=db_path,
+                            frontier_path=os.path.join(directorio, "frontier.db"), pausa=0)
+    segundos = time.perf_counter() - inicio
+
+    paginas = [pagina_ficha_drugs(nombre, args.page_kb) for nombre in nombres_medicamentos(20)]
+    return segundos, _ms_por_pagina(elactancia_scraper.parse_medication_html, paginas)
+
+
+def _ejecutar(nombre, base_url, args, db_path, salida):
+    """Proceso hijo: ejecutar un scraper y devolver sus medidas"""
+    segundos, parse_ms = globals()[f"bench_{nombre}"](base_url, args, db_path)
+    salida.put({
+        "segundos": segundos,
+        "parse_ms": parse_ms,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+
+
+def medir(nombre, sitio, args):
+    with tempfile.TemporaryDirectory() as directorio:
+        db_path = os.path.join(directorio, "medicamentos.db")
+        contexto = multiprocessing.get_context("spawn")
+        salida = contexto.Queue()
+        servidas_antes = sitio.servidas()
+        errores_antes = sum(n for estado, n in sitio.estados.items() if estado != 200)
+
+        proceso = contexto.Process(target=_ejecutar, args=(nombre, sitio.base_url, args, db_path, salida))
+        proceso.start()
+        medidas = salida.get()
+        proceso.join()
+
+        paginas = sitio.servidas() - servidas_antes
+        errores = sum(n for estado, n in sitio.estados.items() if estado != 200) - errores_antes
+        filas = _filas(db_path)
+
+    segundos = medidas["segundos"]
+    return {
+        "scraper": nombre,
+        "paginas": paginas,
+        "errores_http": errores,
+        "segundos": round(segundos, 3),
+        "paginas_s": round(paginas / segundos, 2) if segundos else 0,
+        "parse_ms_pagina": round(medidas["parse_ms"], 3),
+        "filas": filas,
+        "filas_s": round(filas / segundos, 2) if segundos else 0,
+        "pico_rss_mb": round(medidas["rss_mb"], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--solo", default=",".join(SCRAPERS), help=f"Scrapers a medir: {', '.join(SCRAPERS)}")
+    parser.add_argument("--medicamentos", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--parse-workers", type=int, default=None,
+                        help="Procesos de parseo de los scrapers por etapas (0 = en el propio proceso)")
+    parser.add_argument("--host-rate", type=float, default=1000,
+                        help="Ritmo inicial del controlador adaptativo (comprehensive)")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--p429", type=float, default=0.0)
+    parser.add_argument("--p403", type=float, default=0.0)
+    parser.add_argument("--page-kb", type=float, default=40)
+    parser.add_argument("--max-rps", type=float, default=0, help="Límite de peticiones/s del servidor (0 = sin límite)")
+    parser.add_argument("--p-sin-espanol", type=float, default=0,
+                        help="Fracción de fichas de e-lactancia que solo existen con el nombre en inglés")
+    parser.add_argument("--json", help="Guardar los resultados en este fichero JSON")
+    args = parser.parse_args()
+
+    config = FakeSiteConfig(latency_ms=args.latency_ms, p429=args.p429, p403=args.p403,
+                            page_kb=args.page_kb, medicamentos=args.medicamentos, max_rps=args.max_rps,
+                            p_sin_espanol=args.p_sin_espanol)
+    sitio = FakeDrugSite(config)
+    sitio.start()
+    print(f"🧪 Servidor falso en {sitio.base_url} ({args.medicamentos} medicamentos, "
+          f"{args.latency_ms:.0f} ms, 429={args.p429:.0%}, 403={args.p403:.0%}, {args.page_kb:.0f} KB)")
+
+    resultados = []
+    try:
+        for nombre in args.solo.split(","):
+            resultado = medir(nombre.strip(), sitio, args)
+            resultados.append(resultado)
+            print(f"{resultado['scraper']:<22} {resultado['paginas_s']:>8.1f} pág/s "
+                  f"{resultado['parse_ms_pagina']:>8.2f} ms parseo/pág "
+                  f"{resultado['filas_s']:>8.1f} filas/s {resultado['pico_rss_mb']:>7.1f} MB RSS "
+                  f"({resultado['paginas']} pág, {resultado['errores_http']} errores, {resultado['segundos']} s)")
+    finally:
+        sitio.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "resultados": resultados}, f, indent=2)
+        print(f"💾 Resultados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Servidor local que imita drugs.com, e-lactancia.org y el Orange Book de la FDA.
+
+Sirve páginas sintéticas con la forma que esperan los scrapers (enlaces de búsqueda,
+fichas de drugs.com, índice de embarazo por letras, fichas de e-lactancia y la tabla
+de resultados de la FDA), con latencia, errores 429/403 y tamaño de página configurables.
+
+Uso independiente:
+    python benchmarks/fake_server.py --port 8765 --latency-ms 80 --p429 0.02
+y apuntar los scrapers a http://127.0.0.1:8765 con su parámetro base_url.
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+
+from aiohttp import web
+
+RELLENO = (
+    "the of and in to is a for with this that by on are be as from at its was or an not have "
+    "breastfeeding lactancia milk leche dose dosis infant lactante plasma levels hours study cases "
+    "clinical review reported patients half-life metabolism excretion renal hepatic"
+).split()
+
+LETRAS = "abcdefghijklmnopqrstuvwxyz"
+
+
+@dataclass
+class FakeSiteConfig:
+    latency_ms: float = 50.0      # latencia media; cada respuesta varía ±50%
+    p429: float = 0.0             # probabilidad de responder 429 (con Retry-After)
+    p403: float = 0.0             # probabilidad de responder 403
+    page_kb: float = 40.0         # tamaño aproximado de las fichas
+    medicamentos: int = 40        # medicamentos del índice de drugs.com/pregnancy
+    letras: int = 4               # páginas de letra del índice
+    max_rps: float = 0.0          # límite real del servidor (429 al superarlo); 0 = sin límite
+    p_sin_espanol: float = 0.0    # fracción de fichas de e-lactancia sin nombre en español (302)
+    retry_after: int = 1
+    seed: int = 1
+
+
+def nombres_medicamentos(n: int):
+    return [f"med{i:04d}" for i in range(n)]
+
+
+def _relleno(semilla: str, kb: float) -> str:
+    """Párrafos neutros deterministas hasta ~kb kilobytes"""
+    rnd = random.Random(semilla)
+    parrafos = []
+    total = 0
+    while total < kb * 1024:
+        parrafo = "<p>" + " ".join(rnd.choice(RELLENO) for _ in range(60)) + ".</p>"
+        parrafos.append(parrafo)
+        total += len(parrafo)
+    return "\n".join(parrafos)
+
+
+def pagina_busqueda_drugs(nombre: str) -> str:
+    return (f"<html><body><h1>Search results for {nombre}</h1>"
+            f"<a href='/'>Home</a><a href='/mtm/{nombre}.html'>{nombre}</a>"
+            f"<a href='/search.php?searchterm={nombre}&page=2'>more</a></body></html>")
+
+
+def pagina_ficha_drugs(nombre: str, kb: float) -> str:
+    """Ficha de drugs.com: sirve tanto para scrape_drugs_com como para parse_medication_detail"""
+    categoria = "ABCDX"[len(nombre) % 5]
+    return f"""<html><head><title>{nombre} pregnancy</title></head><body>
+<nav><a href="/">Home</a></nav>
+<h1>{nombre} Pregnancy Warnings</h1>
+<div class="contentBox">
+<p>{nombre} use during pregnancy has been studied in animals; fetal harm was not observed in the first trimester
+and data for the second trimester and third trimester are limited.</p>
+<p><strong>FDA pregnancy category</strong> {categoria} - FDA</p>
+<p>Pregnancy Category: {categoria}. Use in pregnant women only if clearly needed after weighing maternal benefit.</p>
+</div>
+{_relleno(nombre, kb)}
+</body></html>"""
+
+
+def pagina_indice_embarazo(letras: int) -> str:
+    enlaces = "".join(f"<li><a href='/pregnancy/{letra}.html'>{letra.upper()}</a></li>"
+                      for letra in LETRAS[:letras])
+    return f"<html><body><div class='ddc-paging paging-list'><ul>{enlaces}</ul></div></body></html>"
+
+
+def pagina_letra_embarazo(nombres) -> str:
+    enlaces = "".join(f"<li><a href='/pregnancy/{nombre}.html'>{nombre}</a></li>" for nombre in nombres)
+    return f"<html><body><ul class='column-list'>{enlaces}</ul></body></html>"
+
+
+def pagina_elactancia(nombre: str, kb: float) -> str:
+    return f"""<html><body>
+<h1>{nombre}</h1>
+<div class="risk">Pregnancy: low risk. Compatible with pregnancy; no teratogenic effect reported.</div>
+<p>{nombre} is considered safe during pregnancy and embarazo with fetal and maternal monitoring.</p>
+<p>Safe in the first trimester and second trimester of gestation.
+Avoid after the third trimester without medical advice.</p>
+<p>Recommended as first choice; consider an alternative only if not tolerated.</p>
+{_relleno(nombre, kb)}
+</body></html>"""
+
+
+def pagina_fda(nombre: str) -> str:
+    filas = "".join(
+        f"<tr><td>N{zlib.crc32(f'{nombre}{i}'.encode()) % 900000 + 100000}</td><td>{nombre.upper()}</td><td>LAB {i}</td>"
+        f"<td>TABLET;ORAL</td><td>Jan 1, {1990 + i}</td><td>RX</td></tr>"
+        for i in range(5)
+    )
+    return f"""<html><body><div id="header">Orange Book</div>
+<table class="standardTable resultsTable"><tr><th>Appl No</th><th>Ingredient</th><th>Applicant</th>
+<th>Dosage Form</th><th>Approval Date</th><th>Type</th></tr>{filas}</table></body></html>"""
+
+
+class FakeDrugSite:
+    """Servidor aiohttp en un hilo propio, para que lo usen scrapers síncronos y asíncronos"""
+
+    def __init__(self, config: FakeSiteConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeSiteConfig()
+        self.host = host
+        self.port = port
+        self.random = random.Random(self.config.seed)
+        self.estados = Counter()
+        self.bytes_servidos = 0
+        self.tokens = self.config.max_rps
+        self.ultimo_relleno = time.monotonic()
+        self.loop = None
+        self.runner = None
+        self.thread = None
+        self.base_url = None
+
+        nombres = nombres_medicamentos(self.config.medicamentos)
+        self.por_letra = {
+            letra: nombres[i::self.config.letras] for i, letra in enumerate(LETRAS[:self.config.letras])
+        }
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._latencia_y_fallos])
+        app.router.add_get("/search.php", self._busqueda_drugs)
+        app.router.add_get("/mtm/{nombre}.html", self._ficha_drugs)
+        app.router.add_get("/pregnancy.html", self._indice_embarazo)
+        app.router.add_get("/pregnancy/{pagina}.html", self._pagina_embarazo)
+        app.router.add_get("/breastfeeding/{nombre}/product/", self._elactancia)
+        app.router.add_get("/scripts/cder/ob/default.cfm", self._fda)
+        return app
+
+    @web.middleware
+    async def _latencia_y_fallos(self, request, handler):
+        latencia = self.config.latency_ms / 1000
+        if latencia:
+            await asyncio.sleep(latencia * self.random.uniform(0.5, 1.5))
+        tirada = self.random.random()
+        if tirada < self.config.p429 or self._excede_limite():
+            response = web.Response(status=429, text="Too Many Requests",
+                                    headers={"Retry-After": str(self.config.retry_after)})
+        elif tirada < self.config.p429 + self.config.p403:
+            response = web.Response(status=403, text="Forbidden")
+        else:
+            response = await handler(request)
+        self.estados[response.status] += 1
+        self.bytes_servidos += response.content_length or 0
+        return response
+
+    def _excede_limite(self) -> bool:
+        """Token bucket del lado del servidor, como el de un sitio real con límite por IP"""
+        if not self.config.max_rps:
+            return False
+        now = time.monotonic()
+        self.tokens = min(self.config.max_rps, self.tokens + (now - self.ultimo_relleno) * self.config.max_rps)
+        self.ultimo_relleno = now
+        if self.tokens < 1:
+            return True
+        self.tokens -= 1
+        return False
+
+    def _html(self, html: str) -> web.Response:
+        return web.Response(text=html, content_type="text/html")
+
+    async def _busqueda_drugs(self, request):
+        return self._html(pagina_busqueda_drugs(request.query.get("searchterm", "").replace(" ", "+")))
+
+    async def _ficha_drugs(self, request):
+        return self._html(pagina_ficha_drugs(request.match_info["nombre"], self.config.page_kb))
+
+    async def _indice_embarazo(self, request):
+        return self._html(pagina_indice_embarazo(self.config.letras))
+
+    async def _pagina_embarazo(self, request):
+        pagina = request.match_info["pagina"]
+        if pagina in self.por_letra:
+            return self._html(pagina_letra_embarazo(self.por_letra[pagina]))
+        return self._html(pagina_ficha_drugs(pagina, self.config.page_kb))
+
+    async def _elactancia(self, request):
+        nombre = request.match_info["nombre"]
+        # Los nombres en español del benchmark acaban en 'es'; los que "no existen" redirigen
+        # al buscador, como hace e-lactancia
+        if nombre.endswith("es") and zlib.crc32(nombre.encode()) % 1000 < self.config.p_sin_espanol * 1000:
+            return web.Response(status=302, headers={"Location": f"/breastfeeding/search/?term={nombre}"})
+        return self._html(pagina_elactancia(nombre, self.config.page_kb))
+
+    async def _fda(self, request):
+        return self._html(pagina_fda(request.query.get("Ingredient", "")))
+
+    def start(self) -> str:
+        """Arrancar en segundo plano; devuelve la URL base"""
+        listo = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.runner = web.AppRunner(self.app(), access_log=None)
+            self.loop.run_until_complete(self.runner.setup())
+            site = web.TCPSite(self.runner, self.host, self.port)
+            self.loop.run_until_complete(site.start())
+            self.port = site._server.sockets[0].getsockname()[1]
+            self.base_url = f"http://{self.host}:{self.port}"
+            listo.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(self.runner.cleanup())
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, name="fake-drug-site", daemon=True)
+        self.thread.start()
+        listo.wait()
+        return self.base_url
+
+    def stop(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+
+    def servidas(self) -> int:
+        """Páginas servidas con éxito"""
+        return self.estados[200]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--p429", type=float, default=0.0)
+    parser.add_argument("--p403", type=float, default=0.0)
+    parser.add_argument("--page-kb", type=float, default=40)
+    parser.add_argument("--medicamentos", type=int, default=40)
+    parser.add_argument("--max-rps", type=float, default=0, help="Límite de peticiones/s del servidor (0 = sin límite)")
+    parser.add_argument("--p-sin-espanol", type=float, default=0, help="Fracción de fichas de e-lactancia sin nombre en español")
+    args = parser.parse_args()
+
+    config = FakeSiteConfig(latency_ms=args.latency_ms, p429=args.p429, p403=args.p403,
+                            page_kb=args.page_kb, medicamentos=args.medicamentos, max_rps=args.max_rps,
+                            p_sin_espanol=args.p_sin_espanol)
+    sitio = FakeDrugSite(config, port=args.port)
+    web.run_app(sitio.app(), host=sitio.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+"""Crawl repartido entre varios procesos, contenedores o máquinas con una cola en SQLite.
+
+    python cola_trabajos.py coordinador --scraper comprehensive --lista formulario.csv
+    python cola_trabajos.py trabajador --scraper comprehensive      # tantos como se quiera
+    python cola_trabajos.py estado
+
+El coordinador encola un trabajo por medicamento en `db/cola_trabajos.db` y va fusionando
+en `medicamentos.db` los resultados que los trabajadores devuelven. Cada trabajador
+reserva lotes de trabajos con un lease, lo renueva con latidos mientras trabaja, ejecuta
+el scraper de siempre sobre una base de datos local (con su propio limitador por host,
+es decir, su propio presupuesto de cortesía por IP de salida) y devuelve las filas
+de `medicamentos` y `evidencias` de cada medicamento. Si un trabajador muere, sus trabajos
+vuelven a la cola al caducar el lease; un trabajo sin datos se reintenta (quizá en otra
+máquina) hasta `max_intentos`.
+
+La cola es un fichero SQLite: los trabajadores de otras máquinas la comparten por un
+volumen de red con bloqueo de ficheros fiable (no todos los NFS lo tienen).
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from crawl_frontier import consumer_id, _pid_vivo
+from lista_trabajo import EntradaTrabajo, cargar_lista, parse_shard
+from normalizacion import IndiceAlias
+from schema import (COLUMNAS_EVIDENCIA, COLUMNAS_MEDICAMENTO, UPSERT_EVIDENCIA, UPSERT_MEDICAMENTO,
+                    fila_evidencia, fila_medicamento, inicializar_db)
+
+COLA_PATH = "db/cola_trabajos.db"
+DB_PATH = "db/medicamentos.db"
+SCRAPERS = ['comprehensive', 'elactancia']
+
+PENDIENTE = 'pending'
+EN_CURSO = 'in_progress'
+HECHO = 'done'
+FALLIDO = 'failed'
+
+
+class ColaTrabajos:
+    """Trabajos (scraper, medicamento) con estado, lease, latido y resultado.
+
+    Igual que CrawlFrontier: `reclamar` reserva en una transacción IMMEDIATE, así que
+    varios procesos pueden compartir el fichero; un trabajo en curso con el lease caducado
+    vuelve a estar disponible.
+    """
+
+    def __init__(self, db_path: str = COLA_PATH, lease_segundos: float = 300, max_intentos: int = 3):
+        self.db_path = db_path
+        self.lease_segundos = lease_segundos
+        self.max_intentos = max_intentos
+
+        directorio = os.path.dirname(db_path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=60)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS trabajos (
+                scraper TEXT NOT NULL,
+                medicamento TEXT NOT NULL,
+                espanol TEXT,
+                alias TEXT,
+                prioridad REAL NOT NULL DEFAULT 0,
+                estado TEXT NOT NULL DEFAULT 'pending',
+                intentos INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                trabajador TEXT,
+                lease_hasta REAL,
+                resultado TEXT,
+                fusionado INTEGER NOT NULL DEFAULT 0,
+                creado REAL NOT NULL,
+                actualizado REAL NOT NULL,
+                PRIMARY KEY (scraper, medicamento)
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_trabajos_estado '
+                          'ON trabajos(scraper, estado, prioridad DESC, creado)')
+        self.conn.commit()
+
+    def encolar(self, scraper: str, entradas: List[EntradaTrabajo]) -> int:
+        """Añadir trabajos (los ya encolados se ignoran). Devuelve cuántos son nuevos"""
+        ahora = time.time()
+        with self.conn:
+            cursor = self.conn.executemany('''
+                INSERT OR IGNORE INTO trabajos (scraper, medicamento, espanol, alias, prioridad, creado, actualizado)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(scraper, e.nombre, e.espanol, json.dumps(e.alias), e.prioridad, ahora + i * 1e-6, ahora)
+                  for i, e in enumerate(entradas)])
+        return cursor.rowcount
+
+    def reclamar(self, trabajador: str, scraper: str, n: int = 5) -> List[EntradaTrabajo]:
+        """Reservar hasta `n` trabajos disponibles, los de más prioridad primero"""
+        ahora = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._retirar_agotados(ahora)
+            filas = self.conn.execute('''
+                SELECT medicamento, espanol, alias, prioridad FROM trabajos
+                WHERE scraper = ? AND intentos < ?
+                  AND (estado = 'pending' OR (estado = 'in_progress' AND lease_hasta < ?))
+                ORDER BY prioridad DESC, creado
+                LIMIT ?
+            ''', (scraper, self.max_intentos, ahora, n)).fetchall()
+            self.conn.executemany('''
+                UPDATE trabajos
+                SET estado = 'in_progress', intentos = intentos + 1, trabajador = ?, lease_hasta = ?, actualizado = ?
+                WHERE scraper = ? AND medicamento = ?
+            ''', [(trabajador, ahora + self.lease_segundos, ahora, scraper, fila[0]) for fila in filas])
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return [EntradaTrabajo(nombre, espanol, json.loads(alias or '[]'), prioridad)
+                for nombre, espanol, alias, prioridad in filas]
+
+    def _retirar_agotados(self, ahora: float):
+        """Marcar fallidos los trabajos sin intentos que ya no se van a reservar: en curso con
+        el lease caducado (su trabajador murió en el último intento) o pendientes"""
+        self.conn.execute('''
+            UPDATE trabajos
+            SET estado = 'failed', error = COALESCE(error, 'lease caducado sin intentos'),
+                lease_hasta = NULL, actualizado = ?
+            WHERE intentos >= ? AND (estado = 'pending' OR (estado = 'in_progress' AND lease_hasta < ?))
+        ''', (ahora, self.max_intentos, ahora))
+
+    def latido(self, trabajador: str) -> int:
+        """Renovar el lease de todos los trabajos en curso del trabajador"""
+        ahora = time.time()
+        with self.conn:
+            return self.conn.execute('''
+                UPDATE trabajos SET lease_hasta = ?, actualizado = ?
+                WHERE trabajador = ? AND estado = 'in_progress'
+            ''', (ahora + self.lease_segundos, ahora, trabajador)).rowcount
+
+    def completar(self, scraper: str, medicamento: str, resultado: dict):
+        """Guardar el resultado; si otro trabajador ya lo completó (lease caducado), gana el primero"""
+        with self.conn:
+            self.conn.execute('''
+                UPDATE trabajos
+                SET estado = 'done', resultado = ?, error = NULL, lease_hasta = NULL, fusionado = 0, actualizado = ?
+                WHERE scraper = ? AND medicamento = ? AND estado != 'done'
+            ''', (json.dumps(resultado, ensure_ascii=False), time.time(), scraper, medicamento))
+
+    def fallar(self, scraper: str, medicamento: str, trabajador: str, error: str):
+        """Devolver el trabajo a pendientes, o marcarlo fallido si agotó los intentos. Solo si
+        sigue siendo del trabajador: si su lease caducó y lo reclamó otro, no se le quita"""
+        with self.conn:
+            self.conn.execute('''
+                UPDATE trabajos
+                SET estado = CASE WHEN intentos >= ? THEN 'failed' ELSE 'pending' END,
+                    error = ?, lease_hasta = NULL, actualizado = ?
+                WHERE scraper = ? AND medicamento = ? AND trabajador = ? AND estado = 'in_progress'
+            ''', (self.max_intentos, error[:500], time.time(), scraper, medicamento, trabajador))
+
+    def liberar_huerfanos(self) -> int:
+        """Trabajos en curso de procesos muertos de esta máquina: vuelven a la cola sin esperar al
+        lease (o pasan a fallidos si estaban en su último intento)"""
+        host = socket.gethostname()
+        huerfanos = []
+        for scraper, medicamento, trabajador in self.conn.execute(
+                "SELECT scraper, medicamento, trabajador FROM trabajos WHERE estado = 'in_progress'"):
+            host_trabajador, _, pid = (trabajador or '').rpartition(':')
+            if host_trabajador == host and pid.isdigit() and not _pid_vivo(int(pid)):
+                huerfanos.append((scraper, medicamento))
+        with self.conn:
+            self.conn.executemany('''
+                UPDATE trabajos
+                SET estado = CASE WHEN intentos >= ? THEN 'failed' ELSE 'pending' END,
+                    error = CASE WHEN intentos >= ? THEN COALESCE(error, 'trabajador muerto') ELSE error END,
+                    lease_hasta = NULL
+                WHERE scraper = ? AND medicamento = ? AND estado = 'in_progress'
+            ''', [(self.max_intentos, self.max_intentos, scraper, medicamento) for scraper, medicamento in huerfanos])
+        return len(huerfanos)
+
+    def fusionar(self, db_path: str = DB_PATH) -> int:
+        """Escribir en `db_path` los resultados aún no fusionados. Devuelve cuántos"""
+        pendientes = self.conn.execute(
+            "SELECT scraper, medicamento, resultado FROM trabajos WHERE estado = 'done' AND fusionado = 0"
+        ).fetchall()
+        if not pendientes:
+            return 0
+        conn = sqlite3.connect(db_path, timeout=60)
+        try:
+            with conn:
+                for _, _, resultado in pendientes:
+                    datos = json.loads(resultado)
+                    conn.execute(UPSERT_MEDICAMENTO, fila_medicamento(**datos['medicamento']))
+                    conn.executemany(UPSERT_EVIDENCIA, [fila_evidencia(**e) for e in datos['evidencias']])
+        finally:
+            conn.close()
+        with self.conn:
+            self.conn.executemany("UPDATE trabajos SET fusionado = 1 WHERE scraper = ? AND medicamento = ?",
+                                  [(scraper, medicamento) for scraper, medicamento, _ in pendientes])
+        return len(pendientes)
+
+    def stats(self, scraper: Optional[str] = None) -> Dict[str, int]:
+        filtro, params = ('WHERE scraper = ?', (scraper,)) if scraper else ('', ())
+        return dict(self.conn.execute(f'SELECT estado, COUNT(*) FROM trabajos {filtro} GROUP BY estado', params))
+
+    def terminada(self, scraper: Optional[str] = None) -> bool:
+        """Sin trabajos pendientes ni en curso (los fallidos con intentos agotados no cuentan)"""
+        with self.conn:
+            self._retirar_agotados(time.time())
+        stats = self.stats(scraper)
+        return not stats.get(PENDIENTE) and not stats.get(EN_CURSO)
+
+    def reiniciar(self, scraper: str):
+        with self.conn:
+            self.conn.execute('DELETE FROM trabajos WHERE scraper = ?', (scraper,))
+
+    def close(self):
+        self.conn.close()
+
+
+class Latido(threading.Thread):
+    """Hilo que renueva los leases del trabajador mientras procesa un lote (conexión propia)"""
+
+    def __init__(self, cola_path: str, trabajador: str, lease_segundos: float):
+        super().__init__(daemon=True)
+        self.cola_path = cola_path
+        self.trabajador = trabajador
+        self.lease_segundos = lease_segundos
+        self.parar = threading.Event()
+
+    def run(self):
+        cola = ColaTrabajos(self.cola_path, self.lease_segundos)
+        try:
+            while not self.parar.wait(self.lease_segundos / 3):
+                cola.latido(self.trabajador)
+        finally:
+            cola.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.parar.set()
+        self.join()
+
+
+def _lista_incluida(scraper: str) -> List[EntradaTrabajo]:
+    """La lista de medicamentos que trae cada scraper, como entradas de trabajo"""
+    if scraper == 'comprehensive':
+        from comprehensive_scraper import ComprehensiveMedScraper
+        return cargar_lista(ComprehensiveMedScraper(rate_state_path=None).medications)
+    from elactancia_embarazo_scraper import ELactanciaEmbarazoScraper
+    return cargar_lista(ELactanciaEmbarazoScraper().medications.items())
+
+
+def ejecutar_lote(scraper: str, trabajos: List[EntradaTrabajo], db_local: str, args) -> Dict[str, dict]:
+    """Ejecutar el scraper sobre `trabajos` con la base de datos local; resultado por medicamento"""
+    from rate_limiter import AdaptiveRateController
+
+    if scraper == 'comprehensive':
+        from comprehensive_scraper import ComprehensiveMedScraper
+        extra = {'base_url': args.base_url} if args.base_url else {}
+        instancia = ComprehensiveMedScraper(db_path=db_local, workers=args.workers, host_rate=args.host_rate,
+                                            max_host_rate=args.max_host_rate, rate_state_path=args.rate_state,
+                                            parse_workers=args.parse_workers, lista=trabajos, **extra)
+        asyncio.run(instancia.run_comprehensive_scraping())
+    else:
+        from elactancia_embarazo_scraper import ELactanciaEmbarazoScraper
+        extra = {'base_url': args.base_url} if args.base_url else {}
+        limiter = AdaptiveRateController(rate=args.host_rate, max_rate=args.max_host_rate,
+                                         state_path=args.rate_state)
+        instancia = ELactanciaEmbarazoScraper(db_path=db_local, limiter=limiter, workers=args.workers,
+                                              parse_workers=args.parse_workers, lista=trabajos, **extra)
+        asyncio.run(instancia.run_embarazo_scraping())
+
+    alias = IndiceAlias(db_local)
+    conn = sqlite3.connect(db_local)
+    conn.row_factory = sqlite3.Row
+    resultados = {}
+    try:
+        for trabajo in trabajos:
+            nombre = alias.canonico(trabajo.nombre)
+            medicamento = conn.execute(f'SELECT {", ".join(COLUMNAS_MEDICAMENTO)} FROM medicamentos WHERE nombre = ?',
+                                       (nombre,)).fetchone()
+            if medicamento is None:
+                continue
+            evidencias = conn.execute(f'SELECT {", ".join(COLUMNAS_EVIDENCIA)} FROM evidencias WHERE nombre = ?',
+                                      (nombre,)).fetchall()
+            resultados[trabajo.nombre] = {'medicamento': dict(medicamento),
+                                          'evidencias': [dict(e) for e in evidencias]}
+    finally:
+        conn.close()
+    return resultados
+
+
+def trabajador(args):
+    """Reservar lotes hasta vaciar la cola; cada lote se procesa con una base de datos local nueva"""
+    cola = ColaTrabajos(args.cola, args.lease, args.max_intentos)
+    yo = consumer_id()
+    liberados = cola.liberar_huerfanos()
+    if liberados:
+        print(f"♻️ {liberados} trabajos de trabajadores muertos vuelven a la cola")
+    local = tempfile.mkdtemp(prefix='trabajador_')
+    hechos = fallidos = 0
+    try:
+        while True:
+            trabajos = cola.reclamar(yo, args.scraper, args.lote)
+            if not trabajos:
+                # Cola aún vacía (el coordinador no ha encolado) o trabajos en curso de
+                # otros trabajadores, que pueden morir y dejar leases que caducan
+                if not cola.stats(args.scraper) or not cola.terminada(args.scraper):
+                    time.sleep(args.espera)
+                    continue
+                break
+            print(f"📦 {yo}: lote de {len(trabajos)} ({', '.join(t.nombre for t in trabajos)})")
+            db_local = os.path.join(local, 'medicamentos.db')
+            for sufijo in ('', '-wal', '-shm'):
+                if os.path.exists(db_local + sufijo):
+                    os.remove(db_local + sufijo)
+            inicializar_db(db_local)
+            try:
+                with Latido(args.cola, yo, args.lease):
+                    resultados = ejecutar_lote(args.scraper, trabajos, db_local, args)
+            except Exception as e:
+                for trabajo in trabajos:
+                    cola.fallar(args.scraper, trabajo.nombre, yo, f'{type(e).__name__}: {e}')
+                fallidos += len(trabajos)
+                continue
+            for trabajo in trabajos:
+                if trabajo.nombre in resultados:
+                    cola.completar(args.scraper, trabajo.nombre, resultados[trabajo.nombre])
+                    hechos += 1
+                else:
+                    cola.fallar(args.scraper, trabajo.nombre, yo, 'sin datos')
+                    fallidos += 1
+    finally:
+        shutil.rmtree(local, ignore_errors=True)
+        cola.close()
+    print(f"🏁 {yo}: {hechos} hechos, {fallidos} sin datos o con error")
+
+
+def coordinador(args):
+    """Encolar los trabajos y fusionar resultados en medicamentos.db hasta que no quede nada"""
+    inicializar_db(args.db)
+    cola = ColaTrabajos(args.cola, args.lease, args.max_intentos)
+    try:
+        if args.reiniciar:
+            cola.reiniciar(args.scraper)
+        entradas = cargar_lista(args.lista, args.shard) if args.lista else _lista_incluida(args.scraper)
+        nuevos = cola.encolar(args.scraper, entradas)
+        print(f"🧭 {nuevos} trabajos nuevos de {len(entradas)}; cola: {cola.stats(args.scraper)}")
+        if args.solo_encolar:
+            return
+        fusionados = 0
+        while True:
+            terminada = cola.terminada(args.scraper)
+            fusionados += cola.fusionar(args.db)
+            if terminada:
+                break
+            time.sleep(args.intervalo)
+            print(f"🧭 Cola: {cola.stats(args.scraper)} · {fusionados} resultados fusionados")
+        print(f"✅ Cola terminada: {cola.stats(args.scraper)} · {fusionados} resultados fusionados en {args.db}")
+    finally:
+        cola.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Crawl repartido con una cola de trabajos en SQLite")
+    parser.add_argument('modo', choices=['coordinador', 'trabajador', 'estado'])
+    parser.add_argument('--scraper', choices=SCRAPERS, default='comprehensive')
+    parser.add_argument('--cola', default=COLA_PATH, help="Fichero SQLite de la cola (compartido)")
+    parser.add_argument('--lease', type=float, default=300, help="Segundos de reserva de un trabajo sin latido")
+    parser.add_argument('--max-intentos', type=int, default=3)
+    # Coordinador
+    parser.add_argument('--db', default=DB_PATH, help="Base de datos donde se fusionan los resultados")
+    parser.add_argument('--lista', help="Medicamentos a encolar (CSV, JSONL o SQLite); por defecto, la del scraper")
+    parser.add_argument('--shard', type=parse_shard, metavar='i/N', help="Encolar solo esta parte de la lista")
+    parser.add_argument('--reiniciar', action='store_true', help="Vaciar la cola del scraper antes de encolar")
+    parser.add_argument('--solo-encolar', action='store_true', help="Encolar y salir sin esperar resultados")
+    parser.add_argument('--intervalo', type=float, default=30, help="Segundos entre fusiones de resultados")
+    # Trabajador
+    parser.add_argument('--lote', type=int, default=5, help="Trabajos reservados de una vez")
+    parser.add_argument('--espera', type=float, default=10, help="Segundos entre consultas con la cola vacía")
+    parser.add_argument('--workers', type=int, default=3, help="Medicamentos en paralelo dentro del lote")
+    parser.add_argument('--parse-workers', type=int, default=0, help="Procesos de parseo (0 = en el propio proceso)")
+    parser.add_argument('--host-rate', type=float, default=0.2, help="Ritmo inicial por host de este trabajador")
+    parser.add_argument('--max-host-rate', type=float, default=2.0)
+    parser.add_argument('--rate-state', default=f"db/rate_state_{socket.gethostname()}.json",
+                        help="Ritmos aprendidos de este trabajador (uno por máquina / IP de salida)")
+    parser.add_argument('--base-url', help="Sitio alternativo (p. ej. el servidor falso de benchmarks)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.modo == 'coordinador':
+        coordinador(args)
+    elif args.modo == 'trabajador':
+        trabajador(args)
+    else:
+        cola = ColaTrabajos(args.cola, args.lease, args.max_intentos)
+        print(json.dumps({scraper: cola.stats(scraper) for scraper in SCRAPERS}, indent=2))
+        cola.close()
+
+
+if __name__ == "__main__":
+    main()
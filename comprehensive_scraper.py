@@ -1,16 +1,27 @@
 import asyncio
-import aiohttp
-import sqlite3
 from dataclasses import dataclass
-from typing import List, Optional
-import random
+from typing import Optional
 import time
-from bs4 import BeautifulSoup
 import logging
 import re
-from fake_useragent import UserAgent
 import os
 from datetime import datetime
+import argparse
+from rate_limiter import AdaptiveRateController
+from http_cache import ResponseCache
+from parsed_page import ParsedPage
+from bs4 import SoupStrainer
+from db_writer import BatchedDBWriter
+from schema import inicializar_db, fila_medicamento, fila_evidencia, UPSERT_MEDICAMENTO, UPSERT_EVIDENCIA, TOCAR_EVIDENCIA
+from incremental import MAX_AGE_DAYS, PlanIncremental, hash_contenido, ahora_utc
+from pipeline import StagedPipeline
+from html_archive import HtmlArchive
+from http_client import cabeceras, sesion_async, leer_texto, contar_reintento
+from metricas import METRICAS
+from single_flight import PETICIONES, clave_url
+from perfilado import MOTORES, perfilar
+from normalizacion import IndiceAlias
+from lista_trabajo import Shard, agregar_argumentos, cargar_lista, pares_alias
 
 @dataclass
 class MedicationData:
@@ -22,12 +33,37 @@ class MedicationData:
     observaciones: Optional[str] = None
     confianza_score: int = 0
     fecha_actualizacion: str = ""
+    url: Optional[str] = None
+    contenido_hash: Optional[str] = None
+    sin_cambios: bool = False  # Modo incremental: la página es idéntica a la ya guardada
 
 class ComprehensiveMedScraper:
-    def __init__(self, db_path: str = "db/medicamentos.db"):
+    def __init__(self, db_path: str = "db/medicamentos.db", workers: int = 3, host_rate: float = 0.2,
+                 cache: Optional[ResponseCache] = None, incremental: bool = False, max_age_days: float = MAX_AGE_DAYS,
+                 base_url: str = "https://www.drugs.com", max_host_rate: float = 2.0,
+                 rate_state_path: Optional[str] = "db/rate_state.json", parse_workers: Optional[int] = None,
+                 archive: Optional[HtmlArchive] = None, lista=None, shard: Optional[Shard] = None):
         self.db_path = db_path
-        self.ua = UserAgent()
+        self.base_url = base_url.rstrip('/')
         self.session = None
+        # Pool de workers concurrentes; el ritmo por host lo ajusta el controlador AIMD
+        # (host_rate es el ritmo inicial si no hay estado guardado de ejecuciones previas)
+        self.workers = max(1, workers)
+        self.rate_limiter = AdaptiveRateController(rate=host_rate, max_rate=max_host_rate,
+                                                   state_path=rate_state_path)
+        # Procesos para parsear fichas (None = núcleos - 1, 0 = en el propio proceso)
+        self.parse_workers = parse_workers
+        # Caché HTTP en disco (None = siempre descargar)
+        self.cache = cache
+        # Archivo del HTML de las fichas, para re-extraer sin volver a descargar
+        self.archive = archive
+        self.writer = None
+        # Modo incremental: solo medicamentos caducados o cuya página cambió
+        self.incremental = incremental
+        self.max_age_days = max_age_days
+        self.plan = None
+        # Índice de alias: cada medicamento se busca y se guarda con su ID canónico
+        self.alias = None
         self.setup_logging()
         
         # Lista de medicamentos comunes (simplificada para prueba)
@@ -50,6 +86,12 @@ class ComprehensiveMedScraper:
             # OTROS IMPORTANTES
             'folic acid', 'iron', 'prenatal vitamins', 'progesterone'
         ]
+        
+        # Lista externa (ruta o entradas) y/o reparto en shards: ver lista_trabajo.py
+        self.lista = None
+        if lista is not None or shard:
+            self.lista = cargar_lista(self.medications if lista is None else lista, shard)
+            self.medications = [entrada.nombre for entrada in self.lista]
 
     def setup_logging(self):
         """Configurar logging SOLO a consola (sin archivos)"""
@@ -64,67 +106,79 @@ class ComprehensiveMedScraper:
 
     def get_headers(self):
         """Headers anti-bloqueo basados en código de referencia (BSD-3/Apache-2.0)"""
-        return {
-            'User-Agent': self.ua.random,
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Cache-Control': 'max-age=0',
-            'DNT': '1'
-        }
+        return cabeceras('en-US,en;q=0.5')
 
     async def init_session(self):
-        """Inicializar sesión HTTP"""
-        connector = aiohttp.TCPConnector(limit=5, limit_per_host=1)
-        timeout = aiohttp.ClientTimeout(total=45)
-        self.session = aiohttp.ClientSession(
-            connector=connector,
-            timeout=timeout
-        )
+        """Inicializar sesión HTTP (pool keep-alive y caché DNS del cliente común)"""
+        self.session = sesion_async(limite=max(5, self.workers), limite_por_host=self.workers, timeout=45)
 
     async def smart_request(self, url: str, retries: int = 3) -> Optional[str]:
-        """Request inteligente con retry y delays adaptativos"""
-        delays = [3, 8, 15]
+        """Request inteligente con retry; el ritmo y las esperas los marca el controlador adaptativo.
+
+        Una URL ya en vuelo o ya descargada en esta ejecución se comparte (single_flight.py)
+        """
+        return await PETICIONES.compartir(('smart', clave_url(url)), lambda: self._smart_request(url, retries),
+                                          guardar=lambda html: html is not None)
+
+    async def _smart_request(self, url: str, retries: int) -> Optional[str]:
+        cached = self.cache.get(url) if self.cache else None
+        if cached and cached.is_fresh(self.cache.ttl):
+            return cached.body
         
         for attempt in range(retries):
             try:
+                waited = await self.rate_limiter.acquire(url)
                 if attempt > 0:
-                    delay = delays[min(attempt-1, len(delays)-1)] + random.uniform(0, 5)
-                    self.logger.info(f"Esperando {delay:.1f}s antes del intento {attempt+1}")
-                    await asyncio.sleep(delay)
-                
+                    contar_reintento(url)
+                    self.logger.info(f"Intento {attempt+1} para {url} tras {waited:.1f}s de espera")
                 headers = self.get_headers()
+                if cached:
+                    headers.update(cached.conditional_headers())
+                inicio = time.monotonic()
                 async with self.session.get(url, headers=headers, allow_redirects=True) as response:
-                    if response.status == 200:
-                        return await response.text()
+                    self.rate_limiter.record(url, response.status, time.monotonic() - inicio,
+                                             response.headers.get('Retry-After'))
+                    if response.status == 304 and cached:
+                        self.cache.touch(url)
+                        return cached.body
+                    elif response.status == 200:
+                        html = await leer_texto(response)
+                        if self.cache:
+                            self.cache.store(url, html, response.headers.get('ETag'),
+                                             response.headers.get('Last-Modified'))
+                        return html
                     elif response.status == 429:
-                        self.logger.warning(f"Rate limited, esperando 60s...")
-                        await asyncio.sleep(60)
+                        self.logger.warning(f"Rate limited (429); ritmo bajado a {self.rate_limiter.rate_for(url):.3f} req/s")
                     elif response.status == 403:
-                        self.logger.warning(f"Bloqueado (403) en {url}")
+                        self.logger.warning(f"Bloqueado (403) en {url}; ritmo bajado a {self.rate_limiter.rate_for(url):.3f} req/s")
                     else:
                         self.logger.warning(f"HTTP {response.status} para {url}")
                         
             except Exception as e:
+                self.rate_limiter.record(url, None, 0.0)
                 self.logger.error(f"Error en intento {attempt+1} para {url}: {e}")
                 
         return None
 
-    async def scrape_drugs_com(self, drug_name: str) -> Optional[MedicationData]:
-        """Scraper mejorado para drugs.com"""
-        search_url = f"https://www.drugs.com/search.php?searchterm={drug_name.replace(' ', '+')}"
+    async def fetch_drug_page(self, drug_name: str):
+        """Etapa de descarga: búsqueda + ficha de drugs.com.
+
+        Devuelve (nombre, url, html, hash) para la etapa de parseo, un MedicationData ya
+        completo si la página no cambió (modo incremental), o None.
+        """
+        search_url = f"{self.base_url}/search.php?searchterm={drug_name.replace(' ', '+')}"
         
         html = await self.smart_request(search_url)
         if not html:
             return None
             
-        soup = BeautifulSoup(html, 'html.parser')
+        # De la página de búsqueda solo interesan los enlaces (parseo mínimo, en el loop:
+        # hace falta para saber qué descargar después)
+        page = ParsedPage(html, parse_only=SoupStrainer('a', href=True))
         
         # Buscar enlaces a medicamentos
         drug_links = []
-        for link in soup.find_all('a', href=True):
+        for link in page.soup.find_all('a', href=True):
             href = link['href']
             if '/mtm/' in href or '/monograph/' in href:
                 drug_links.append(href)
@@ -134,30 +188,31 @@ class ComprehensiveMedScraper:
             return None
         
         # Obtener página del medicamento
-        drug_url = drug_links[0] if drug_links[0].startswith('http') else f"https://www.drugs.com{drug_links[0]}"
+        drug_url = drug_links[0] if drug_links[0].startswith('http') else f"{self.base_url}{drug_links[0]}"
         drug_html = await self.smart_request(drug_url)
         
         if not drug_html:
             return None
             
-        drug_soup = BeautifulSoup(drug_html, 'html.parser')
+        contenido_hash = hash_contenido(drug_html)
+        if self.archive:
+            self.archive.guardar("drugs.com", drug_name, drug_url, drug_html, nombre=drug_name,
+                                 contenido_hash=contenido_hash)
+        if self.plan and self.plan.sin_cambios(drug_name, contenido_hash):
+            return MedicationData(nombre=drug_name, fuente="drugs.com", url=drug_url,
+                                  contenido_hash=contenido_hash, sin_cambios=True)
         
-        # Extraer información
-        categoria_fda = self.extract_fda_category(drug_soup)
-        notas_clinicas = self.extract_pregnancy_info(drug_soup)
-        
-        return MedicationData(
-            nombre=drug_name,
-            categoria_fda=categoria_fda,
-            notas_clinicas=notas_clinicas,
-            fuente="drugs.com",
-            confianza_score=5,
-            fecha_actualizacion=datetime.now().strftime("%Y-%m-%d")
-        )
+        return drug_name, drug_url, drug_html, contenido_hash
 
-    def extract_fda_category(self, soup) -> Optional[str]:
+    async def scrape_drugs_com(self, drug_name: str) -> Optional[MedicationData]:
+        """Scraper mejorado para drugs.com (descarga y parseo de un medicamento, sin pipeline)"""
+        payload = await self.fetch_drug_page(drug_name)
+        return parse_drug_page(payload) if payload else None
+
+    @staticmethod
+    def extract_fda_category(page: ParsedPage) -> Optional[str]:
         """Extraer categoría FDA"""
-        text = soup.get_text()
+        text = page.text
         
         patterns = [
             r'FDA[^\w]*pregnancy[^\w]*category[^\w]*([A-DX])',
@@ -173,13 +228,17 @@ class ComprehensiveMedScraper:
         
         return None
 
-    def extract_pregnancy_info(self, soup) -> Optional[str]:
+    @staticmethod
+    def extract_pregnancy_info(page: ParsedPage) -> Optional[str]:
         """Extraer información sobre embarazo"""
         pregnancy_keywords = ['pregnancy', 'pregnant', 'fetal', 'teratogenic']
         
         sections = []
         for keyword in pregnancy_keywords:
-            elements = soup.find_all(text=lambda x: x and keyword.lower() in x.lower())
+            elements = [
+                element for element, element_lower in zip(page.strings, page.strings_lower)
+                if keyword in element_lower
+            ]
             
             for element in elements[:2]:  # Limitar a 2 por keyword
                 parent = element.parent
@@ -191,100 +250,175 @@ class ComprehensiveMedScraper:
         return ' | '.join(sections[:2]) if sections else None
 
     def setup_database(self):
-        """Configurar base de datos SQLite"""
-        os.makedirs('db', exist_ok=True)
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS medicamentos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT UNIQUE NOT NULL,
-                categoria_fda TEXT,
-                notas_clinicas TEXT,
-                trimestres_seguro TEXT,
-                fuente TEXT,
-                observaciones TEXT,
-                confianza_score INTEGER DEFAULT 0,
-                fecha_actualizacion TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        """Configurar base de datos SQLite (esquema unificado con migraciones)"""
+        version = inicializar_db(self.db_path)
+        self.logger.info(f"✅ Base de datos en versión de esquema {version}")
 
-    def save_medication(self, medication: MedicationData):
-        """Guardar medicamento en base de datos"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def save_medication(self, medication: MedicationData, verificado_en: Optional[str] = None):
+        """Encolar el medicamento (y la evidencia de drugs.com) para el escritor por lotes.
+
+        `verificado_en` es cuándo se descargó la página (por defecto, ahora); reextract.py
+        pasa la fecha del archivo para que el modo incremental no la dé por recién comprobada.
+        """
+        nombre = self.alias.canonico(medication.nombre) if self.alias else medication.nombre
+        verificado_en = verificado_en or ahora_utc()
+        if medication.sin_cambios:
+            self.writer.submit(TOCAR_EVIDENCIA, dict(
+                nombre=nombre, fuente=medication.fuente, verificado_en=verificado_en
+            ))
+            return
         
-        cursor.execute('''
-            INSERT OR REPLACE INTO medicamentos 
-            (nombre, categoria_fda, notas_clinicas, trimestres_seguro, fuente, observaciones, confianza_score, fecha_actualizacion, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (
-            medication.nombre,
-            medication.categoria_fda,
-            medication.notas_clinicas,
-            medication.trimestres_seguro,
-            medication.fuente,
-            medication.observaciones,
-            medication.confianza_score,
-            medication.fecha_actualizacion
+        campos = dict(
+            nombre=nombre,
+            categoria_fda=medication.categoria_fda,
+            notas=medication.notas_clinicas,
+            trimestres_seguro=medication.trimestres_seguro,
+            observaciones=medication.observaciones,
+            confianza_score=medication.confianza_score,
+            fecha_actualizacion=medication.fecha_actualizacion
+        )
+        self.writer.submit(UPSERT_MEDICAMENTO, fila_medicamento(fuente=medication.fuente, **campos))
+        self.writer.submit(UPSERT_EVIDENCIA, fila_evidencia(
+            fuente=medication.fuente, url=medication.url, contenido_hash=medication.contenido_hash,
+            verificado_en=verificado_en, **campos
         ))
+
+    def store_result(self, drug_name: str, result: Optional[MedicationData], total: int, stats: dict,
+                     start_time: float):
+        """Etapa de persistencia: encolar el resultado en el escritor y actualizar contadores"""
+        if result:
+            self.save_medication(result)
+            stats['successful'] += 1
+            if result.sin_cambios:
+                self.logger.info(f"♻️  Sin cambios: {drug_name}")
+            else:
+                self.logger.info(f"✅ Guardado: {drug_name} (FDA: {result.categoria_fda or 'N/A'})")
+        else:
+            stats['failed'] += 1
+            self.logger.warning(f"❌ Sin datos para: {drug_name}")
+        
+        stats['processed'] += 1
         
-        conn.commit()
-        conn.close()
+        # Progreso cada 5 medicamentos
+        if stats['processed'] % 5 == 0:
+            elapsed = time.time() - start_time
+            rate = stats['processed'] / elapsed * 60 if elapsed else 0
+            self.logger.info(f"📊 Progreso: {stats['processed']}/{total} | Exitosos: {stats['successful']} | Fallidos: {stats['failed']} | {rate:.1f} med/min")
 
     async def run_comprehensive_scraping(self):
-        """Ejecutar scraping completo"""
+        """Ejecutar scraping completo: descargas concurrentes → parseo en procesos → escritura"""
         self.setup_database()
-        await self.init_session()
         
-        total = len(self.medications)
-        successful = 0
-        failed = 0
+        # Un único ID por medicamento: 'paracetamol' y 'acetaminophen' son una sola búsqueda
+        self.alias = IndiceAlias(self.db_path)
+        if self.lista:
+            self.alias.registrar(pares_alias(self.lista), tipo='lista')
+        pending = [self.alias.canonico(name) for name in self.alias.deduplicar(self.medications)]
+        if len(pending) < len(self.medications):
+            self.logger.info(f"🔗 {len(self.medications) - len(pending)} alias omitidos (mismo medicamento)")
+        if self.incremental:
+            self.plan = PlanIncremental(self.db_path, "drugs.com", self.max_age_days)
+            candidatos = pending
+            pending = [name for name in candidatos if not self.plan.vigente(name)]
+            self.logger.info(f"♻️  Modo incremental: {len(candidatos) - len(pending)} vigentes, {len(pending)} por revisar")
+        
+        self.writer = BatchedDBWriter(self.db_path)
+        await self.init_session()
         
-        self.logger.info(f"🚀 Iniciando scraping de {total} medicamentos")
+        total = len(pending)
+        stats = {'processed': 0, 'successful': 0, 'failed': 0}
         start_time = time.time()
         
-        for i, drug_name in enumerate(self.medications):
-            try:
-                self.logger.info(f"[{i+1}/{total}] Procesando: {drug_name}")
-                
-                result = await self.scrape_drugs_com(drug_name)
-                
-                if result:
-                    self.save_medication(result)
-                    successful += 1
-                    self.logger.info(f"✅ Guardado: {drug_name} (FDA: {result.categoria_fda or 'N/A'})")
-                else:
-                    failed += 1
-                    self.logger.warning(f"❌ Sin datos para: {drug_name}")
-                
-                # Delay entre medicamentos
-                delay = random.uniform(8, 15)
-                await asyncio.sleep(delay)
-                
-                # Progreso cada 5 medicamentos
-                if (i + 1) % 5 == 0:
-                    elapsed = time.time() - start_time
-                    self.logger.info(f"📊 Progreso: {i+1}/{total} | Exitosos: {successful} | Fallidos: {failed}")
-                
-            except Exception as e:
-                failed += 1
-                self.logger.error(f"💥 Error procesando {drug_name}: {e}")
+        pipeline = StagedPipeline(
+            fetch=self.fetch_drug_page,
+            parse=parse_drug_page,
+            persist=lambda drug_name, result: self.store_result(drug_name, result, total, stats, start_time),
+            fetchers=self.workers,
+            parse_workers=self.parse_workers,
+        )
+        self.logger.info(f"🚀 Iniciando scraping de {total} medicamentos con {pipeline.fetchers} descargas "
+                         f"en paralelo y {pipeline.parse_workers} procesos de parseo")
         
-        await self.session.close()
+        try:
+            await pipeline.run(pending)
+        finally:
+            await self.session.close()
+            await self.writer.aclose()
+            self.rate_limiter.save()
+            if self.cache:
+                self.cache.close()
+            if self.archive:
+                await self.archive.aclose()
         
         elapsed = time.time() - start_time
         self.logger.info(f"🏁 Scraping completado!")
-        self.logger.info(f"📈 Resumen: {successful} exitosos, {failed} fallidos de {total} total")
+        self.logger.info(f"📈 Resumen: {stats['successful']} exitosos, {stats['failed']} fallidos de {total} total")
         self.logger.info(f"⏱️  Tiempo total: {elapsed/60:.2f} minutos")
+        self.logger.info(f"⏱️  Tiempo acumulado por medida: {METRICAS.linea_resumen()}")
+
+def parse_drug_page(payload) -> Optional[MedicationData]:
+    """Etapa de parseo (se ejecuta en el pool de procesos): ficha de drugs.com → MedicationData"""
+    if isinstance(payload, MedicationData):
+        return payload
+    drug_name, drug_url, drug_html, contenido_hash = payload
+    drug_page = ParsedPage(drug_html)
+    
+    # Extraer información (el árbol se construye en el primer extractor que lo pide)
+    with METRICAS.temporizador('parse', extractor='extract_fda_category'):
+        categoria_fda = ComprehensiveMedScraper.extract_fda_category(drug_page)
+    with METRICAS.temporizador('parse', extractor='extract_pregnancy_info'):
+        notas_clinicas = ComprehensiveMedScraper.extract_pregnancy_info(drug_page)
+    
+    return MedicationData(
+        nombre=drug_name,
+        categoria_fda=categoria_fda,
+        notas_clinicas=notas_clinicas,
+        fuente="drugs.com",
+        url=drug_url,
+        contenido_hash=contenido_hash,
+        confianza_score=5,
+        fecha_actualizacion=datetime.now().strftime("%Y-%m-%d")
+    )
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scraper de drugs.com para medicamentos en embarazo")
+    parser.add_argument('--workers', type=int, default=3, help="Medicamentos procesados en paralelo")
+    parser.add_argument('--host-rate', type=float, default=0.2, help="Peticiones por segundo iniciales por host (sin estado guardado)")
+    parser.add_argument('--max-host-rate', type=float, default=2.0, help="Techo del ritmo adaptativo por host")
+    parser.add_argument('--parse-workers', type=int, default=None, help="Procesos de parseo (por defecto, núcleos - 1; 0 = en el propio proceso)")
+    parser.add_argument('--rate-state', default="db/rate_state.json", help="JSON con los ritmos aprendidos por host")
+    parser.add_argument('--no-cache', action='store_true', help="No usar la caché HTTP en disco")
+    parser.add_argument('--no-archive', action='store_true', help="No archivar el HTML de las fichas")
+    parser.add_argument('--cache-ttl-days', type=float, default=7, help="Días que una respuesta se usa sin revalidar")
+    parser.add_argument('--incremental', action='store_true', help="Solo medicamentos caducados o con la página cambiada")
+    parser.add_argument('--max-age-days', type=float, default=MAX_AGE_DAYS, help="Antigüedad máxima de un dato en modo incremental")
+    parser.add_argument('--metricas', default="logs/metricas_drugs.json", help="Resumen JSON de tiempos y contadores")
+    parser.add_argument('--prometheus', help="Escribir también las métricas en este fichero de texto de Prometheus")
+    parser.add_argument('--profile', nargs='?', const='cprofile', choices=MOTORES,
+                        help="Perfilar contra el sitio local de benchmarks (sin pausas) en vez de scrapear")
+    agregar_argumentos(parser)
+    return parser.parse_args(argv)
+
+def perfilar_scraper(args):
+    """Scraping completo contra el sitio local: sin límite de ritmo, sin caché y parseando en el proceso"""
+    def ejecutar(base_url, directorio):
+        scraper = ComprehensiveMedScraper(db_path=os.path.join(directorio, "medicamentos.db"), workers=args.workers,
+                                          host_rate=1000, max_host_rate=1000, base_url=base_url,
+                                          rate_state_path=None, parse_workers=0)
+        asyncio.run(scraper.run_comprehensive_scraping())
+    perfilar("comprehensive", ejecutar, args.profile)
 
 if __name__ == "__main__":
-    scraper = ComprehensiveMedScraper()
-    asyncio.run(scraper.run_comprehensive_scraping())
+    args = parse_args()
+    if args.profile:
+        perfilar_scraper(args)
+    else:
+        cache = None if args.no_cache else ResponseCache(ttl=args.cache_ttl_days * 24 * 3600)
+        scraper = ComprehensiveMedScraper(workers=args.workers, host_rate=args.host_rate, cache=cache,
+                                          incremental=args.incremental, max_age_days=args.max_age_days,
+                                          max_host_rate=args.max_host_rate, rate_state_path=args.rate_state,
+                                          parse_workers=args.parse_workers,
+                                          archive=None if args.no_archive else HtmlArchive(),
+                                          lista=args.lista, shard=args.shard)
+        asyncio.run(scraper.run_comprehensive_scraping())
+        METRICAS.exportar(args.metricas, args.prometheus)
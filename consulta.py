@@ -0,0 +1,338 @@
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Set
+from urllib.parse import parse_qs, unquote, urlparse
+
+from normalizacion import normalizar
+from schema import COLUMNAS_MEDICAMENTO
+
+DB_PATH = "db/medicamentos.db"
+COLUMNAS = ['id'] + COLUMNAS_MEDICAMENTO + ['updated_at']
+
+
+def _trigramas(texto: str) -> Set[str]:
+    relleno = f'  {texto} '
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+class IndiceMedicamentos:
+    """Índice en memoria de la tabla `medicamentos`, de solo lectura.
+
+    - Búsqueda por prefijo (del nombre completo o de cualquiera de sus palabras) sobre una
+      lista ordenada de claves normalizadas (sin acentos ni mayúsculas), con bisect.
+    - Búsqueda aproximada por trigramas (coeficiente de Dice) cuando no hay prefijo que case.
+    - Los alias de `alias_medicamentos` ('paracetamol', 'tylenol'...) llevan a su canónico.
+    - Filtros por categoría FDA y trimestre con conjuntos de ids precalculados.
+
+    La base de datos se vigila con `PRAGMA data_version` (cambia cuando otra conexión
+    hace commit); entonces solo se releen las filas con `updated_at` posterior a la última
+    carga y se quitan las que ya no existen. La comprobación se hace como mucho cada
+    `intervalo` segundos, para que una consulta normal no toque SQLite.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, intervalo: float = 1.0):
+        self.db_path = db_path
+        self.intervalo = intervalo
+        self.conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.filas: Dict[int, dict] = {}
+        self.claves: List[tuple] = []                      # (clave normalizada, id) ordenadas
+        self.claves_de: Dict[int, List[str]] = {}
+        self.trigramas: Dict[str, Set[int]] = defaultdict(set)
+        self.por_categoria: Dict[Optional[str], Set[int]] = defaultdict(set)
+        self.por_trimestre: Dict[int, Set[int]] = {1: set(), 2: set(), 3: set()}
+        self.alias: Dict[str, str] = {}
+        self.por_nombre: Dict[str, int] = {}
+        self.data_version = None
+        self.ultima_modificacion = ''
+        self.ultima_comprobacion = 0.0
+        self.recargas = 0
+        self.cargar()
+
+    # --- carga y recarga -------------------------------------------------------------
+
+    def _select(self, where: str = '', params: tuple = ()) -> Iterable[dict]:
+        cursor = self.conn.execute(f'SELECT {", ".join(COLUMNAS)} FROM medicamentos {where}', params)
+        for valores in cursor:
+            yield dict(zip(COLUMNAS, valores))
+
+    def _cargar_alias(self):
+        try:
+            self.alias = dict(self.conn.execute('SELECT alias, canonico FROM alias_medicamentos'))
+        except sqlite3.OperationalError:
+            self.alias = {}  # base de datos anterior a la migración v5
+
+    def cargar(self):
+        """Carga completa"""
+        with self.lock:
+            self.data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+            self.filas.clear()
+            self.claves = []
+            self.claves_de.clear()
+            self.trigramas.clear()
+            self.por_categoria.clear()
+            self.por_trimestre = {1: set(), 2: set(), 3: set()}
+            self.por_nombre.clear()
+            self._cargar_alias()
+            claves = []
+            for fila in self._select():
+                claves.extend(self._indexar(fila))
+            # Una sola ordenación al final en vez de un insort por fila
+            self.claves = sorted(claves)
+            self.ultima_comprobacion = time.monotonic()
+
+    def refrescar(self, forzar: bool = False) -> int:
+        """Releer las filas cambiadas si la base de datos cambió. Devuelve cuántas se releyeron"""
+        with self.lock:
+            ahora = time.monotonic()
+            if not forzar and ahora - self.ultima_comprobacion < self.intervalo:
+                return 0
+            self.ultima_comprobacion = ahora
+            version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+            if version == self.data_version:
+                return 0
+            self.data_version = version
+            self.recargas += 1
+            self._cargar_alias()
+
+            # updated_at tiene resolución de segundos: las filas del mismo segundo que la última
+            # carga vuelven a leerse, y se descartan las que no han cambiado
+            claves = []
+            cambiadas = 0
+            for fila in self._select('WHERE updated_at >= ? OR id > ?',
+                                     (self.ultima_modificacion, max(self.filas, default=0))):
+                actual = self.filas.get(fila['id'])
+                if actual is not None and all(actual[k] == fila[k] for k in COLUMNAS):
+                    continue
+                self._quitar(fila['id'])
+                claves.extend(self._indexar(fila))
+                cambiadas += 1
+            if len(claves) > 1000:
+                self.claves.extend(claves)
+                self.claves.sort()
+            else:
+                for clave in claves:
+                    insort(self.claves, clave)
+
+            # Filas borradas (p. ej. fusión de alias): solo si el recuento no cuadra
+            total = self.conn.execute('SELECT COUNT(*) FROM medicamentos').fetchone()[0]
+            if total != len(self.filas):
+                vivas = {fila_id for fila_id, in self.conn.execute('SELECT id FROM medicamentos')}
+                for fila_id in set(self.filas) - vivas:
+                    self._quitar(fila_id)
+                    cambiadas += 1
+            return cambiadas
+
+    def _indexar(self, fila: dict) -> List[tuple]:
+        fila_id = fila['id']
+        nombre = normalizar(fila['nombre'])
+        fila['nombre_normalizado'] = nombre
+        self.filas[fila_id] = fila
+        self.por_nombre[nombre] = fila_id
+        palabras = nombre.split()
+        claves = [nombre] + [' '.join(palabras[i:]) for i in range(1, len(palabras))]
+        self.claves_de[fila_id] = claves
+        for trigrama in _trigramas(nombre):
+            self.trigramas[trigrama].add(fila_id)
+        self.por_categoria[fila['categoria_fda']].add(fila_id)
+        for n in (1, 2, 3):
+            if fila[f'trimestre_{n}']:
+                self.por_trimestre[n].add(fila_id)
+        if (fila['updated_at'] or '') > self.ultima_modificacion:
+            self.ultima_modificacion = fila['updated_at']
+        return [(clave, fila_id) for clave in claves]
+
+    def _quitar(self, fila_id: int):
+        fila = self.filas.pop(fila_id, None)
+        if fila is None:
+            return
+        nombre = fila['nombre_normalizado']
+        if self.por_nombre.get(nombre) == fila_id:
+            del self.por_nombre[nombre]
+        for clave in self.claves_de.pop(fila_id):
+            i = bisect_left(self.claves, (clave, fila_id))
+            if i < len(self.claves) and self.claves[i] == (clave, fila_id):
+                del self.claves[i]
+        for trigrama in _trigramas(nombre):
+            self.trigramas[trigrama].discard(fila_id)
+        self.por_categoria[fila['categoria_fda']].discard(fila_id)
+        for n in (1, 2, 3):
+            self.por_trimestre[n].discard(fila_id)
+
+    # --- consultas ---------------------------------------------------------------------
+
+    def _filtro(self, categoria: Optional[str], trimestre: Optional[int]) -> Optional[Set[int]]:
+        conjuntos = []
+        if categoria:
+            conjuntos.append(self.por_categoria.get(categoria.upper(), set()))
+        if trimestre:
+            conjuntos.append(self.por_trimestre.get(int(trimestre), set()))
+        if not conjuntos:
+            return None
+        return set.intersection(*sorted(conjuntos, key=len))
+
+    def obtener(self, nombre: str) -> Optional[dict]:
+        """Medicamento por nombre exacto (sin acentos ni mayúsculas) o por alias"""
+        self.refrescar()
+        with self.lock:
+            clave = normalizar(nombre)
+            fila_id = self.por_nombre.get(clave)
+            if fila_id is None and clave in self.alias:
+                fila_id = self.por_nombre.get(self.alias[clave])
+            return self.filas.get(fila_id)
+
+    def buscar_prefijo(self, texto: str, categoria: Optional[str] = None, trimestre: Optional[int] = None,
+                       limite: int = 20) -> List[dict]:
+        self.refrescar()
+        with self.lock:
+            return self._buscar_prefijo(normalizar(texto), self._filtro(categoria, trimestre), limite)
+
+    def _buscar_prefijo(self, prefijo: str, filtro: Optional[Set[int]], limite: int) -> List[dict]:
+        ids = []
+        vistos = set()
+        # Un alias ('paracetamol', 'tylenol') lleva directamente a su canónico
+        canonico = self.alias.get(prefijo)
+        if canonico in self.por_nombre:
+            ids.append(self.por_nombre[canonico])
+            vistos.add(ids[0])
+        i = bisect_left(self.claves, (prefijo,))
+        while i < len(self.claves) and len(ids) < limite * 4:
+            clave, fila_id = self.claves[i]
+            if not clave.startswith(prefijo):
+                break
+            if fila_id not in vistos and (filtro is None or fila_id in filtro):
+                vistos.add(fila_id)
+                ids.append(fila_id)
+            i += 1
+        if filtro is not None:
+            ids = [fila_id for fila_id in ids if fila_id in filtro]
+        # Primero el nombre exacto, luego los que empiezan por el texto, luego por palabra
+        ids.sort(key=lambda fila_id: (self.filas[fila_id]['nombre_normalizado'] != prefijo
+                                      and fila_id != self.por_nombre.get(canonico),
+                                      not self.filas[fila_id]['nombre_normalizado'].startswith(prefijo),
+                                      len(self.filas[fila_id]['nombre_normalizado'])))
+        return [self.filas[fila_id] for fila_id in ids[:limite]]
+
+    def buscar_aproximado(self, texto: str, categoria: Optional[str] = None, trimestre: Optional[int] = None,
+                          limite: int = 20, umbral: float = 0.35) -> List[dict]:
+        """Nombres parecidos (erratas, variantes) por coeficiente de Dice sobre trigramas"""
+        self.refrescar()
+        with self.lock:
+            return self._buscar_aproximado(normalizar(texto), self._filtro(categoria, trimestre), limite, umbral)
+
+    def _buscar_aproximado(self, texto: str, filtro: Optional[Set[int]], limite: int, umbral: float) -> List[dict]:
+        consulta = _trigramas(texto)
+        comunes = Counter()
+        for trigrama in consulta:
+            comunes.update(self.trigramas.get(trigrama, ()))
+        puntuadas = []
+        for fila_id, n in comunes.items():
+            if filtro is not None and fila_id not in filtro:
+                continue
+            # len(nombre) + 1 == número de trigramas del nombre con relleno (salvo repetidos)
+            puntuacion = 2 * n / (len(consulta) + len(self.filas[fila_id]['nombre_normalizado']) + 1)
+            if puntuacion >= umbral:
+                puntuadas.append((puntuacion, fila_id))
+        puntuadas.sort(reverse=True)
+        return [self.filas[fila_id] for _, fila_id in puntuadas[:limite]]
+
+    def buscar(self, texto: str = '', categoria: Optional[str] = None, trimestre: Optional[int] = None,
+               limite: int = 20) -> List[dict]:
+        """Prefijo y, si no hay resultados, aproximada. Sin texto, solo filtra (orden alfabético)"""
+        self.refrescar()
+        with self.lock:
+            filtro = self._filtro(categoria, trimestre)
+            texto = normalizar(texto)
+            if not texto:
+                ids = self.filas if filtro is None else filtro
+                return [self.filas[fila_id] for fila_id in
+                        sorted(ids, key=lambda fila_id: self.filas[fila_id]['nombre_normalizado'])[:limite]]
+            return (self._buscar_prefijo(texto, filtro, limite)
+                    or self._buscar_aproximado(texto, filtro, limite, 0.35))
+
+    def estado(self) -> dict:
+        return {'filas': len(self.filas), 'alias': len(self.alias), 'data_version': self.data_version,
+                'recargas': self.recargas, 'ultima_modificacion': self.ultima_modificacion}
+
+    def close(self):
+        self.conn.close()
+
+
+def _publica(fila: dict) -> dict:
+    return {k: v for k, v in fila.items() if k != 'nombre_normalizado'}
+
+
+class ServicioConsulta(BaseHTTPRequestHandler):
+    """API JSON de solo lectura:
+
+    GET /medicamentos?q=paracet&categoria=B&trimestre=1&limite=20
+    GET /medicamentos/<nombre o alias>
+    GET /salud
+    """
+
+    indice: IndiceMedicamentos = None
+
+    def _responder(self, estado: int, cuerpo):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parametros = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            if url.path == '/salud':
+                return self._responder(200, self.indice.estado())
+            if url.path.rstrip('/') == '/medicamentos':
+                trimestre = parametros.get('trimestre')
+                resultados = self.indice.buscar(parametros.get('q', ''), parametros.get('categoria'),
+                                                int(trimestre) if trimestre else None,
+                                                min(int(parametros.get('limite', 20)), 500))
+                return self._responder(200, [_publica(fila) for fila in resultados])
+            if url.path.startswith('/medicamentos/'):
+                fila = self.indice.obtener(unquote(url.path[len('/medicamentos/'):]))
+                if fila:
+                    return self._responder(200, _publica(fila))
+                return self._responder(404, {'error': 'medicamento no encontrado'})
+            self._responder(404, {'error': 'ruta desconocida'})
+        except ValueError as e:
+            self._responder(400, {'error': str(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def servir(db_path: str = DB_PATH, host: str = '127.0.0.1', puerto: int = 8080):
+    indice = IndiceMedicamentos(db_path)
+    ServicioConsulta.indice = indice
+    servidor = ThreadingHTTPServer((host, puerto), ServicioConsulta)
+    print(f"🔎 {len(indice.filas)} medicamentos en memoria; sirviendo en http://{host}:{puerto}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        indice.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio HTTP de consulta (solo lectura) sobre medicamentos.db")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8080)
+    args = parser.parse_args()
+    servir(args.db, args.host, args.puerto)
+
+
+if __name__ == "__main__":
+    main()
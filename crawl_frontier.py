@@ -0,0 +1,175 @@
+import os
+import socket
+import sqlite3
+import time
+from typing import Iterable, Optional, Tuple
+
+PENDING = 'pending'
+IN_PROGRESS = 'in_progress'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def consumer_id() -> str:
+    """Identificador del consumidor actual: host:pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _pid_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class CrawlFrontier:
+    """Frontera de crawl persistente en SQLite: URLs descubiertas y su estado.
+
+    Varios consumidores (hilos o procesos) pueden compartirla: `claim` reserva URLs
+    en una transacción IMMEDIATE con un lease, y si un consumidor muere sus URLs
+    vuelven a estar disponibles cuando caduca el lease.
+    """
+
+    def __init__(self, db_path: str = "db/crawl_frontier.db", max_attempts: int = 3,
+                 lease_seconds: float = 120):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+
+        directorio = os.path.dirname(db_path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS frontera (
+                url TEXT PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                estado TEXT NOT NULL DEFAULT 'pending',
+                intentos INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                consumidor TEXT,
+                lease_hasta REAL,
+                descubierta REAL NOT NULL,
+                actualizada REAL NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_frontera_estado ON frontera(estado, descubierta)')
+        self.conn.commit()
+
+    def add(self, urls: Iterable[str], tipo: str) -> int:
+        """Registrar URLs descubiertas (las ya conocidas se ignoran). Devuelve cuántas son nuevas"""
+        now = time.time()
+        with self.conn:
+            cursor = self.conn.executemany(
+                'INSERT OR IGNORE INTO frontera (url, tipo, descubierta, actualizada) VALUES (?, ?, ?, ?)',
+                [(url, tipo, now, now) for url in urls]
+            )
+        return cursor.rowcount
+
+    def claim(self, consumidor: str = "", tipo: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """Reservar la siguiente URL disponible: (url, tipo), o None si no queda trabajo"""
+        now = time.time()
+        filtro_tipo = 'AND tipo = ?' if tipo else ''
+        params = [now, self.max_attempts] + ([tipo] if tipo else [])
+
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._retirar_agotadas(now)
+            fila = self.conn.execute(f'''
+                SELECT url, tipo FROM frontera
+                WHERE (estado = 'pending' OR (estado = 'in_progress' AND lease_hasta < ?))
+                  AND intentos < ? {filtro_tipo}
+                ORDER BY descubierta
+                LIMIT 1
+            ''', params).fetchone()
+            if fila:
+                self.conn.execute('''
+                    UPDATE frontera
+                    SET estado = 'in_progress', intentos = intentos + 1, consumidor = ?,
+                        lease_hasta = ?, actualizada = ?
+                    WHERE url = ?
+                ''', (consumidor, now + self.lease_seconds, now, fila[0]))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return fila
+
+    def _retirar_agotadas(self, now: float):
+        """Marcar fallidas las URLs sin intentos que ya no se van a reservar: en curso con el
+        lease caducado (su consumidor murió en el último intento) o pendientes"""
+        self.conn.execute('''
+            UPDATE frontera
+            SET estado = 'failed', error = COALESCE(error, 'lease caducado sin intentos'),
+                lease_hasta = NULL, actualizada = ?
+            WHERE intentos >= ? AND (estado = 'pending' OR (estado = 'in_progress' AND lease_hasta < ?))
+        ''', (now, self.max_attempts, now))
+
+    def complete(self, url: str):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE frontera SET estado = 'done', error = NULL, lease_hasta = NULL, actualizada = ? WHERE url = ?",
+                (time.time(), url)
+            )
+
+    def fail(self, url: str, error: str):
+        """Devolver la URL a pendientes, o marcarla fallida si agotó los intentos"""
+        with self.conn:
+            self.conn.execute('''
+                UPDATE frontera
+                SET estado = CASE WHEN intentos >= ? THEN 'failed' ELSE 'pending' END,
+                    error = ?, lease_hasta = NULL, actualizada = ?
+                WHERE url = ?
+            ''', (self.max_attempts, error[:500], time.time(), url))
+
+    def release_orphans(self) -> int:
+        """Liberar las URLs en curso de procesos muertos de esta máquina, sin esperar al lease
+        (las que estaban en su último intento pasan a fallidas).
+
+        Un id igual al nuestro también es huérfano: es un arranque anterior que reutilizó
+        el pid (p. ej. pid 1 en un contenedor reiniciado).
+        """
+        host, yo = socket.gethostname(), os.getpid()
+        huerfanas = []
+        for url, consumidor in self.conn.execute(
+                "SELECT url, consumidor FROM frontera WHERE estado = 'in_progress'"):
+            host_consumidor, _, pid = (consumidor or '').rpartition(':')
+            if host_consumidor == host and pid.isdigit() and (int(pid) == yo or not _pid_vivo(int(pid))):
+                huerfanas.append(url)
+        with self.conn:
+            self.conn.executemany('''
+                UPDATE frontera
+                SET estado = CASE WHEN intentos >= ? THEN 'failed' ELSE 'pending' END,
+                    error = CASE WHEN intentos >= ? THEN COALESCE(error, 'consumidor muerto') ELSE error END,
+                    lease_hasta = NULL
+                WHERE url = ? AND estado = 'in_progress'
+            ''', [(self.max_attempts, self.max_attempts, url) for url in huerfanas])
+        return len(huerfanas)
+
+    def in_progress(self) -> int:
+        """URLs en curso que aún pueden terminar o volver a reservarse (sin las agotadas)"""
+        with self.conn:
+            self._retirar_agotadas(time.time())
+        return self.conn.execute("SELECT COUNT(*) FROM frontera WHERE estado = 'in_progress'").fetchone()[0]
+
+    def stats(self) -> dict:
+        return dict(self.conn.execute('SELECT estado, COUNT(*) FROM frontera GROUP BY estado').fetchall())
+
+    def finished(self) -> bool:
+        """True si hay crawl registrado y no le queda nada por hacer"""
+        with self.conn:
+            self._retirar_agotadas(time.time())
+        stats = self.stats()
+        return bool(stats) and not stats.get(PENDING) and not stats.get(IN_PROGRESS)
+
+    def reset(self):
+        """Empezar un crawl nuevo desde cero"""
+        with self.conn:
+            self.conn.execute('DELETE FROM frontera')
+
+    def close(self):
+        self.conn.close()
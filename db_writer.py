@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+
+from metricas import METRICAS
+
+logger = logging.getLogger(__name__)
+
+_FLUSH = object()
+_CLOSE = object()
+
+
+class BatchedDBWriter:
+    """Escritor SQLite compartido: una conexión (modo WAL) en un hilo propio.
+
+    `submit` solo encola la sentencia, así que puede llamarse desde el event loop sin
+    bloquearlo. El hilo agrupa las sentencias y las escribe con `executemany` en una
+    transacción cuando se juntan `batch_size` filas o pasan `flush_interval` segundos.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 50, flush_interval: float = 2.0,
+                 init: Optional[Callable[[sqlite3.Connection], None]] = None):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.init = init
+        self.rows_written = 0
+        self.errors = 0
+
+        self.queue = queue.Queue()
+        self.ready = threading.Event()
+        self.init_error = None
+        self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.init_error:
+            raise self.init_error
+
+    def submit(self, sql: str, params):
+        """Encolar una sentencia de escritura (no bloquea)"""
+        self.queue.put((sql, params))
+
+    def flush(self):
+        """Esperar a que todo lo encolado esté escrito"""
+        done = threading.Event()
+        self.queue.put((_FLUSH, done))
+        done.wait()
+
+    def close(self):
+        """Escribir lo pendiente y cerrar la conexión"""
+        if self.thread.is_alive():
+            self.queue.put((_CLOSE, None))
+            self.thread.join()
+
+    async def aflush(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.flush)
+
+    async def aclose(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if self.init:
+            self.init(conn)
+            conn.commit()
+        return conn
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            self.init_error = e
+            self.ready.set()
+            return
+        self.ready.set()
+
+        pending = []
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    sql, params = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    sql, params = _FLUSH, None
+
+                if sql is _FLUSH or sql is _CLOSE:
+                    self._write(conn, pending)
+                    pending = []
+                    deadline = None
+                    if params is not None:
+                        params.set()
+                    if sql is _CLOSE:
+                        break
+                    continue
+
+                pending.append((sql, params))
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(pending) >= self.batch_size:
+                    self._write(conn, pending)
+                    pending = []
+                    deadline = None
+        finally:
+            conn.close()
+
+    def _write(self, conn: sqlite3.Connection, pending: list):
+        """Escribir un lote en una transacción, agrupando sentencias iguales consecutivas"""
+        if not pending:
+            return
+
+        groups = []
+        for sql, params in pending:
+            if groups and groups[-1][0] == sql:
+                groups[-1][1].append(params)
+            else:
+                groups.append((sql, [params]))
+
+        try:
+            with METRICAS.temporizador('db_lote'), conn:
+                for sql, rows in groups:
+                    conn.executemany(sql, rows)
+            self.rows_written += len(pending)
+            METRICAS.contar('db_filas', len(pending))
+        except sqlite3.Error as e:
+            # Reintentar fila a fila para no perder el lote entero por una fila mala
+            logger.warning(f"Lote de {len(pending)} filas falló ({e}); reintentando fila a fila")
+            for sql, params in pending:
+                try:
+                    with conn:
+                        conn.execute(sql, params)
+                    self.rows_written += 1
+                except sqlite3.Error as row_error:
+                    self.errors += 1
+                    logger.error(f"Error escribiendo fila {params!r}: {row_error}")
@@ -1,19 +1,127 @@
 import asyncio
-import aiohttp
-import sqlite3
-from bs4 import BeautifulSoup
 import logging
 import time
 import random
-from fake_useragent import UserAgent
 import re
+from bisect import bisect_right
+from urllib.parse import urljoin
 from datetime import datetime
+from http_cache import ResponseCache
+from parsed_page import ParsedPage
+from keyword_matcher import KeywordMatcher
+from db_writer import BatchedDBWriter
+from schema import inicializar_db, fila_medicamento, fila_evidencia, UPSERT_MEDICAMENTO, UPSERT_EVIDENCIA, TOCAR_EVIDENCIA
+from incremental import MAX_AGE_DAYS, PlanIncremental, hash_contenido, ahora_utc
+from rate_limiter import HostRateLimiter, AdaptiveRateController
+from pipeline import StagedPipeline
+from html_archive import HtmlArchive
+from http_client import cabeceras, sesion_async, leer_texto, contar_reintento
+from metricas import METRICAS
+from single_flight import PETICIONES, clave_url, memorizable
+from perfilado import MOTORES, perfilar
+from normalizacion import IndiceAlias, normalizar
+from preferencia_idioma import PreferenciaIdioma, REGISTRAR_IDIOMA
+from lista_trabajo import Shard, agregar_argumentos, cargar_lista, pares_alias
+import argparse
+import os
+
+# Palabras clave que indican contenido médico válido
+KEYWORDS_MEDICOS = [
+    'pregnancy', 'embarazo', 'pregnant', 'embarazada', 'fetal', 'maternal',
+    'risk', 'riesgo', 'compatible', 'contraindicated', 'contraindicado',
+    'trimester', 'trimestre', 'gestation', 'gestacion', 'teratogenic'
+]
+
+# Patrones de riesgo de e-lactancia, en orden de prioridad
+PATRONES_RIESGO = [
+    ('very low risk', 'Muy Bajo Riesgo'),
+    ('low risk', 'Bajo Riesgo'),
+    ('moderate risk', 'Riesgo Moderado'),
+    ('high risk', 'Alto Riesgo'),
+    ('very high risk', 'Muy Alto Riesgo'),
+    ('compatible', 'Compatible'),
+    ('probably compatible', 'Probablemente Compatible'),
+    ('use with caution', 'Usar con Precaución'),
+    ('avoid', 'Evitar'),
+    ('contraindicated', 'Contraindicado'),
+    
+    # Patrones en español
+    ('riesgo muy bajo', 'Muy Bajo Riesgo'),
+    ('riesgo bajo', 'Bajo Riesgo'),
+    ('riesgo moderado', 'Riesgo Moderado'),
+    ('riesgo alto', 'Alto Riesgo'),
+    ('riesgo muy alto', 'Muy Alto Riesgo'),
+    ('compatible', 'Compatible'),
+    ('contraindicado', 'Contraindicado')
+]
+
+# Seguridad por trimestre: (antes, después, trimestre) equivale al patrón 'antes.*después'
+PATRONES_TRIMESTRE = [
+    ('first trimester', 'safe', 'trimestre 1'),
+    ('primer trimestre', 'seguro', 'trimestre 1'),
+    ('second trimester', 'safe', 'trimestre 2'),
+    ('segundo trimestre', 'seguro', 'trimestre 2'),
+    ('third trimester', 'safe', 'trimestre 3'),
+    ('tercer trimestre', 'seguro', 'trimestre 3'),
+    ('safe', 'first trimester', 'trimestre 1'),
+    ('seguro', 'primer trimestre', 'trimestre 1')
+]
+
+# Palabras clave específicas de embarazo
+KEYWORDS_EMBARAZO = [
+    'pregnancy', 'embarazo', 'pregnant', 'embarazada', 'fetal', 'feto',
+    'maternal', 'materna', 'trimester', 'trimestre', 'gestation', 'gestacion',
+    'teratogenic', 'teratogenico', 'birth defect', 'defecto congenito',
+    'prenatal', 'conception', 'concepcion'
+]
+
+KEYWORDS_RECOMENDACIONES = [
+    'alternative', 'alternativa', 'instead', 'en lugar de', 'substitute',
+    'sustituto', 'recommend', 'recomienda', 'safer', 'mas seguro',
+    'avoid', 'evitar', 'caution', 'precaucion'
+]
+
+# Reglas de trimestre indexadas por la palabra que cierra el patrón
+REGLAS_TRIMESTRE = {}
+for _antes, _despues, _trimestre in PATRONES_TRIMESTRE:
+    REGLAS_TRIMESTRE.setdefault(_despues, []).append((_antes, _trimestre))
+
+# Motores construidos una sola vez; validez y riesgo comparten una búsqueda por página
+MOTOR_EMBARAZO = KeywordMatcher(KEYWORDS_MEDICOS + [patron for patron, _ in PATRONES_RIESGO])
+MOTOR_TRIMESTRES = KeywordMatcher(
+    [palabra for antes, despues, _ in PATRONES_TRIMESTRE for palabra in (antes, despues)]
+)
+MOTOR_DETALLES = KeywordMatcher(KEYWORDS_EMBARAZO)
+MOTOR_RECOMENDACIONES = KeywordMatcher(KEYWORDS_RECOMENDACIONES)
 
 class ELactanciaEmbarazoScraper:
-    def __init__(self, db_path: str = "db/medicamentos.db"):
+    def __init__(self, db_path: str = "db/medicamentos.db", cache: ResponseCache = None,
+                 incremental: bool = False, max_age_days: float = MAX_AGE_DAYS,
+                 limiter: HostRateLimiter = None, base_url: str = "https://www.e-lactancia.org",
+                 workers: int = 2, parse_workers: int = None, archive: HtmlArchive = None,
+                 lista=None, shard: Shard = None):
         self.db_path = db_path
-        self.ua = UserAgent()
+        # Medicamentos descargándose a la vez y procesos de parseo (None = núcleos - 1)
+        self.workers = workers
+        self.parse_workers = parse_workers
+        self.base_url = base_url.rstrip('/')
         self.session = None
+        # Con un limitador por host compartido (integrador) no hacen falta pausas fijas
+        self.limiter = limiter
+        # Caché HTTP en disco; las respuestas servidas desde caché no cuentan como descargas
+        self.cache = cache
+        self.descargas = 0
+        # Archivo del HTML de las fichas, para re-extraer sin volver a descargar
+        self.archive = archive
+        self.writer = None
+        # Modo incremental: solo medicamentos caducados o cuya página cambió
+        self.incremental = incremental
+        self.max_age_days = max_age_days
+        self.plan = None
+        # Índice de alias: inglés, español y marcas se guardan con el mismo ID canónico
+        self.alias = None
+        # Historial de aciertos por idioma: qué ficha pedir primero
+        self.preferencias = None
         self.setup_logging()
         
         # Medicamentos en español E inglés para máxima cobertura
@@ -82,6 +190,13 @@ class ELactanciaEmbarazoScraper:
             'progesterone': 'progesterona',
             'misoprostol': 'misoprostol'
         }
+        
+        # Lista externa (ruta o entradas) y/o reparto en shards: ver lista_trabajo.py.
+        # Sin nombre en español se busca con el inglés (una sola petición)
+        self.lista = None
+        if lista is not None or shard:
+            self.lista = cargar_lista(self.medications.items() if lista is None else lista, shard)
+            self.medications = {entrada.nombre: entrada.espanol or entrada.nombre for entrada in self.lista}
 
     def setup_logging(self):
         """Configurar logging"""
@@ -93,112 +208,174 @@ class ELactanciaEmbarazoScraper:
 
     def get_headers(self):
         """Headers basados en código de referencia (BSD-3/Apache-2.0)"""
-        return {
-            'User-Agent': self.ua.random,
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'es-ES,es;q=0.9,en-US,en;q=0.8',  # Español primero, inglés segundo
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Cache-Control': 'max-age=0',
-            'DNT': '1'
-        }
+        return cabeceras('es-ES,es;q=0.9,en-US,en;q=0.8')  # Español primero, inglés segundo
 
     async def init_session(self):
-        """Inicializar sesión HTTP"""
-        connector = aiohttp.TCPConnector(limit=3, limit_per_host=1)
-        timeout = aiohttp.ClientTimeout(total=60)
-        self.session = aiohttp.ClientSession(
-            connector=connector,
-            timeout=timeout
-        )
+        """Inicializar sesión HTTP (pool keep-alive y caché DNS del cliente común)"""
+        self.session = sesion_async(limite=max(3, self.workers), limite_por_host=self.workers, timeout=60)
 
     async def smart_request(self, url: str, retries: int = 3) -> str:
-        """Request inteligente con retry"""
+        """Request inteligente con retry y caché con revalidación condicional"""
+        _, html = await self.peticion(url, retries)
+        return html
+
+    async def peticion(self, url: str, retries: int = 3, seguir_redirecciones: bool = True):
+        """Como smart_request, pero devuelve (estado HTTP, html).
+
+        Un 404, o una redirección con `seguir_redirecciones=False`, es una respuesta
+        definitiva (el producto no existe con ese nombre): se devuelve sin reintentar.
+        El estado es None si no hubo respuesta útil tras los reintentos.
+        La misma URL ya en vuelo o ya respondida en esta ejecución no se vuelve a pedir
+        (ni cuenta como descarga, así que tampoco hay pausa).
+        """
+        return await PETICIONES.compartir(
+            ('peticion', clave_url(url), seguir_redirecciones),
+            lambda: self._peticion(url, retries, seguir_redirecciones),
+            guardar=lambda resultado: memorizable(resultado[0])
+        )
+
+    async def _peticion(self, url: str, retries: int, seguir_redirecciones: bool):
+        cached = self.cache.get(url) if self.cache else None
+        if cached and cached.is_fresh(self.cache.ttl):
+            return 200, cached.body
+        
         for attempt in range(retries):
             try:
                 if attempt > 0:
+                    contar_reintento(url)
+                if attempt > 0 and not self.limiter:
                     delay = [5, 10, 20][min(attempt-1, 2)] + random.uniform(0, 5)
                     self.logger.info(f"⏳ Esperando {delay:.1f}s antes del intento {attempt+1}")
                     await asyncio.sleep(delay)
+                    METRICAS.observar('espera', delay, motivo='reintento')
                 
                 headers = self.get_headers()
-                async with self.session.get(url, headers=headers) as response:
+                if cached:
+                    headers.update(cached.conditional_headers())
+                if self.limiter:
+                    await self.limiter.acquire(url)
+                inicio = time.monotonic()
+                async with self.session.get(url, headers=headers,
+                                            allow_redirects=seguir_redirecciones) as response:
+                    if self.limiter:
+                        self.limiter.record(url, response.status, time.monotonic() - inicio,
+                                            response.headers.get('Retry-After'))
+                    if response.status == 304 and cached:
+                        self.cache.touch(url)
+                        return 200, cached.body
+                    
+                    self.descargas += 1
                     if response.status == 200:
-                        return await response.text()
+                        html = await leer_texto(response)
+                        if self.cache:
+                            self.cache.store(url, html, response.headers.get('ETag'),
+                                             response.headers.get('Last-Modified'))
+                        return 200, html
+                    elif 300 <= response.status < 400 and '/product/' in response.headers.get('Location', ''):
+                        destino = urljoin(url, response.headers['Location'])
+                    elif response.status == 404 or 300 <= response.status < 400:
+                        self.logger.info(f"↪️  HTTP {response.status} para {url} (no existe con ese nombre)")
+                        return response.status, None
                     else:
                         self.logger.warning(f"HTTP {response.status} para {url}")
+                        continue
+                # Redirección a otra ficha (p. ej. el nombre canónico del producto): se sigue
+                return await self.peticion(destino, retries)
                         
             except Exception as e:
+                if self.limiter:
+                    self.limiter.record(url, None, 0.0)
                 self.logger.error(f"Error en intento {attempt+1}: {e}")
                 
-        return None
+        return None, None
 
-    async def buscar_medicamento_dual(self, nombre_ingles: str, nombre_espanol: str):
-        """Buscar medicamento en inglés Y español para máxima cobertura"""
-        resultados = {}
-        
-        # Probar ambos nombres
-        for nombre, idioma in [(nombre_ingles, 'inglés'), (nombre_espanol, 'español')]:
+    def canonico(self, nombre: str) -> str:
+        return self.alias.canonico(nombre) if self.alias else nombre
+
+    async def descargar_dual(self, nombre_ingles: str, nombre_espanol: str):
+        """Etapa de descarga: ficha en el idioma que más probablemente acierte y, si hace falta, en el otro.
+
+        El orden sale del historial de aciertos por medicamento e idioma (a igualdad, español
+        primero, que es el resultado preferido); en cuanto una ficha es válida no se pide
+        la otra. Si los dos nombres son el mismo, una sola petición.
+        Devuelve [(nombre, idioma, url, html, hash, sin_cambios)] para la etapa de parseo.
+        """
+        paginas = []
+        canonico = self.canonico(nombre_ingles)
+        intentos = [(nombre_espanol, 'español'), (nombre_ingles, 'inglés')]
+        if normalizar(nombre_espanol) == normalizar(nombre_ingles):
+            intentos = intentos[:1]
+        elif self.preferencias:
+            intentos = self.preferencias.ordenar(canonico, intentos)
+        
+        for nombre, idioma in intentos:
             self.logger.info(f"🔍 Buscando '{nombre}' ({idioma})")
             
-            # URL directa verificada que funciona
-            url = f"https://www.e-lactancia.org/breastfeeding/{nombre}/product/"
+            # URL directa verificada que funciona; si el producto no existe con ese nombre
+            # e-lactancia redirige al buscador, así que la redirección ya es la respuesta
+            url = f"{self.base_url}/breastfeeding/{nombre}/product/"
             
-            html = await self.smart_request(url)
-            if html and self.es_pagina_valida(html, nombre):
-                info = self.extraer_info_embarazo(html, nombre, url, idioma)
-                if info:
-                    resultados[idioma] = info
-                    self.logger.info(f"✅ Datos encontrados en {idioma}")
-            else:
-                self.logger.warning(f"❌ Sin datos válidos para '{nombre}' ({idioma})")
+            descargas_previas = self.descargas
+            estado, html = await self.peticion(url, seguir_redirecciones=False)
+            valida = False
+            if html:
+                contenido_hash = hash_contenido(html)
+                if self.archive:
+                    self.archive.guardar('e-lactancia.org', canonico, url, html, nombre=nombre,
+                                         idioma=idioma, contenido_hash=contenido_hash)
+                sin_cambios = bool(self.plan and self.plan.sin_cambios(canonico, contenido_hash))
+                paginas.append((nombre, idioma, url, html, contenido_hash, sin_cambios))
+                # La comprobación barata descarta sin parsear; si pasa y aún queda el otro
+                # idioma, decide la validación completa (la misma que la etapa de parseo):
+                # si no, una ficha que solo lo parece dejaría el medicamento sin resultado
+                valida = sin_cambios or (parece_ficha_valida(html, nombre)
+                                         and (len(intentos) == 1 or ficha_valida(html, nombre)))
             
-            # Delay entre búsquedas
-            await asyncio.sleep(random.uniform(3, 6))
+            # Solo cuentan las respuestas definitivas (no los errores de red ni los 429)
+            if estado is not None and self.preferencias and len(intentos) > 1:
+                self.writer.submit(REGISTRAR_IDIOMA, self.preferencias.registrar(canonico, idioma, valida))
+            if valida:
+                break
+            
+            # Delay entre búsquedas (no hace falta si la respuesta vino de la caché)
+            if self.descargas > descargas_previas and not self.limiter:
+                delay = random.uniform(3, 6)
+                await asyncio.sleep(delay)
+                METRICAS.observar('espera', delay, motivo='pausa')
         
-        # Retornar el mejor resultado (español preferido)
-        if 'español' in resultados:
-            return resultados['español']
-        elif 'inglés' in resultados:
-            return resultados['inglés']
-        else:
-            return None
+        return paginas
+
+    async def buscar_medicamento_dual(self, nombre_ingles: str, nombre_espanol: str):
+        """Buscar medicamento en inglés Y español (descarga y parseo, sin pipeline)"""
+        return parsear_paginas_dual(await self.descargar_dual(nombre_ingles, nombre_espanol))
 
-    def es_pagina_valida(self, html: str, nombre_medicamento: str):
+    @staticmethod
+    def es_pagina_valida(pagina: ParsedPage, nombre_medicamento: str):
         """Verificar si la página contiene información médica válida"""
-        soup = BeautifulSoup(html, 'html.parser')
-        contenido = soup.get_text().lower()
-        
-        # Palabras clave que indican contenido médico válido
-        keywords_medicos = [
-            'pregnancy', 'embarazo', 'pregnant', 'embarazada', 'fetal', 'maternal',
-            'risk', 'riesgo', 'compatible', 'contraindicated', 'contraindicado',
-            'trimester', 'trimestre', 'gestation', 'gestacion', 'teratogenic'
-        ]
+        contenido = pagina.text_lower
+        encontradas = pagina.keywords_found(MOTOR_EMBARAZO)
         
         # Contar menciones del medicamento y palabras médicas
         menciones_medicamento = contenido.count(nombre_medicamento.lower())
-        palabras_medicas = sum(1 for keyword in keywords_medicos if keyword in contenido)
+        palabras_medicas = len(encontradas.intersection(KEYWORDS_MEDICOS))
         
         # Válida si tiene al menos 1 mención del medicamento y 3 palabras médicas
         return menciones_medicamento >= 1 and palabras_medicas >= 3
 
-    def extraer_info_embarazo(self, html: str, nombre: str, url: str, idioma: str):
+    @staticmethod
+    def extraer_info_embarazo(pagina: ParsedPage, nombre: str, url: str, idioma: str):
         """Extraer información específica sobre EMBARAZO"""
-        soup = BeautifulSoup(html, 'html.parser')
-        
         # Extraer nivel de riesgo
-        nivel_riesgo = self.extraer_nivel_riesgo(soup)
+        nivel_riesgo = ELactanciaEmbarazoScraper.extraer_nivel_riesgo(pagina)
         
         # Extraer información específica de embarazo
-        info_embarazo = self.extraer_detalles_embarazo(soup)
+        info_embarazo = ELactanciaEmbarazoScraper.extraer_detalles_embarazo(pagina)
         
         # Extraer trimestres seguros
-        trimestres_seguros = self.extraer_trimestres_seguros(soup)
+        trimestres_seguros = ELactanciaEmbarazoScraper.extraer_trimestres_seguros(pagina)
         
         # Extraer recomendaciones
-        recomendaciones = self.extraer_recomendaciones(soup)
+        recomendaciones = ELactanciaEmbarazoScraper.extraer_recomendaciones(pagina)
         
         return {
             'nombre': nombre,
@@ -206,234 +383,299 @@ class ELactanciaEmbarazoScraper:
             'notas_clinicas': info_embarazo,
             'trimestres_seguro': trimestres_seguros,
             'fuente': f"e-lactancia.org ({idioma}) - {url}",
+            'url': url,
             'observaciones': recomendaciones,
             'fecha_actualizacion': datetime.now().strftime("%Y-%m-%d")
         }
 
-    def extraer_nivel_riesgo(self, soup):
+    @staticmethod
+    def extraer_nivel_riesgo(pagina: ParsedPage):
         """Extraer nivel de riesgo específico de embarazo"""
-        contenido = soup.get_text().lower()
-        
-        # Patrones de riesgo de e-lactancia
-        patrones_riesgo = [
-            (r'very low risk', 'Muy Bajo Riesgo'),
-            (r'low risk', 'Bajo Riesgo'), 
-            (r'moderate risk', 'Riesgo Moderado'),
-            (r'high risk', 'Alto Riesgo'),
-            (r'very high risk', 'Muy Alto Riesgo'),
-            (r'compatible', 'Compatible'),
-            (r'probably compatible', 'Probablemente Compatible'),
-            (r'use with caution', 'Usar con Precaución'),
-            (r'avoid', 'Evitar'),
-            (r'contraindicated', 'Contraindicado'),
-            
-            # Patrones en español
-            (r'riesgo muy bajo', 'Muy Bajo Riesgo'),
-            (r'riesgo bajo', 'Bajo Riesgo'),
-            (r'riesgo moderado', 'Riesgo Moderado'),
-            (r'riesgo alto', 'Alto Riesgo'),
-            (r'riesgo muy alto', 'Muy Alto Riesgo'),
-            (r'compatible', 'Compatible'),
-            (r'contraindicado', 'Contraindicado')
-        ]
+        encontradas = pagina.keywords_found(MOTOR_EMBARAZO)
         
-        for patron, nivel in patrones_riesgo:
-            if re.search(patron, contenido):
+        # El primer patrón de la lista presente en la página decide el nivel
+        for patron, nivel in PATRONES_RIESGO:
+            if patron in encontradas:
                 return nivel
         
         return None
 
-    def extraer_detalles_embarazo(self, soup):
+    @staticmethod
+    def extraer_detalles_embarazo(pagina: ParsedPage):
         """Extraer información detallada sobre embarazo"""
-        contenido = soup.get_text()
-        
-        # Palabras clave específicas de embarazo
-        keywords_embarazo = [
-            'pregnancy', 'embarazo', 'pregnant', 'embarazada', 'fetal', 'feto',
-            'maternal', 'materna', 'trimester', 'trimestre', 'gestation', 'gestacion',
-            'teratogenic', 'teratogenico', 'birth defect', 'defecto congenito',
-            'prenatal', 'conception', 'concepcion'
-        ]
-        
         parrafos_embarazo = []
         
-        # Buscar párrafos relevantes
-        for parrafo in contenido.split('\n'):
-            parrafo = parrafo.strip()
-            if len(parrafo) > 100:  # Solo párrafos sustanciales
-                for keyword in keywords_embarazo:
-                    if keyword.lower() in parrafo.lower():
-                        # Limpiar y agregar
-                        parrafo_limpio = re.sub(r'\s+', ' ', parrafo)
-                        if len(parrafo_limpio) > 150:
-                            parrafos_embarazo.append(parrafo_limpio[:400])
+        # Buscar párrafos relevantes (solo se usan los 3 primeros)
+        for parrafo in pagina.paragraphs:
+            if len(parrafo) > 100 and MOTOR_DETALLES.search(parrafo.lower()):  # Solo párrafos sustanciales
+                # Limpiar y agregar
+                parrafo_limpio = re.sub(r'\s+', ' ', parrafo)
+                if len(parrafo_limpio) > 150:
+                    parrafos_embarazo.append(parrafo_limpio[:400])
+                    if len(parrafos_embarazo) == 3:
                         break
         
         # Retornar los 3 párrafos más relevantes
         return ' || '.join(parrafos_embarazo[:3]) if parrafos_embarazo else None
 
-    def extraer_trimestres_seguros(self, soup):
+    @staticmethod
+    def extraer_trimestres_seguros(pagina: ParsedPage):
         """Extraer información sobre seguridad por trimestres"""
-        contenido = soup.get_text().lower()
-        
         trimestres = {
             'trimestre 1': False,
             'trimestre 2': False, 
             'trimestre 3': False
         }
         
-        # Patrones para detectar seguridad por trimestre
-        patrones_seguridad = [
-            r'first trimester.*safe',
-            r'primer trimestre.*seguro',
-            r'second trimester.*safe',
-            r'segundo trimestre.*seguro',
-            r'third trimester.*safe',
-            r'tercer trimestre.*seguro',
-            r'safe.*first trimester',
-            r'seguro.*primer trimestre'
-        ]
-        
-        for patron in patrones_seguridad:
-            if re.search(patron, contenido):
-                if 'first' in patron or 'primer' in patron:
-                    trimestres['trimestre 1'] = True
-                elif 'second' in patron or 'segundo' in patron:
-                    trimestres['trimestre 2'] = True
-                elif 'third' in patron or 'tercer' in patron:
-                    trimestres['trimestre 3'] = True
+        # Equivale a buscar 'antes.*despues': basta con que la última aparición de
+        # 'antes' que termina antes de 'despues' esté en la misma línea
+        contenido = pagina.text_lower
+        finales = {}
+        for posicion, keyword in pagina.keyword_hits(MOTOR_TRIMESTRES):
+            for antes, trimestre in REGLAS_TRIMESTRE.get(keyword, ()):
+                finales_antes = finales.get(antes, [])
+                k = bisect_right(finales_antes, posicion)
+                if k and contenido.find('\n', finales_antes[k - 1], posicion) == -1:
+                    trimestres[trimestre] = True
+            finales.setdefault(keyword, []).append(posicion + len(keyword))
         
         # Formatear resultado
         seguros = [t for t, seguro in trimestres.items() if seguro]
         return ', '.join(seguros) if seguros else None
 
-    def extraer_recomendaciones(self, soup):
+    @staticmethod
+    def extraer_recomendaciones(pagina: ParsedPage):
         """Extraer recomendaciones y alternativas"""
-        contenido = soup.get_text()
-        
-        keywords_recomendaciones = [
-            'alternative', 'alternativa', 'instead', 'en lugar de', 'substitute',
-            'sustituto', 'recommend', 'recomienda', 'safer', 'mas seguro',
-            'avoid', 'evitar', 'caution', 'precaucion'
-        ]
-        
         recomendaciones = []
         
-        for parrafo in contenido.split('.'):
-            parrafo = parrafo.strip()
-            if len(parrafo) > 50:
-                for keyword in keywords_recomendaciones:
-                    if keyword.lower() in parrafo.lower():
-                        parrafo_limpio = re.sub(r'\s+', ' ', parrafo)
-                        if len(parrafo_limpio) > 80:
-                            recomendaciones.append(parrafo_limpio[:250])
+        for parrafo in pagina.sentences:
+            if len(parrafo) > 50 and MOTOR_RECOMENDACIONES.search(parrafo.lower()):
+                parrafo_limpio = re.sub(r'\s+', ' ', parrafo)
+                if len(parrafo_limpio) > 80:
+                    recomendaciones.append(parrafo_limpio[:250])
+                    if len(recomendaciones) == 2:
                         break
         
         return ' | '.join(recomendaciones[:2]) if recomendaciones else None
 
     def setup_database(self):
-        """Configurar base de datos"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS medicamentos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT UNIQUE NOT NULL,
-                categoria_fda TEXT,
-                notas_clinicas TEXT,
-                trimestres_seguro TEXT,
-                fuente TEXT,
-                observaciones TEXT,
-                fecha_actualizacion TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        self.logger.info("✅ Base de datos configurada")
-
-    def save_medication(self, med_data):
-        """Guardar medicamento en base de datos"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO medicamentos 
-            (nombre, categoria_fda, notas_clinicas, trimestres_seguro, fuente, observaciones, fecha_actualizacion)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            med_data['nombre'],
-            med_data['categoria_fda'],
-            med_data['notas_clinicas'],
-            med_data['trimestres_seguro'],
-            med_data['fuente'],
-            med_data['observaciones'],
-            med_data['fecha_actualizacion']
+        """Configurar base de datos (esquema unificado con migraciones)"""
+        version = inicializar_db(self.db_path)
+        self.logger.info(f"✅ Base de datos configurada (esquema v{version})")
+
+    def save_medication(self, med_data, verificado_en=None):
+        """Encolar el medicamento (y la evidencia de e-lactancia) para el escritor por lotes
+        (`verificado_en`: cuándo se descargó la ficha, por defecto ahora)"""
+        nombre = self.canonico(med_data['nombre'])
+        verificado_en = verificado_en or ahora_utc()
+        if med_data.get('sin_cambios'):
+            self.writer.submit(TOCAR_EVIDENCIA, dict(
+                nombre=nombre, fuente='e-lactancia.org', verificado_en=verificado_en
+            ))
+            return
+        
+        campos = dict(
+            nombre=nombre,
+            categoria_fda=med_data['categoria_fda'],
+            notas=med_data['notas_clinicas'],
+            trimestres_seguro=med_data['trimestres_seguro'],
+            observaciones=med_data['observaciones'],
+            fecha_actualizacion=med_data['fecha_actualizacion']
+        )
+        self.writer.submit(UPSERT_MEDICAMENTO, fila_medicamento(fuente=med_data['fuente'], **campos))
+        self.writer.submit(UPSERT_EVIDENCIA, fila_evidencia(
+            fuente='e-lactancia.org', url=med_data['url'], contenido_hash=med_data.get('contenido_hash'),
+            verificado_en=verificado_en, **campos
         ))
-        
-        conn.commit()
-        conn.close()
+
+    async def descargar_medicamento(self, par):
+        """Etapa de descarga del pipeline: las dos fichas de un medicamento"""
+        nombre_ingles, nombre_espanol = par
+        descargas_previas = self.descargas
+        paginas = await self.descargar_dual(nombre_ingles, nombre_espanol)
+        
+        # Delay respetuoso entre medicamentos (10-18 segundos), solo si hubo descargas y no hay limitador
+        if self.descargas > descargas_previas and not self.limiter:
+            delay = random.uniform(10, 18)
+            self.logger.info(f"⏳ Esperando {delay:.1f}s...")
+            await asyncio.sleep(delay)
+            METRICAS.observar('espera', delay, motivo='pausa')
+        return paginas
+
+    def guardar_resultado(self, par, result, total: int, stats: dict, start_time: float):
+        """Etapa de persistencia del pipeline: guardar y llevar la cuenta"""
+        nombre_ingles, nombre_espanol = par
+        stats['procesados'] += 1
+        i = stats['procesados']
+        
+        if result and result.get('sin_cambios'):
+            self.save_medication(result)
+            stats['exitosos'] += 1
+            self.logger.info(f"[{i}/{total}] ♻️  Sin cambios: {result['nombre']}")
+        elif result:
+            self.save_medication(result)
+            stats['exitosos'] += 1
+            riesgo = result['categoria_fda'] or 'N/A'
+            trimestres = result['trimestres_seguro'] or 'N/A'
+            self.logger.info(f"[{i}/{total}] ✅ Guardado: {result['nombre']}")
+            self.logger.info(f"   🎯 Riesgo embarazo: {riesgo}")
+            self.logger.info(f"   📅 Trimestres seguros: {trimestres}")
+        else:
+            stats['fallidos'] += 1
+            self.logger.warning(f"[{i}/{total}] ❌ Sin datos para: {nombre_ingles}/{nombre_espanol}")
+        
+        # Progreso cada 5 medicamentos
+        if i % 5 == 0:
+            elapsed = time.time() - start_time
+            eta_minutes = (elapsed / i) * (total - i) / 60
+            self.logger.info(f"📊 Progreso: {i}/{total} | Exitosos: {stats['exitosos']} | Fallidos: {stats['fallidos']} | ETA: {eta_minutes:.1f} min")
 
     async def run_embarazo_scraping(self):
         """Ejecutar scraping enfocado en EMBARAZO"""
         self.logger.info("🚀 Iniciando scraping de e-lactancia enfocado en EMBARAZO...")
         
         self.setup_database()
+        
+        # Los pares español → inglés pasan a la tabla de alias (y se fusionan las filas
+        # que ya estuvieran guardadas con el nombre en español)
+        self.alias = IndiceAlias(self.db_path)
+        self.alias.registrar(((espanol, ingles) for ingles, espanol in self.medications.items()
+                              if normalizar(espanol) != normalizar(ingles)), tipo='es')
+        if self.lista:
+            self.alias.registrar(pares_alias(self.lista), tipo='lista')
+        vistos = set()
+        pendientes = []
+        for ingles, espanol in self.medications.items():
+            if self.canonico(ingles) not in vistos:
+                vistos.add(self.canonico(ingles))
+                pendientes.append((ingles, espanol))
+        candidatos = len(pendientes)
+        self.preferencias = PreferenciaIdioma(self.db_path, 'e-lactancia.org')
+        if self.incremental:
+            self.plan = PlanIncremental(self.db_path, 'e-lactancia.org', self.max_age_days)
+            pendientes = [(ingles, espanol) for ingles, espanol in pendientes
+                          if not self.plan.vigente(self.canonico(ingles))]
+            self.logger.info(f"♻️  Modo incremental: {candidatos - len(pendientes)} vigentes, {len(pendientes)} por revisar")
+        
+        self.writer = BatchedDBWriter(self.db_path)
         await self.init_session()
         
-        total = len(self.medications)
-        successful = 0
-        failed = 0
+        total = len(pendientes)
+        stats = {'procesados': 0, 'exitosos': 0, 'fallidos': 0}
         
         start_time = time.time()
         
-        for i, (nombre_ingles, nombre_espanol) in enumerate(self.medications.items()):
-            try:
-                self.logger.info(f"\n[{i+1}/{total}] Procesando: {nombre_ingles} / {nombre_espanol}")
-                
-                result = await self.buscar_medicamento_dual(nombre_ingles, nombre_espanol)
-                
-                if result:
-                    self.save_medication(result)
-                    successful += 1
-                    riesgo = result['categoria_fda'] or 'N/A'
-                    trimestres = result['trimestres_seguro'] or 'N/A'
-                    self.logger.info(f"✅ Guardado: {result['nombre']}")
-                    self.logger.info(f"   🎯 Riesgo embarazo: {riesgo}")
-                    self.logger.info(f"   📅 Trimestres seguros: {trimestres}")
-                else:
-                    failed += 1
-                    self.logger.warning(f"❌ Sin datos para: {nombre_ingles}/{nombre_espanol}")
-                
-                # Delay respetuoso entre medicamentos (10-18 segundos)
-                delay = random.uniform(10, 18)
-                self.logger.info(f"⏳ Esperando {delay:.1f}s...")
-                await asyncio.sleep(delay)
-                
-                # Progreso cada 5 medicamentos
-                if (i + 1) % 5 == 0:
-                    elapsed = time.time() - start_time
-                    remaining = total - i - 1
-                    eta_minutes = (elapsed / (i + 1)) * remaining / 60
-                    self.logger.info(f"📊 Progreso: {i+1}/{total} | Exitosos: {successful} | Fallidos: {failed} | ETA: {eta_minutes:.1f} min")
-                
-            except Exception as e:
-                failed += 1
-                self.logger.error(f"💥 Error procesando {nombre_ingles}/{nombre_espanol}: {e}")
-        
-        await self.session.close()
+        pipeline = StagedPipeline(
+            fetch=self.descargar_medicamento,
+            parse=parsear_paginas_dual,
+            persist=lambda par, result: self.guardar_resultado(par, result, total, stats, start_time),
+            fetchers=self.workers,
+            parse_workers=self.parse_workers,
+        )
+        try:
+            await pipeline.run(pendientes)
+        finally:
+            await self.session.close()
+            await self.writer.aclose()
+            if isinstance(self.limiter, AdaptiveRateController):
+                self.limiter.save()
+            if self.cache:
+                self.cache.close()
+            if self.archive:
+                await self.archive.aclose()
         
         elapsed = time.time() - start_time
         self.logger.info(f"\n🏁 SCRAPING DE EMBARAZO COMPLETADO!")
         self.logger.info(f"📈 Resumen final:")
-        self.logger.info(f"   ✅ Exitosos: {successful}")
-        self.logger.info(f"   ❌ Fallidos: {failed}")
+        self.logger.info(f"   ✅ Exitosos: {stats['exitosos']}")
+        self.logger.info(f"   ❌ Fallidos: {stats['fallidos']}")
         self.logger.info(f"   📊 Total: {total}")
         self.logger.info(f"   ⏱️  Tiempo: {elapsed/60:.2f} minutos")
+        self.logger.info(f"   ⏱️  Tiempo acumulado por medida: {METRICAS.linea_resumen()}")
         self.logger.info(f"   📁 Base de datos: {self.db_path}")
 
+def parece_ficha_valida(html: str, nombre: str) -> bool:
+    """Comprobación barata sobre el HTML crudo (sin parsear) de es_pagina_valida.
+
+    Si no pasa, la ficha no es válida y se pide la del otro idioma sin parsear nada; si
+    pasa, confirma `ficha_valida` (puede dar por buena una ficha que no lo es: cuenta
+    menciones en el marcado, la navegación y los scripts).
+    """
+    contenido = html.lower()
+    if nombre.lower() not in contenido:
+        return False
+    return len(MOTOR_EMBARAZO.found(contenido).intersection(KEYWORDS_MEDICOS)) >= 3
+
+
+def ficha_valida(html: str, nombre: str) -> bool:
+    """es_pagina_valida sobre el HTML, para decidir en la etapa de descarga"""
+    pagina = ParsedPage(html)
+    with METRICAS.temporizador('parse', extractor='es_pagina_valida'):
+        return ELactanciaEmbarazoScraper.es_pagina_valida(pagina, nombre)
+
+
+def parsear_paginas_dual(paginas):
+    """Etapa de parseo (se ejecuta en el pool de procesos): mejor resultado de las dos fichas"""
+    resultados = {}
+    for nombre, idioma, url, html, contenido_hash, sin_cambios in paginas:
+        if sin_cambios:
+            resultados[idioma] = {'nombre': nombre, 'url': url, 'contenido_hash': contenido_hash, 'sin_cambios': True}
+            continue
+        pagina = ParsedPage(html)
+        with METRICAS.temporizador('parse', extractor='es_pagina_valida'):
+            valida = ELactanciaEmbarazoScraper.es_pagina_valida(pagina, nombre)
+        if valida:
+            with METRICAS.temporizador('parse', extractor='extraer_info_embarazo'):
+                info = ELactanciaEmbarazoScraper.extraer_info_embarazo(pagina, nombre, url, idioma)
+            if info:
+                info['contenido_hash'] = contenido_hash
+                resultados[idioma] = info
+    
+    # Retornar el mejor resultado (español preferido)
+    if 'español' in resultados:
+        return resultados['español']
+    elif 'inglés' in resultados:
+        return resultados['inglés']
+    else:
+        return None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scraper de e-lactancia enfocado en embarazo")
+    parser.add_argument('--incremental', action='store_true', help="Solo medicamentos caducados o con la página cambiada")
+    parser.add_argument('--max-age-days', type=float, default=MAX_AGE_DAYS, help="Antigüedad máxima de un dato en modo incremental")
+    parser.add_argument('--host-rate', type=float, default=0.1, help="Peticiones por segundo iniciales (sin estado guardado)")
+    parser.add_argument('--max-host-rate', type=float, default=1.0, help="Techo del ritmo adaptativo")
+    parser.add_argument('--rate-state', default="db/rate_state.json", help="JSON con los ritmos aprendidos por host")
+    parser.add_argument('--workers', type=int, default=2, help="Medicamentos descargándose en paralelo")
+    parser.add_argument('--no-archive', action='store_true', help="No archivar el HTML de las fichas")
+    parser.add_argument('--parse-workers', type=int, default=None, help="Procesos de parseo (por defecto, núcleos - 1; 0 = en el propio proceso)")
+    parser.add_argument('--metricas', default="logs/metricas_elactancia.json", help="Resumen JSON de tiempos y contadores")
+    parser.add_argument('--prometheus', help="Escribir también las métricas en este fichero de texto de Prometheus")
+    parser.add_argument('--profile', nargs='?', const='cprofile', choices=MOTORES,
+                        help="Perfilar contra el sitio local de benchmarks (sin pausas) en vez de scrapear")
+    agregar_argumentos(parser)
+    return parser.parse_args(argv)
+
+def perfilar_scraper(args):
+    """Scraping contra el sitio local: limitador sin techo real (sin pausas) y parseo en el proceso"""
+    def ejecutar(base_url, directorio):
+        scraper = ELactanciaEmbarazoScraper(db_path=os.path.join(directorio, "medicamentos.db"),
+                                            limiter=HostRateLimiter(rate=1000, burst=10), base_url=base_url,
+                                            workers=args.workers, parse_workers=0)
+        asyncio.run(scraper.run_embarazo_scraping())
+    perfilar("elactancia_embarazo", ejecutar, args.profile)
+
 if __name__ == "__main__":
-    scraper = ELactanciaEmbarazoScraper()
-    asyncio.run(scraper.run_embarazo_scraping())
+    args = parse_args()
+    if args.profile:
+        perfilar_scraper(args)
+    else:
+        # Sin pausas fijas: el controlador AIMD sube el ritmo mientras e-lactancia responde bien
+        limiter = AdaptiveRateController(rate=args.host_rate, max_rate=args.max_host_rate, state_path=args.rate_state)
+        scraper = ELactanciaEmbarazoScraper(cache=ResponseCache(), incremental=args.incremental,
+                                            max_age_days=args.max_age_days, limiter=limiter,
+                                            workers=args.workers, parse_workers=args.parse_workers,
+                                            archive=None if args.no_archive else HtmlArchive(),
+                                            lista=args.lista, shard=args.shard)
+        asyncio.run(scraper.run_embarazo_scraping())
+        METRICAS.exportar(args.metricas, args.prometheus)
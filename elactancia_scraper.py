@@ -1,50 +1,56 @@
-import requests
-import sqlite3
-from bs4 import BeautifulSoup
+import argparse
+import os
+from bs4 import SoupStrainer
 from tqdm import tqdm
 import time
 from datetime import datetime
+from html_parser import make_soup, has_class, class_strainer
+from db_writer import BatchedDBWriter
+from schema import aplicar_migraciones, fila_medicamento, fila_evidencia, UPSERT_MEDICAMENTO, UPSERT_EVIDENCIA
+from crawl_frontier import CrawlFrontier, consumer_id
+from html_archive import HtmlArchive
+from http_client import sesion_compartida
+from metricas import METRICAS
+from perfilado import MOTORES, perfilar
 
 BASE_URL = "https://www.drugs.com"
 INDEX_URL = "https://www.drugs.com/pregnancy.html"
 DB_PATH = "db/medicamentos.db"
+FRONTIER_PATH = "db/crawl_frontier.db"
+FUENTE = "drugs.com/pregnancy"
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS medicamentos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT UNIQUE,
-            categoria_fda TEXT,
-            notas TEXT,
-            fuente TEXT,
-            trimestre_1 INTEGER,
-            trimestre_2 INTEGER,
-            trimestre_3 INTEGER,
-            ultima_fuente_actualizada TEXT,
-            observaciones TEXT
-        )
-    """)
-    conn.commit()
-    return conn
+def init_db(db_path=DB_PATH):
+    return BatchedDBWriter(db_path, init=aplicar_migraciones)
 
-def extract_links():
-    response = requests.get(INDEX_URL)
-    soup = BeautifulSoup(response.text, "html.parser")
+def extract_links(index_url=INDEX_URL, base_url=BASE_URL):
+    response = sesion_compartida().get(index_url)
+    response.raise_for_status()
+    soup = make_soup(response.text, parse_only=class_strainer("ddc-paging"))
     letter_links = soup.select(".ddc-paging li a")
-    all_links = [BASE_URL + link["href"] for link in letter_links]
+    all_links = [base_url + link["href"] for link in letter_links]
     return all_links
 
-def parse_medications(letter_url):
-    response = requests.get(letter_url)
-    soup = BeautifulSoup(response.text, "html.parser")
+def parse_medications(letter_url, base_url=BASE_URL):
+    response = sesion_compartida().get(letter_url)
+    response.raise_for_status()
+    soup = make_soup(response.text, parse_only=class_strainer("column-list", "ul"))
     meds = soup.select("ul.column-list li a")
-    return [BASE_URL + med["href"] for med in meds]
+    return [base_url + med["href"] for med in meds]
+
+def _detalle_strainer(name, attrs):
+    """Solo el título y el bloque de contenido de la ficha"""
+    return name == "h1" or (name == "div" and has_class(attrs, "contentBox"))
+
+def fetch_medication_detail(url):
+    response = sesion_compartida().get(url)
+    response.raise_for_status()
+    return response.text
 
 def parse_medication_detail(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, "html.parser")
+    return parse_medication_html(fetch_medication_detail(url))
+
+def parse_medication_html(html):
+    soup = make_soup(html, parse_only=SoupStrainer(_detalle_strainer))
     try:
         title = soup.select_one("h1").text.strip()
         category = ""
@@ -85,38 +91,105 @@ def parse_medication_detail(url):
     except Exception:
         return None
 
-def save_to_db(conn, datos):
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO medicamentos (
-            nombre, categoria_fda, notas, fuente, trimestre_1, trimestre_2, trimestre_3, 
-            ultima_fuente_actualizada, observaciones
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(nombre) DO UPDATE SET
-            categoria_fda=excluded.categoria_fda,
-            notas=excluded.notas,
-            fuente=excluded.fuente,
-            trimestre_1=excluded.trimestre_1,
-            trimestre_2=excluded.trimestre_2,
-            trimestre_3=excluded.trimestre_3,
-            ultima_fuente_actualizada=excluded.ultima_fuente_actualizada,
-            observaciones=excluded.observaciones
-    """, datos)
-    conn.commit()
-
-def main():
-    conn = init_db()
-    links = extract_links()
-    for letter_url in tqdm(links, desc="Letras"):
-        med_links = parse_medications(letter_url)
-        for med_url in tqdm(med_links, desc="Medicamentos", leave=False):
-            datos = parse_medication_detail(med_url)
-            if datos:
-                save_to_db(conn, datos)
-            time.sleep(0.3)
-
-    conn.close()
+def save_to_db(writer, datos, url=None):
+    nombre, categoria, notas, fuente, tr1, tr2, tr3, actualizado, observaciones = datos
+    campos = dict(
+        nombre=nombre,
+        categoria_fda=categoria,
+        notas=notas,
+        trimestre_1=tr1,
+        trimestre_2=tr2,
+        trimestre_3=tr3,
+        observaciones=observaciones,
+        fecha_actualizacion=actualizado[:10]
+    )
+    writer.submit(UPSERT_MEDICAMENTO, fila_medicamento(fuente=fuente, **campos))
+    writer.submit(UPSERT_EVIDENCIA, fila_evidencia(fuente=FUENTE, url=url, **campos))
+
+def procesar_url(frontier, writer, url, tipo, base_url=BASE_URL, archive=None):
+    """Procesar una URL de la frontera según su tipo: índice → letras → fichas"""
+    if tipo == "indice":
+        frontier.add(extract_links(url, base_url), "letra")
+    elif tipo == "letra":
+        frontier.add(parse_medications(url, base_url), "medicamento")
+    else:
+        html = fetch_medication_detail(url)
+        if archive:
+            archive.guardar(FUENTE, url, url, html)
+        with METRICAS.temporizador('parse', extractor='parse_medication_html'):
+            datos = parse_medication_html(html)
+        if datos:
+            save_to_db(writer, datos, url)
+            # La URL solo se marca hecha cuando sus filas ya están en disco
+            writer.flush()
+
+def main(reiniciar=False, base_url=BASE_URL, db_path=DB_PATH, frontier_path=FRONTIER_PATH, pausa=0.3,
+         archive=None):
+    writer = init_db(db_path)
+    frontier = CrawlFrontier(frontier_path)
+    index_url = INDEX_URL.replace(BASE_URL, base_url)
+    consumidor = consumer_id()
+
+    # Un crawl terminado (o --reiniciar) empieza de cero; si no, se reanuda donde quedó
+    if reiniciar or frontier.finished():
+        frontier.reset()
+    frontier.add([index_url], "indice")
+    liberadas = frontier.release_orphans()
+    if liberadas:
+        print(f"♻️ {liberadas} URLs de una ejecución interrumpida vuelven a pendientes")
+    print(f"🧭 Frontera: {frontier.stats()}")
+
+    with tqdm(desc="Páginas") as barra:
+        while True:
+            trabajo = frontier.claim(consumidor)
+            if not trabajo:
+                # Otros consumidores aún pueden descubrir URLs, o morir y dejar leases que caducan
+                if frontier.in_progress():
+                    time.sleep(5)
+                    METRICAS.observar('espera', 5, motivo='frontera')
+                    continue
+                break
+            url, tipo = trabajo
+            try:
+                procesar_url(frontier, writer, url, tipo, base_url, archive)
+                frontier.complete(url)
+            except Exception as e:
+                frontier.fail(url, str(e))
+            barra.update(1)
+            time.sleep(pausa)
+            METRICAS.observar('espera', pausa, motivo='pausa')
+
+    writer.close()
+    if archive:
+        archive.close()
+    print(f"🧭 Frontera: {frontier.stats()}")
+    frontier.close()
     print("✅ Drugs.com scraping completado.")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scraper de drugs.com/pregnancy con frontera reanudable")
+    parser.add_argument("--reiniciar", action="store_true",
+                        help="Descartar la frontera guardada y empezar un crawl nuevo")
+    parser.add_argument("--no-archive", action="store_true", help="No archivar el HTML de las fichas")
+    parser.add_argument("--metricas", default="logs/metricas_drugs_pregnancy.json",
+                        help="Resumen JSON de tiempos y contadores")
+    parser.add_argument("--prometheus", help="Escribir también las métricas en este fichero de texto de Prometheus")
+    parser.add_argument("--profile", nargs="?", const="cprofile", choices=MOTORES,
+                        help="Perfilar contra el sitio local de benchmarks (sin pausas) en vez de scrapear")
+    return parser.parse_args()
+
+def perfilar_crawl(motor):
+    """Crawl completo del sitio local, con frontera y base de datos temporales y sin pausa"""
+    def ejecutar(base_url, directorio):
+        main(reiniciar=True, base_url=base_url, db_path=os.path.join(directorio, "medicamentos.db"),
+             frontier_path=os.path.join(directorio, "frontier.db"), pausa=0)
+    perfilar("drugs_pregnancy", ejecutar, motor)
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.profile:
+        perfilar_crawl(args.profile)
+    else:
+        main(reiniciar=args.reiniciar, archive=None if args.no_archive else HtmlArchive())
+        print(f"⏱️ Tiempo acumulado por medida: {METRICAS.linea_resumen()}")
+        METRICAS.exportar(args.metricas, args.prometheus)
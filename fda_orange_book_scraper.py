@@ -1,43 +1,38 @@
 # medicamentos_scraper/fda_orange_book_scraper.py
-import requests
+import aiohttp
 import sqlite3
-from bs4 import BeautifulSoup
-from fake_useragent import UserAgent
 import time
 import json
+from html_parser import make_soup, class_strainer
+from http_client import SesionSync, cabeceras, obtener_texto
+from resultados_fda import AplicacionesFDA
 
 class FDAOrangeBookScraper:
-    def __init__(self):
-        self.base_url = "https://www.accessdata.fda.gov/scripts/cder/ob"
+    def __init__(self, base_url="https://www.accessdata.fda.gov/scripts/cder/ob", orange_book=None):
+        self.base_url = base_url.rstrip('/')
+        # IndiceOrangeBook cargado de los ficheros de datos: responde sin ir a la red
+        self.orange_book = orange_book
         self.search_url = f"{self.base_url}/default.cfm"
-        self.ua = UserAgent()
-        self.session = requests.Session()
-        
-        # Headers robustos basados en tu archivo de citaciones
-        self.headers = {
-            'User-Agent': self.ua.random,
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Cache-Control': 'max-age=0'
-        }
+        # Sesión con keep-alive y reintentos del cliente HTTP común
+        self.session = SesionSync()
+        self.headers = cabeceras()
     
-    def buscar_medicamento_fda(self, nombre_medicamento):
-        """Busca medicamento en FDA Orange Book"""
-        search_params = {
+    def _search_params(self, nombre_medicamento):
+        return {
             'Ingredient': nombre_medicamento,
             'DrugName': '',
             'tableType': 'OB'
         }
-        
+
+    def buscar_medicamento_fda(self, nombre_medicamento):
+        """Busca medicamento en FDA Orange Book"""
+        if self.orange_book is not None:
+            return self.orange_book.buscar(nombre_medicamento)
         try:
             response = self.session.get(
                 self.search_url,
-                params=search_params,
-                headers=self.headers,
-                timeout=30
+                params=self._search_params(nombre_medicamento),
+                headers=self.headers
             )
             
             if response.status_code == 200:
@@ -49,10 +44,27 @@ class FDAOrangeBookScraper:
         except Exception as e:
             print(f"Error buscando en FDA {nombre_medicamento}: {e}")
             return None
+
+    async def buscar_medicamento_fda_async(self, session: aiohttp.ClientSession, nombre_medicamento, limiter=None):
+        """Versión asíncrona sobre una sesión aiohttp compartida; `limiter` reparte los turnos por host"""
+        if self.orange_book is not None:
+            return self.orange_book.buscar(nombre_medicamento)
+        try:
+            estado, html = await obtener_texto(session, self.search_url, self._search_params(nombre_medicamento),
+                                               self.headers, limiter)
+            if html is not None:
+                return self._parsear_fda_response(html, nombre_medicamento)
+            print(f"Error FDA {estado} para {nombre_medicamento}")
+            return None
+
+        except Exception as e:
+            print(f"Error buscando en FDA {nombre_medicamento}: {e}")
+            return None
     
     def _parsear_fda_response(self, html, medicamento):
         """Extrae información oficial de FDA"""
-        soup = BeautifulSoup(html, 'html.parser')
+        # Solo se construye el árbol de la tabla de resultados
+        soup = make_soup(html, parse_only=class_strainer('standardTable', 'table'))
         
         info = {
             'nombre': medicamento,
@@ -61,22 +73,27 @@ class FDAOrangeBookScraper:
             'fecha_aprobacion': '',
             'laboratorio': '',
             'fuente': 'FDA Orange Book',
-            'estado_aprobacion': ''
+            'estado_aprobacion': '',
+            'aplicaciones': AplicacionesFDA()
         }
         
-        # Parsear tabla de resultados FDA
+        # Parsear tabla de resultados FDA: todas las filas, por columnas
         try:
             tabla = soup.find('table', {'class': 'standardTable'})
             if tabla:
                 filas = tabla.find_all('tr')[1:]  # Skip header
                 for fila in filas:
-                    celdas = fila.find_all('td')
+                    celdas = [celda.text.strip() for celda in fila.find_all('td')]
                     if len(celdas) >= 6:
-                        info['numero_aplicacion'] = celdas[0].text.strip()
-                        info['nombre'] = celdas[1].text.strip()
-                        info['laboratorio'] = celdas[2].text.strip()
-                        info['fecha_aprobacion'] = celdas[4].text.strip()
-                        break
+                        # Los campos sueltos son el texto tal cual de la primera fila
+                        if not len(info['aplicaciones']):
+                            info['numero_aplicacion'] = celdas[0]
+                            info['nombre'] = celdas[1]
+                            info['laboratorio'] = celdas[2]
+                            info['fecha_aprobacion'] = celdas[4]
+                        info['aplicaciones'].anadir(numero_aplicacion=celdas[0], nombre=celdas[1],
+                                                    laboratorio=celdas[2], forma=celdas[3],
+                                                    fecha_aprobacion=celdas[4], estado=celdas[5])
         except Exception as e:
             print(f"Error parseando FDA: {e}")
         
@@ -0,0 +1,93 @@
+import sqlite3
+import zlib
+from typing import Iterator, Optional, Tuple
+
+from db_writer import BatchedDBWriter
+from incremental import ahora_utc, hash_contenido
+
+ARCHIVO_PATH = "db/html_archive.db"
+
+# descargada_en se renueva en cada descarga (reextract.py la usa como verificado_en); el
+# HTML solo se reescribe si cambió el contenido
+GUARDAR_PAGINA = '''
+    INSERT INTO paginas (url, fuente, clave, nombre, idioma, html, contenido_hash, descargada_en)
+    VALUES (:url, :fuente, :clave, :nombre, :idioma, :html, :contenido_hash, :descargada_en)
+    ON CONFLICT(url) DO UPDATE SET
+        fuente = excluded.fuente,
+        clave = excluded.clave,
+        nombre = excluded.nombre,
+        idioma = excluded.idioma,
+        html = CASE WHEN paginas.contenido_hash IS excluded.contenido_hash
+                    THEN paginas.html ELSE excluded.html END,
+        contenido_hash = excluded.contenido_hash,
+        descargada_en = excluded.descargada_en
+'''
+
+
+def _crear_tabla(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS paginas (
+            url TEXT PRIMARY KEY,
+            fuente TEXT NOT NULL,
+            clave TEXT NOT NULL,
+            nombre TEXT,
+            idioma TEXT,
+            html BLOB NOT NULL,
+            contenido_hash TEXT,
+            descargada_en TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_paginas_fuente_clave ON paginas(fuente, clave)')
+
+
+def descomprimir(html: bytes) -> str:
+    return zlib.decompress(html).decode('utf-8')
+
+
+def paginas_archivadas(path: str = ARCHIVO_PATH, fuente: Optional[str] = None) -> Iterator[Tuple]:
+    """(fuente, clave, nombre, idioma, url, html comprimido, hash, descargada_en) ordenadas por
+    fuente y clave"""
+    conn = sqlite3.connect(path)
+    try:
+        sql = 'SELECT fuente, clave, nombre, idioma, url, html, contenido_hash, descargada_en FROM paginas'
+        params = ()
+        if fuente:
+            sql += ' WHERE fuente = ?'
+            params = (fuente,)
+        yield from conn.execute(sql + ' ORDER BY fuente, clave, url', params)
+    finally:
+        conn.close()
+
+
+class HtmlArchive:
+    """Archivo del HTML crudo de cada ficha descargada, comprimido con zlib.
+
+    A diferencia de la caché HTTP no caduca ni se poda: guarda la última versión de cada
+    URL para poder volver a pasarla por los extractores (ver reextract.py) sin recrawlear.
+    Las escrituras van por un BatchedDBWriter, así que `guardar` no bloquea el event loop.
+    """
+
+    def __init__(self, path: str = ARCHIVO_PATH):
+        self.path = path
+        self.writer = BatchedDBWriter(path, init=_crear_tabla)
+
+    def guardar(self, fuente: str, clave: str, url: str, html: str, nombre: Optional[str] = None,
+                idioma: Optional[str] = None, contenido_hash: Optional[str] = None):
+        """Archivar una página (si no cambió respecto a la archivada, no se reescribe)"""
+        self.writer.submit(GUARDAR_PAGINA, dict(
+            url=url, fuente=fuente, clave=clave, nombre=nombre, idioma=idioma,
+            html=zlib.compress(html.encode('utf-8'), 6),
+            contenido_hash=contenido_hash or hash_contenido(html),
+            descargada_en=ahora_utc(),
+        ))
+
+    def paginas(self, fuente: Optional[str] = None) -> Iterator[Tuple]:
+        """Páginas archivadas, incluidas las aún pendientes de escribir"""
+        self.writer.flush()
+        return paginas_archivadas(self.path, fuente)
+
+    def close(self):
+        self.writer.close()
+
+    async def aclose(self):
+        await self.writer.aclose()
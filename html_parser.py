@@ -0,0 +1,40 @@
+import os
+from typing import Optional
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+# Backend de BeautifulSoup por defecto ('lxml' o 'html.parser'); configurable por entorno
+DEFAULT_PARSER = os.environ.get('SCRAPER_HTML_PARSER', 'lxml')
+
+
+def resolve_parser(parser: Optional[str] = None) -> str:
+    """Backend a usar: el pedido (o el por defecto), con html.parser si falta lxml"""
+    parser = parser or DEFAULT_PARSER
+    if parser == 'lxml' and not LXML_AVAILABLE:
+        return 'html.parser'
+    return parser
+
+
+def make_soup(html: str, parse_only: Optional[SoupStrainer] = None,
+              parser: Optional[str] = None) -> BeautifulSoup:
+    """Parsear HTML; con `parse_only` solo se construyen los subárboles que interesan"""
+    return BeautifulSoup(html, resolve_parser(parser), parse_only=parse_only)
+
+
+def has_class(attrs: dict, class_name: str) -> bool:
+    """Comprobar una clase CSS en los atributos crudos que recibe un SoupStrainer"""
+    classes = attrs.get('class') or ''
+    if isinstance(classes, str):
+        classes = classes.split()
+    return class_name in classes
+
+
+def class_strainer(class_name: str, tag: Optional[str] = None) -> SoupStrainer:
+    """SoupStrainer para elementos con la clase CSS indicada (aunque tengan varias)"""
+    return SoupStrainer(lambda name, attrs: (tag is None or name == tag) and has_class(attrs, class_name))
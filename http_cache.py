@@ -0,0 +1,204 @@
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+# Cada cuántos store() se buscan entradas caducadas y se recuenta el tamaño real (otros
+# procesos pueden compartir el índice); entre medias se lleva la cuenta en memoria
+REVISAR_CADA = 200
+# Al superar max_bytes se libera hasta esta fracción, para no desalojar en cada escritura
+MARGEN_DESALOJO = 0.9
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    body: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = 0.0
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.fetched_at < ttl
+
+    def conditional_headers(self) -> dict:
+        """Headers para revalidar la respuesta con el servidor"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """Caché HTTP en disco: índice SQLite por URL + cuerpos comprimidos direccionados por contenido.
+
+    El tamaño ocupado se lleva en memoria (`bytes`) en vez de sumarlo en cada escritura;
+    solo se desaloja al pasar de max_bytes, y la caducidad se revisa cada REVISAR_CADA escrituras.
+    """
+
+    def __init__(self, cache_dir: str = "db/http_cache", ttl: float = 7 * 24 * 3600,
+                 max_age: float = 90 * 24 * 3600, max_bytes: int = 200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, 'blobs')
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(os.path.join(cache_dir, 'index.db'))
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS respuestas (
+                url TEXT PRIMARY KEY,
+                body_hash TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_respuestas_accessed ON respuestas(accessed_at)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_respuestas_fetched ON respuestas(fetched_at)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_respuestas_hash ON respuestas(body_hash)')
+        self.conn.commit()
+        self.bytes = self.total_size()
+        self._escrituras = 0
+
+    def _blob_path(self, body_hash: str) -> str:
+        return os.path.join(self.blob_dir, body_hash[:2], f"{body_hash}.z")
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """Respuesta guardada para `url` (fresca o no), o None"""
+        row = self.conn.execute(
+            'SELECT body_hash, etag, last_modified, fetched_at FROM respuestas WHERE url = ?', (url,)
+        ).fetchone()
+        if not row:
+            return None
+
+        body_hash, etag, last_modified, fetched_at = row
+        try:
+            with open(self._blob_path(body_hash), 'rb') as f:
+                body = zlib.decompress(f.read()).decode('utf-8')
+        except (OSError, zlib.error):
+            self.conn.execute('DELETE FROM respuestas WHERE url = ?', (url,))
+            self.conn.commit()
+            return None
+
+        self.conn.execute('UPDATE respuestas SET accessed_at = ? WHERE url = ?', (time.time(), url))
+        self.conn.commit()
+        return CachedResponse(url, body, etag, last_modified, fetched_at)
+
+    def store(self, url: str, body: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """Guardar el cuerpo de una respuesta 200"""
+        data = body.encode('utf-8')
+        body_hash = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(body_hash)
+        compressed_size = 0
+
+        if os.path.exists(path):
+            compressed_size = os.path.getsize(path)
+            nuevo = False
+        else:
+            nuevo = True
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            compressed = zlib.compress(data, 6)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+            compressed_size = len(compressed)
+
+        now = time.time()
+        old = self.conn.execute('SELECT body_hash FROM respuestas WHERE url = ?', (url,)).fetchone()
+        self.conn.execute('''
+            INSERT OR REPLACE INTO respuestas (url, body_hash, etag, last_modified, size, fetched_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (url, body_hash, etag, last_modified, compressed_size, now, now))
+        self.conn.commit()
+
+        if nuevo:
+            self.bytes += compressed_size
+        if old and old[0] != body_hash:
+            self.bytes -= self._delete_blob_if_orphan(old[0])
+
+        self._escrituras += 1
+        if self._escrituras % REVISAR_CADA == 0:
+            self.bytes = self.total_size()
+            self.evict()
+        elif self.bytes > self.max_bytes:
+            self.evict()
+
+    def touch(self, url: str):
+        """Marcar como revalidada (HTTP 304) una respuesta guardada"""
+        now = time.time()
+        self.conn.execute('UPDATE respuestas SET fetched_at = ?, accessed_at = ? WHERE url = ?', (now, now, url))
+        self.conn.commit()
+
+    def _delete_blob_if_orphan(self, body_hash: str) -> int:
+        """Borrar el cuerpo si ninguna URL lo usa ya. Devuelve los bytes liberados"""
+        in_use = self.conn.execute('SELECT 1 FROM respuestas WHERE body_hash = ? LIMIT 1', (body_hash,)).fetchone()
+        if in_use:
+            return 0
+        path = self._blob_path(body_hash)
+        try:
+            liberados = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return 0
+        return liberados
+
+    def total_size(self) -> int:
+        row = self.conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT body_hash, size FROM respuestas)'
+        ).fetchone()
+        return row[0]
+
+    def evict(self):
+        """Eliminar entradas caducadas y, si se supera max_bytes, las menos usadas
+        (hasta bajar a MARGEN_DESALOJO * max_bytes)"""
+        victims = self.conn.execute(
+            'SELECT url, body_hash, size FROM respuestas WHERE fetched_at < ?', (time.time() - self.max_age,)
+        ).fetchall()
+
+        if self.bytes > self.max_bytes:
+            # Referencias que le quedan a cada cuerpo: uno compartido por varias URLs solo
+            # libera sus bytes cuando se desaloja la última
+            restantes: Dict[str, int] = {}
+            size = self.bytes
+
+            def desalojar(url: str, body_hash: str, blob_size: int):
+                nonlocal size
+                if body_hash not in restantes:
+                    restantes[body_hash] = self.conn.execute(
+                        'SELECT COUNT(*) FROM respuestas WHERE body_hash = ?', (body_hash,)).fetchone()[0]
+                restantes[body_hash] -= 1
+                if not restantes[body_hash]:
+                    size -= blob_size
+
+            for victim in victims:
+                desalojar(*victim)
+            caducadas = {url for url, _, _ in victims}
+            objetivo = self.max_bytes * MARGEN_DESALOJO
+            # Recorrido perezoso por el índice de accessed_at: solo se leen las víctimas
+            for url, body_hash, blob_size in self.conn.execute(
+                    'SELECT url, body_hash, size FROM respuestas ORDER BY accessed_at'):
+                if size <= objetivo:
+                    break
+                if url not in caducadas:
+                    victims.append((url, body_hash, blob_size))
+                    desalojar(url, body_hash, blob_size)
+
+        if not victims:
+            return
+        self.conn.executemany('DELETE FROM respuestas WHERE url = ?', [(url,) for url, _, _ in victims])
+        self.conn.commit()
+        for body_hash in {body_hash for _, body_hash, _ in victims}:
+            self.bytes -= self._delete_blob_if_orphan(body_hash)
+
+    def close(self):
+        self.conn.close()
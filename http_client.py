@@ -0,0 +1,171 @@
+import asyncio
+import time
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+import requests
+from fake_useragent import UserAgent
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metricas import METRICAS
+from rate_limiter import AdaptiveRateController, parse_retry_after
+from single_flight import PETICIONES, clave_url, memorizable
+
+# Brotli es opcional: aiohttp y urllib3 solo descomprimen 'br' si está instalado,
+# así que solo se anuncia en ese caso
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+# Valores comunes a todos los scrapers
+TIMEOUT_TOTAL = 45
+TIMEOUT_CONEXION = 10
+REINTENTOS = 3
+ESTADOS_REINTENTABLES = (429, 500, 502, 503, 504)
+DNS_TTL = 300        # segundos que aiohttp reutiliza una resolución DNS
+KEEPALIVE = 30       # segundos que una conexión ociosa sigue abierta en el pool
+
+_ua = None
+_sesion_sync = None
+
+
+def cabeceras(idioma: str = 'en-US,en;q=0.5') -> dict:
+    """Headers de navegador (User-Agent aleatorio) con la compresión que sabemos descomprimir"""
+    global _ua
+    if _ua is None:
+        _ua = UserAgent()
+    return {
+        'User-Agent': _ua.random,
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': idioma,
+        'Accept-Encoding': ACCEPT_ENCODING,
+        'Upgrade-Insecure-Requests': '1',
+        'Cache-Control': 'max-age=0',
+        'DNT': '1'
+    }
+
+
+def sesion_async(limite: int = 10, limite_por_host: int = 4, timeout: float = TIMEOUT_TOTAL) -> aiohttp.ClientSession:
+    """Sesión aiohttp con pool de conexiones keep-alive y caché DNS (crear dentro del event loop).
+
+    Lleva los hooks de METRICAS: tiempos de DNS, conexión y hasta la respuesta, por host.
+    """
+    connector = aiohttp.TCPConnector(limit=limite, limit_per_host=limite_por_host,
+                                     ttl_dns_cache=DNS_TTL, keepalive_timeout=KEEPALIVE)
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=timeout, sock_connect=TIMEOUT_CONEXION),
+        trace_configs=[METRICAS.trace_config()]
+    )
+
+
+async def leer_texto(response: aiohttp.ClientResponse) -> str:
+    """Leer el cuerpo de la respuesta midiendo el tiempo de descarga (y descompresión)"""
+    with METRICAS.temporizador('http_cuerpo', host=response.url.host):
+        return await response.text()
+
+
+def contar_reintento(url: str):
+    METRICAS.contar('http_reintentos', host=urlparse(url).hostname)
+
+
+async def obtener_texto(session: aiohttp.ClientSession, url: str, params: Optional[dict] = None,
+                        headers: Optional[dict] = None, limiter=None,
+                        reintentos: int = REINTENTOS) -> Tuple[Optional[int], Optional[str]]:
+    """GET con reintentos sobre una sesión async: devuelve (estado, html) o (estado, None).
+
+    Reintenta errores de red y ESTADOS_REINTENTABLES con backoff exponencial (o lo que
+    pida Retry-After); `limiter` (HostRateLimiter / AdaptiveRateController) marca el ritmo
+    y recibe el resultado de cada petición. Con el controlador adaptativo las esperas son
+    cosa suya (Retry-After incluido), así que no se duerme aquí.
+
+    La misma URL pedida a la vez desde otra tarea (o ya descargada en esta ejecución)
+    se comparte en vez de repetirse (ver single_flight.py).
+    """
+    return await PETICIONES.compartir(
+        ('texto', clave_url(url, params)),
+        lambda: _obtener_texto(session, url, params, headers, limiter, reintentos),
+        guardar=lambda resultado: memorizable(resultado[0])
+    )
+
+
+async def _obtener_texto(session: aiohttp.ClientSession, url: str, params: Optional[dict], headers: Optional[dict],
+                         limiter, reintentos: int) -> Tuple[Optional[int], Optional[str]]:
+    adaptativo = isinstance(limiter, AdaptiveRateController)
+    estado = None
+    for intento in range(reintentos):
+        espera = 0.5 * 2 ** intento
+        if intento:
+            contar_reintento(url)
+        try:
+            if limiter:
+                await limiter.acquire(url)
+            inicio = time.monotonic()
+            async with session.get(url, params=params, headers=headers or cabeceras()) as response:
+                estado = response.status
+                retry_after = response.headers.get('Retry-After')
+                if limiter:
+                    limiter.record(url, estado, time.monotonic() - inicio, retry_after)
+                if estado == 200:
+                    return estado, await leer_texto(response)
+                if estado not in ESTADOS_REINTENTABLES:
+                    return estado, None
+                espera = parse_retry_after(retry_after) or espera
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if limiter:
+                limiter.record(url, None, 0.0)
+            estado = None
+        if intento + 1 < reintentos and not adaptativo:
+            await asyncio.sleep(espera)
+            METRICAS.observar('espera', espera, motivo='reintento')
+    return estado, None
+
+
+class SesionSync(requests.Session):
+    """requests.Session con pool keep-alive, reintentos (urllib3) y timeout por defecto.
+
+    urllib3 no cachea el DNS, pero al reutilizar las conexiones del pool solo se resuelve
+    (y se negocia TLS) una vez por conexión en vez de una vez por petición.
+    """
+
+    def __init__(self, pool: int = 10, timeout=(TIMEOUT_CONEXION, TIMEOUT_TOTAL), reintentos: int = REINTENTOS):
+        super().__init__()
+        self.timeout = timeout
+        reintento = Retry(total=reintentos, backoff_factor=0.5, status_forcelist=ESTADOS_REINTENTABLES,
+                          allowed_methods=frozenset({'GET', 'HEAD'}), respect_retry_after_header=True,
+                          raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool, max_retries=reintento)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+        self.headers.update(cabeceras())
+
+    def request(self, method, url, **kwargs):
+        # Los GET se comparten entre hilos y se recuerdan durante la ejecución (single_flight.py)
+        if method.upper() == 'GET' and not kwargs.get('stream'):
+            return PETICIONES.compartir_sync(
+                ('sync', clave_url(url, kwargs.get('params'))),
+                lambda: self._request(method, url, **kwargs),
+                guardar=lambda response: memorizable(response.status_code)
+            )
+        return self._request(method, url, **kwargs)
+
+    def _request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlparse(url).hostname
+        # Sin hooks como los de aiohttp: se mide la petición entera (reintentos incluidos)
+        with METRICAS.temporizador('http_sync', host=host):
+            response = super().request(method, url, **kwargs)
+        METRICAS.contar('http_respuestas', host=host, estado=response.status_code)
+        return response
+
+
+def sesion_compartida() -> SesionSync:
+    """Sesión síncrona única por proceso, para los scrapers que hacen peticiones sueltas"""
+    global _sesion_sync
+    if _sesion_sync is None:
+        _sesion_sync = SesionSync()
+    return _sesion_sync
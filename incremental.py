@@ -0,0 +1,51 @@
+import hashlib
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+FORMATO_FECHA = '%Y-%m-%d %H:%M:%S'
+# Por debajo del periodo del cron mensual (run_monthly_scraper.sh): tras un mes de 28
+# días lo comprobado en la ejecución anterior tiene que estar ya caducado
+MAX_AGE_DAYS = 25
+
+
+def ahora_utc() -> str:
+    """Marca de tiempo en el mismo formato (UTC) que CURRENT_TIMESTAMP de SQLite"""
+    return datetime.now(timezone.utc).strftime(FORMATO_FECHA)
+
+
+def hash_contenido(html: str) -> str:
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+
+class PlanIncremental:
+    """Qué medicamentos de una fuente hay que volver a scrapear, según la tabla `evidencias`.
+
+    - Vigente: comprobado hace menos de `max_age_days` días -> no se hace ninguna petición.
+    - Caducado: se descarga (revalidando con la caché HTTP) y, si el hash de la página
+      coincide con el guardado, solo se actualiza `verificado_en`.
+    """
+
+    def __init__(self, db_path: str, fuente: str, max_age_days: float = MAX_AGE_DAYS):
+        self.fuente = fuente
+        self.limite = (datetime.now(timezone.utc) - timedelta(days=max_age_days)).strftime(FORMATO_FECHA)
+        self.estado: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+
+        conn = sqlite3.connect(db_path)
+        try:
+            filas = conn.execute('''
+                SELECT nombre, contenido_hash, COALESCE(verificado_en, updated_at, fecha_actualizacion)
+                FROM evidencias WHERE fuente = ?
+            ''', (fuente,))
+            for nombre, contenido_hash, verificado in filas:
+                self.estado[nombre.lower()] = (contenido_hash, verificado)
+        finally:
+            conn.close()
+
+    def vigente(self, nombre: str) -> bool:
+        _, verificado = self.estado.get(nombre.lower(), (None, None))
+        return bool(verificado) and verificado >= self.limite
+
+    def sin_cambios(self, nombre: str, contenido_hash: str) -> bool:
+        guardado, _ = self.estado.get(nombre.lower(), (None, None))
+        return guardado is not None and guardado == contenido_hash
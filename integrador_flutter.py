@@ -1,17 +1,69 @@
 # medicamentos_scraper/integrador_flutter.py
+import asyncio
 from fda_orange_book_scraper import FDAOrangeBookScraper
-from webmd_scraper import WebMDScraper
-from elactancia_scraper import ELactanciaScraperAvanzado
-import sqlite3
+from elactancia_embarazo_scraper import ELactanciaEmbarazoScraper
+from rate_limiter import HostRateLimiter
+from db_writer import BatchedDBWriter
+from schema import aplicar_migraciones, fila_medicamento, UPSERT_MEDICAMENTO
+from normalizacion import IndiceAlias
+from orange_book import IndiceOrangeBook
+from http_client import sesion_async
+from datetime import datetime
+
+try:
+    from webmd_scraper import WebMDScraper
+except ImportError:
+    WebMDScraper = None
+
+# Peticiones/segundo por host (sustituyen a los sleep fijos entre fuentes y medicamentos)
+RATE_POR_HOST = {
+    'www.accessdata.fda.gov': 0.5,
+    'www.webmd.com': 0.5,
+    'www.e-lactancia.org': 0.25,
+}
 
 class IntegradorMedicamentos:
-    def __init__(self):
-        self.fda_scraper = FDAOrangeBookScraper()
-        self.webmd_scraper = WebMDScraper()
-        self.elactancia_scraper = ELactanciaScraperAvanzado()
-    
-    def buscar_medicamento_completo(self, nombre):
-        """Busca en todas las fuentes y consolida información"""
+    def __init__(self, concurrencia: int = 4, rate_por_host: dict = None, db_path: str = 'db/medicamentos.db',
+                 base_url: str = None, orange_book_db: str = None):
+        # Medicamentos procesados a la vez; cada uno consulta todas sus fuentes en paralelo
+        self.concurrencia = concurrencia
+        self.limiter = HostRateLimiter(rate=0.5, overrides=rate_por_host or RATE_POR_HOST)
+        self.session = None
+        # Con orange_book_db (ver orange_book.py) la FDA se consulta en local, sin peticiones
+        orange_book = IndiceOrangeBook(orange_book_db) if orange_book_db else None
+        # base_url apunta FDA y e-lactancia a un mismo sitio (el servidor falso de benchmarks)
+        if base_url:
+            self.fda_scraper = FDAOrangeBookScraper(base_url=f"{base_url.rstrip('/')}/scripts/cder/ob",
+                                                    orange_book=orange_book)
+            self.elactancia_scraper = ELactanciaEmbarazoScraper(db_path=db_path, limiter=self.limiter,
+                                                                base_url=base_url)
+        else:
+            self.fda_scraper = FDAOrangeBookScraper(orange_book=orange_book)
+            self.elactancia_scraper = ELactanciaEmbarazoScraper(db_path=db_path, limiter=self.limiter)
+        self.webmd_scraper = WebMDScraper() if WebMDScraper else None
+        self.writer = BatchedDBWriter(db_path, init=aplicar_migraciones)
+        self.alias = IndiceAlias(db_path)
+
+    async def init_session(self):
+        """Sesión HTTP compartida por todas las fuentes"""
+        self.session = sesion_async(limite=self.concurrencia * 3, limite_por_host=self.concurrencia, timeout=60)
+        self.elactancia_scraper.session = self.session
+
+    async def close_session(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def _consultar_fuente(self, fuente, consulta):
+        """Una fuente que falla no tumba a las demás"""
+        try:
+            return await consulta
+        except Exception as e:
+            print(f"Error {fuente}: {e}")
+            return None
+
+    async def buscar_medicamento_completo_async(self, nombre):
+        """Busca en todas las fuentes a la vez y consolida información"""
         resultados = {
             'nombre': nombre,
             'fda_info': None,
@@ -22,31 +74,46 @@ class IntegradorMedicamentos:
         
         print(f"🔍 Buscando {nombre} en múltiples fuentes...")
         
-        # FDA Orange Book
-        try:
-            resultados['fda_info'] = self.fda_scraper.buscar_medicamento_fda(nombre)
-            time.sleep(2)  # Rate limiting
-        except Exception as e:
-            print(f"Error FDA: {e}")
-        
-        # WebMD
-        try:
-            resultados['webmd_info'] = self.webmd_scraper.buscar_medicamento_webmd(nombre)
-            time.sleep(2)
-        except Exception as e:
-            print(f"Error WebMD: {e}")
+        consultas = {
+            'fda_info': ('FDA', self.fda_scraper.buscar_medicamento_fda_async(self.session, nombre, self.limiter)),
+            'elactancia_info': ('e-lactancia', self.elactancia_scraper.buscar_medicamento_dual(
+                nombre.lower(), self.elactancia_scraper.medications.get(nombre.lower(), nombre.lower())
+            )),
+        }
+        if self.webmd_scraper:
+            # El scraper de WebMD es síncrono: se ejecuta en un hilo
+            consultas['webmd_info'] = ('WebMD', asyncio.to_thread(self.webmd_scraper.buscar_medicamento_webmd, nombre))
         
-        # e-lactancia
-        try:
-            resultados['elactancia_info'] = self.elactancia_scraper.buscar_medicamento(nombre)
-            time.sleep(2)
-        except Exception as e:
-            print(f"Error e-lactancia: {e}")
+        respuestas = await asyncio.gather(*(
+            self._consultar_fuente(fuente, consulta) for fuente, consulta in consultas.values()
+        ))
+        resultados.update(zip(consultas, respuestas))
         
         # Consolidar información
         resultados['consolidado'] = self._consolidar_informacion(resultados)
         
         return resultados
+
+    async def procesar_medicamentos(self, nombres):
+        """Procesar varios medicamentos solapados; devuelve los resultados según terminan"""
+        semaforo = asyncio.Semaphore(self.concurrencia)
+
+        async def procesar(nombre):
+            async with semaforo:
+                return await self.buscar_medicamento_completo_async(nombre)
+
+        for tarea in asyncio.as_completed([procesar(nombre) for nombre in nombres]):
+            yield await tarea
+
+    def buscar_medicamento_completo(self, nombre):
+        """Versión síncrona para un solo medicamento"""
+        async def buscar():
+            await self.init_session()
+            try:
+                return await self.buscar_medicamento_completo_async(nombre)
+            finally:
+                await self.close_session()
+        return asyncio.run(buscar())
     
     def _consolidar_informacion(self, resultados):
         """Consolida información de múltiples fuentes"""
@@ -71,9 +138,11 @@ class IntegradorMedicamentos:
             consolidado['fuentes'].append('WebMD')
             consolidado['confiabilidad'] += 2
         
-        # e-lactancia para lactancia
+        # e-lactancia para lactancia (y embarazo si no hay WebMD)
         if resultados['elactancia_info']:
             consolidado['notas_lactancia'] = resultados['elactancia_info'].get('notas_lactancia', '')
+            if not consolidado['notas_embarazo']:
+                consolidado['notas_embarazo'] = resultados['elactancia_info'].get('notas_clinicas') or ''
             consolidado['fuentes'].append('e-lactancia.org')
             consolidado['confiabilidad'] += 2
         
@@ -81,24 +150,21 @@ class IntegradorMedicamentos:
     
     def actualizar_db_flutter(self, medicamento_consolidado):
         """Actualiza la base de datos de Flutter"""
-        conn = sqlite3.connect('db/medicamentos.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO medicamentos 
-            (nombre, categoria_fda, notas_clinicas, fuente, trimestre_1, trimestre_2, trimestre_3)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            medicamento_consolidado['nombre'],
-            medicamento_consolidado['categoria_fda'],
-            f"{medicamento_consolidado['notas_embarazo']}\n\nLactancia: {medicamento_consolidado['notas_lactancia']}",
-            ', '.join(medicamento_consolidado['fuentes']),
-            1 if medicamento_consolidado['categoria_fda'] in ['A', 'B'] else 0,
-            1 if medicamento_consolidado['categoria_fda'] in ['A', 'B'] else 0,
-            1 if medicamento_consolidado['categoria_fda'] in ['A', 'B'] else 0
+        segura = 1 if medicamento_consolidado['categoria_fda'] in ['A', 'B'] else 0
+        self.writer.submit(UPSERT_MEDICAMENTO, fila_medicamento(
+            nombre=self.alias.canonico(medicamento_consolidado['nombre']),
+            categoria_fda=medicamento_consolidado['categoria_fda'] or None,
+            notas=f"{medicamento_consolidado['notas_embarazo']}\n\nLactancia: {medicamento_consolidado['notas_lactancia']}",
+            fuente=', '.join(medicamento_consolidado['fuentes']),
+            trimestre_1=segura,
+            trimestre_2=segura,
+            trimestre_3=segura,
+            confianza_score=medicamento_consolidado['confiabilidad'],
+            fecha_actualizacion=datetime.now().strftime("%Y-%m-%d")
         ))
         
-        conn.commit()
-        conn.close()
-        
-        print(f"✅ {medicamento_consolidado['nombre']} actualizado en Flutter DB")
+        print(f"✅ {medicamento_consolidado['nombre']} encolado para Flutter DB")
+    
+    def cerrar(self):
+        """Escribir los cambios pendientes y cerrar la base de datos"""
+        self.writer.close()
@@ -0,0 +1,35 @@
+from typing import Iterable, List, Set, Tuple
+
+
+class KeywordMatcher:
+    """Motor de palabras clave literales, construido una vez por conjunto de palabras.
+
+    Cada palabra se busca con la búsqueda de subcadenas de `str` (implementada en C),
+    que en CPython resulta varias veces más rápida que una regex con alternancia o un
+    autómata Aho-Corasick para unas decenas de palabras (ver
+    benchmarks/bench_keyword_matcher.py). Las apariciones solapadas ('low risk' dentro
+    de 'very low risk') se cuentan igual que con la búsqueda palabra por palabra, así
+    que las reglas de prioridad de los extractores no cambian.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = list(dict.fromkeys(keywords))
+
+    def hits(self, text: str) -> List[Tuple[int, str]]:
+        """Todas las apariciones (posición, palabra) ordenadas por posición"""
+        found = []
+        for keyword in self.keywords:
+            position = text.find(keyword)
+            while position != -1:
+                found.append((position, keyword))
+                position = text.find(keyword, position + 1)
+        found.sort()
+        return found
+
+    def found(self, text: str) -> Set[str]:
+        """Conjunto de palabras que aparecen en el texto"""
+        return {keyword for keyword in self.keywords if keyword in text}
+
+    def search(self, text: str) -> bool:
+        """True si aparece al menos una palabra"""
+        return any(keyword in text for keyword in self.keywords)
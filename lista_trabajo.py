@@ -0,0 +1,189 @@
+"""Listas de medicamentos a procesar, leídas de CSV, JSONL o SQLite.
+
+Cada entrada es un medicamento (nombre genérico en inglés) con, opcionalmente, su
+nombre en español, alias y una prioridad. Columnas / claves reconocidas:
+
+    nombre (o name)          obligatoria
+    espanol (o nombre_es)    nombre para e-lactancia en español
+    alias (o aliases)        lista JSON o texto separado por '|' o ';'
+    prioridad (o priority)   número; las más altas se procesan antes
+
+    python comprehensive_scraper.py --lista formulario.csv --shard 2/8
+
+Con `--shard i/N` (i de 0 a N-1) cada proceso se queda con los medicamentos cuyo hash
+del nombre canónico cae en su parte: el reparto es estable entre máquinas y no necesita
+coordinación, y un medicamento y sus alias siempre caen en el mismo shard.
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import zlib
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from normalizacion import ALIAS_INICIALES, normalizar
+
+TABLA_POR_DEFECTO = 'lista_trabajo'
+EXTENSIONES_SQLITE = ('.db', '.sqlite', '.sqlite3')
+
+Shard = Tuple[int, int]
+
+
+@dataclass
+class EntradaTrabajo:
+    nombre: str
+    espanol: Optional[str] = None
+    alias: List[str] = field(default_factory=list)
+    prioridad: float = 0.0
+
+    @property
+    def clave(self) -> str:
+        nombre = normalizar(self.nombre)
+        return ALIAS_INICIALES.get(nombre, nombre)
+
+
+def parse_shard(texto: str) -> Shard:
+    """'i/N' → (i, N), para argparse"""
+    try:
+        i, n = (int(parte) for parte in texto.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard '{texto}' no tiene la forma i/N")
+    if n < 1 or not 0 <= i < n:
+        raise argparse.ArgumentTypeError(f"shard '{texto}': hace falta 0 <= i < N")
+    return i, n
+
+
+def en_shard(entrada: EntradaTrabajo, shard: Optional[Shard]) -> bool:
+    if not shard:
+        return True
+    i, n = shard
+    return zlib.crc32(entrada.clave.encode('utf-8')) % n == i
+
+
+def _campo(fila: dict, *nombres):
+    for nombre in nombres:
+        valor = fila.get(nombre)
+        if valor not in (None, ''):
+            return valor
+    return None
+
+
+def _entrada(fila: dict) -> Optional[EntradaTrabajo]:
+    nombre = _campo(fila, 'nombre', 'name')
+    if not nombre or not str(nombre).strip():
+        return None
+    alias = _campo(fila, 'alias', 'aliases') or []
+    if isinstance(alias, str):
+        alias = alias.replace(';', '|').split('|')
+    prioridad = _campo(fila, 'prioridad', 'priority')
+    return EntradaTrabajo(
+        nombre=str(nombre).strip(),
+        espanol=(str(_campo(fila, 'espanol', 'nombre_es', 'spanish') or '').strip() or None),
+        alias=[a.strip() for a in alias if a and a.strip()],
+        prioridad=float(prioridad) if prioridad is not None else 0.0,
+    )
+
+
+def _leer_csv(path: str) -> Iterator[dict]:
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        yield from csv.DictReader(f)
+
+
+def _leer_jsonl(path: str) -> Iterator[dict]:
+    with open(path, encoding='utf-8') as f:
+        for numero, linea in enumerate(f, 1):
+            linea = linea.strip()
+            if not linea or linea.startswith('#'):
+                continue
+            try:
+                yield json.loads(linea)
+            except ValueError as e:
+                print(f"⚠️ {path}:{numero}: línea JSON inválida ({e})")
+
+
+def _leer_sqlite(origen: str) -> Iterator[dict]:
+    """'ruta.db' (tabla lista_trabajo) o 'ruta.db:tabla'"""
+    path, _, tabla = origen.partition(':') if not os.path.exists(origen) else (origen, '', '')
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        for fila in conn.execute(f'SELECT * FROM "{tabla or TABLA_POR_DEFECTO}"'):
+            yield dict(fila)
+    finally:
+        conn.close()
+
+
+def leer_origen(origen: Union[str, Iterable]) -> Iterator[EntradaTrabajo]:
+    """Entradas de un fichero (según su extensión) o de un iterable en memoria, en streaming.
+
+    El iterable puede traer nombres, pares (inglés, español) o `EntradaTrabajo`: así las
+    listas por defecto de los scrapers pasan por el mismo reparto en shards.
+    """
+    if not isinstance(origen, str):
+        for elemento in origen:
+            if isinstance(elemento, EntradaTrabajo):
+                yield elemento
+            elif isinstance(elemento, str):
+                yield EntradaTrabajo(elemento)
+            else:
+                ingles, espanol = elemento
+                yield EntradaTrabajo(ingles, espanol)
+        return
+
+    extension = os.path.splitext(origen.split(':')[0] if not os.path.exists(origen) else origen)[1].lower()
+    if extension == '.csv':
+        filas = _leer_csv(origen)
+    elif extension in ('.jsonl', '.ndjson'):
+        filas = _leer_jsonl(origen)
+    elif extension in EXTENSIONES_SQLITE:
+        filas = _leer_sqlite(origen)
+    else:
+        raise ValueError(f"Formato de lista no reconocido: {origen} (CSV, JSONL o SQLite)")
+    for fila in filas:
+        entrada = _entrada(fila)
+        if entrada:
+            yield entrada
+
+
+def cargar_lista(origen: Union[str, Iterable], shard: Optional[Shard] = None,
+                 ordenar: bool = True) -> List[EntradaTrabajo]:
+    """Entradas del shard, sin repetidos y (con `ordenar`) de mayor a menor prioridad.
+
+    Solo se guardan en memoria las entradas del propio shard. Un medicamento repetido se
+    queda con la primera aparición, la prioridad más alta y la unión de sus alias; a igual
+    prioridad se respeta el orden del origen.
+    """
+    entradas = {}
+    for entrada in leer_origen(origen):
+        if not en_shard(entrada, shard):
+            continue
+        previa = entradas.get(entrada.clave)
+        if previa is None:
+            entradas[entrada.clave] = entrada
+            continue
+        previa.prioridad = max(previa.prioridad, entrada.prioridad)
+        previa.espanol = previa.espanol or entrada.espanol
+        previa.alias.extend(a for a in entrada.alias if a not in previa.alias)
+    lista = list(entradas.values())
+    if ordenar:
+        lista.sort(key=lambda entrada: -entrada.prioridad)
+    return lista
+
+
+def pares_alias(lista: Iterable[EntradaTrabajo]) -> Iterator[Tuple[str, str]]:
+    """(alias, nombre de la entrada) de la lista, para IndiceAlias.registrar, que resuelve
+    el nombre a su canónico ('paracetamol' → 'acetaminophen') antes de guardarlo"""
+    for entrada in lista:
+        for alias in entrada.alias:
+            if normalizar(alias) != normalizar(entrada.nombre):
+                yield alias, entrada.nombre
+
+
+def agregar_argumentos(parser: argparse.ArgumentParser):
+    """--lista y --shard, comunes a los scrapers"""
+    parser.add_argument('--lista', help="Medicamentos a procesar (CSV, JSONL o SQLite, ruta.db[:tabla]) "
+                                        "en vez de la lista incluida")
+    parser.add_argument('--shard', type=parse_shard, metavar='i/N',
+                        help="Procesar solo la parte i (de 0 a N-1) de la lista repartida en N")
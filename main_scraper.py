@@ -1,28 +1,71 @@
 # medicamentos_scraper/main_scraper.py
+import argparse
+import asyncio
+import os
+from urllib.parse import urlparse
 from integrador_flutter import IntegradorMedicamentos
+from orange_book import DB_PATH as ORANGE_BOOK_DB, cargar_orange_book
+from perfilado import MOTORES, perfilar
+from lista_trabajo import agregar_argumentos, cargar_lista
+
+async def procesar(integrador, medicamentos):
+    await integrador.init_session()
+    try:
+        async for resultado in integrador.procesar_medicamentos(medicamentos):
+            medicamento = resultado['nombre']
+            print(f"\n{'='*50}")
+            print(f"Procesado: {medicamento}")
+            print('='*50)
+            
+            if resultado['consolidado']['confiabilidad'] > 2:
+                integrador.actualizar_db_flutter(resultado['consolidado'])
+            else:
+                print(f"⚠️ Información insuficiente para {medicamento}")
+    finally:
+        await integrador.close_session()
+
+# Lista de medicamentos comunes en obstetricia
+MEDICAMENTOS = [
+    'Acetaminophen', 'Ibuprofen', 'Aspirin', 'Metformin',
+    'Insulin', 'Folic Acid', 'Iron', 'Prenatal Vitamins'
+]
+
+def perfilar_integrador(motor):
+    """Todas las fuentes contra el sitio local, sin límite de ritmo y con base de datos temporal"""
+    def ejecutar(base_url, directorio):
+        integrador = IntegradorMedicamentos(rate_por_host={urlparse(base_url).netloc: 1000},
+                                            db_path=os.path.join(directorio, "medicamentos.db"),
+                                            base_url=base_url)
+        asyncio.run(procesar(integrador, MEDICAMENTOS))
+        integrador.cerrar()
+    perfilar("integrador", ejecutar, motor)
 
 def main():
-    integrador = IntegradorMedicamentos()
+    parser = argparse.ArgumentParser(description="Integrador de fuentes para la base de datos de Flutter")
+    parser.add_argument('--profile', nargs='?', const='cprofile', choices=MOTORES,
+                        help="Perfilar contra el sitio local de benchmarks (sin pausas) en vez de scrapear")
+    parser.add_argument('--orange-book', metavar='DIRECTORIO',
+                        help="Cargar los ficheros de datos del Orange Book y consultar la FDA en local")
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+    if args.profile:
+        perfilar_integrador(args.profile)
+        return
+    
+    orange_book_db = None
+    if args.orange_book:
+        cargar_orange_book(args.orange_book, ORANGE_BOOK_DB)
+        orange_book_db = ORANGE_BOOK_DB
+    integrador = IntegradorMedicamentos(orange_book_db=orange_book_db)
+    
+    medicamentos = MEDICAMENTOS
+    if args.lista or args.shard:
+        medicamentos = [entrada.nombre for entrada in cargar_lista(args.lista or MEDICAMENTOS, args.shard)]
     
-    # Lista de medicamentos comunes en obstetricia
-    medicamentos = [
-        'Acetaminophen', 'Ibuprofen', 'Aspirin', 'Metformin',
-        'Insulin', 'Folic Acid', 'Iron', 'Prenatal Vitamins'
-    ]
+    # Sin pausas globales: el limitador por host del integrador reparte las peticiones
+    asyncio.run(procesar(integrador, medicamentos))
     
-    for medicamento in medicamentos:
-        print(f"\n{'='*50}")
-        print(f"Procesando: {medicamento}")
-        print('='*50)
-        
-        resultado = integrador.buscar_medicamento_completo(medicamento)
-        
-        if resultado['consolidado']['confiabilidad'] > 2:
-            integrador.actualizar_db_flutter(resultado['consolidado'])
-        else:
-            print(f"⚠️ Información insuficiente para {medicamento}")
-        
-        time.sleep(5)  # Rate limiting entre medicamentos
+    integrador.cerrar()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,257 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+import aiohttp
+
+MUESTRAS_MAX = 5000   # muestras por temporizador para los percentiles (reservoir sampling)
+PREFIJO = 'scraper'   # prefijo de las métricas en el fichero Prometheus
+
+
+def _clave(nombre: str, etiquetas: dict) -> Tuple[str, tuple]:
+    return nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+
+def _texto_clave(clave) -> str:
+    nombre, etiquetas = clave
+    if not etiquetas:
+        return nombre
+    return nombre + '{' + ','.join(f'{k}={v}' for k, v in etiquetas) + '}'
+
+
+def _percentil(ordenadas: list, q: float) -> float:
+    if not ordenadas:
+        return 0.0
+    return ordenadas[min(len(ordenadas) - 1, int(q * len(ordenadas)))]
+
+
+class Temporizador:
+    __slots__ = ('cuenta', 'total', 'maximo', 'muestras')
+
+    def __init__(self):
+        self.cuenta = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.muestras = []
+
+    def anadir(self, segundos: float, rnd: random.Random):
+        self.cuenta += 1
+        self.total += segundos
+        self.maximo = max(self.maximo, segundos)
+        if len(self.muestras) < MUESTRAS_MAX:
+            self.muestras.append(segundos)
+        else:
+            i = rnd.randrange(self.cuenta)
+            if i < MUESTRAS_MAX:
+                self.muestras[i] = segundos
+
+    def fusionar(self, otro: 'Temporizador', rnd: random.Random):
+        self.cuenta += otro.cuenta
+        self.total += otro.total
+        self.maximo = max(self.maximo, otro.maximo)
+        self.muestras.extend(otro.muestras)
+        if len(self.muestras) > MUESTRAS_MAX:
+            self.muestras = rnd.sample(self.muestras, MUESTRAS_MAX)
+
+    def resumen(self) -> dict:
+        ordenadas = sorted(self.muestras)
+        return {
+            'cuenta': self.cuenta,
+            'total_s': round(self.total, 4),
+            'media_ms': round(self.total / self.cuenta * 1000, 3) if self.cuenta else 0.0,
+            'p50_ms': round(_percentil(ordenadas, 0.5) * 1000, 3),
+            'p95_ms': round(_percentil(ordenadas, 0.95) * 1000, 3),
+            'max_ms': round(self.maximo * 1000, 3),
+        }
+
+
+class Metricas:
+    """Temporizadores y contadores de un proceso, con etiquetas opcionales (host, estado...).
+
+    Seguro entre hilos (el escritor por lotes mide desde su hilo). Los procesos del pool de
+    parseo miden en su propia instancia y el pipeline fusiona lo que devuelven (`volcar` /
+    `fusionar`). Se exporta como resumen JSON y como fichero de texto de Prometheus
+    (formato del textfile collector de node_exporter).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.temporizadores: Dict[tuple, Temporizador] = {}
+            self.contadores: Counter = Counter()
+            self.inicio = time.time()
+
+    def observar(self, nombre: str, segundos: float, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            temporizador = self.temporizadores.get(clave)
+            if temporizador is None:
+                temporizador = self.temporizadores[clave] = Temporizador()
+            temporizador.anadir(segundos, self._random)
+
+    @contextmanager
+    def temporizador(self, nombre: str, **etiquetas):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - inicio, **etiquetas)
+
+    def contar(self, nombre: str, n: int = 1, **etiquetas):
+        with self._lock:
+            self.contadores[_clave(nombre, etiquetas)] += n
+
+    def volcar(self) -> dict:
+        """Estado actual (serializable por pickle) y reinicio, para enviarlo a otro proceso"""
+        with self._lock:
+            volcado = {'temporizadores': self.temporizadores, 'contadores': self.contadores}
+            self.temporizadores = {}
+            self.contadores = Counter()
+        return volcado
+
+    def fusionar(self, volcado: dict):
+        with self._lock:
+            for clave, otro in volcado['temporizadores'].items():
+                temporizador = self.temporizadores.get(clave)
+                if temporizador is None:
+                    temporizador = self.temporizadores[clave] = Temporizador()
+                temporizador.fusionar(otro, self._random)
+            self.contadores.update(volcado['contadores'])
+
+    def resumen(self) -> dict:
+        with self._lock:
+            temporizadores = sorted(self.temporizadores.items(), key=lambda item: -item[1].total)
+            return {
+                'duracion_s': round(time.time() - self.inicio, 3),
+                'temporizadores': {_texto_clave(clave): t.resumen() for clave, t in temporizadores},
+                'contadores': {_texto_clave(clave): n for clave, n in sorted(self.contadores.items())},
+            }
+
+    def linea_resumen(self, n: int = 5) -> str:
+        """Los `n` temporizadores con más tiempo acumulado (sumando etiquetas), para el log"""
+        totales = Counter()
+        with self._lock:
+            for (nombre, _), t in self.temporizadores.items():
+                totales[nombre] += t.total
+        return ' · '.join(f'{nombre} {total:.1f}s' for nombre, total in totales.most_common(n))
+
+    def guardar_json(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.resumen(), f, indent=2, ensure_ascii=False)
+
+    def guardar_prometheus(self, path: str):
+        """Fichero de texto de Prometheus; se escribe aparte y se renombra (escritura atómica)"""
+        lineas = []
+        with self._lock:
+            temporizadores = sorted(self.temporizadores.items())
+            contadores = sorted(self.contadores.items())
+        tipos = set()
+        for (nombre, etiquetas), t in temporizadores:
+            metrica = f'{PREFIJO}_{nombre}_seconds'
+            if metrica not in tipos:
+                tipos.add(metrica)
+                lineas.append(f'# TYPE {metrica} summary')
+            ordenadas = sorted(t.muestras)
+            for q in (0.5, 0.95):
+                lineas.append(f'{metrica}{_etiquetas_prom(etiquetas, quantile=q)} {_percentil(ordenadas, q):.6f}')
+            lineas.append(f'{metrica}_sum{_etiquetas_prom(etiquetas)} {t.total:.6f}')
+            lineas.append(f'{metrica}_count{_etiquetas_prom(etiquetas)} {t.cuenta}')
+        for (nombre, etiquetas), n in contadores:
+            metrica = f'{PREFIJO}_{nombre}_total'
+            if metrica not in tipos:
+                tipos.add(metrica)
+                lineas.append(f'# TYPE {metrica} counter')
+            lineas.append(f'{metrica}{_etiquetas_prom(etiquetas)} {n}')
+
+        temporal = f'{path}.tmp'
+        with open(temporal, 'w') as f:
+            f.write('\n'.join(lineas) + '\n')
+        os.replace(temporal, path)
+
+    def exportar(self, json_path: str = None, prometheus_path: str = None):
+        for path in (json_path, prometheus_path):
+            directorio = os.path.dirname(path or '')
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+        if json_path:
+            self.guardar_json(json_path)
+        if prometheus_path:
+            self.guardar_prometheus(prometheus_path)
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """Hooks de aiohttp: DNS, conexión (TCP + TLS), tiempo hasta la respuesta y reutilización"""
+        trace = aiohttp.TraceConfig()
+
+        def ahora():
+            return time.perf_counter()
+
+        async def request_start(session, ctx, params):
+            ctx.inicio = ahora()
+
+        async def dns_start(session, ctx, params):
+            ctx.dns = ahora()
+
+        async def dns_end(session, ctx, params):
+            self.observar('http_dns', ahora() - ctx.dns, host=params.host)
+
+        async def dns_cache_hit(session, ctx, params):
+            self.contar('http_dns_cache', resultado='hit')
+
+        async def dns_cache_miss(session, ctx, params):
+            self.contar('http_dns_cache', resultado='miss')
+
+        async def connection_start(session, ctx, params):
+            ctx.conexion = ahora()
+
+        async def connection_end(session, ctx, params):
+            self.observar('http_conexion', ahora() - ctx.conexion)
+
+        async def connection_reuse(session, ctx, params):
+            self.contar('http_conexiones_reutilizadas')
+
+        async def request_end(session, ctx, params):
+            # Hasta tener las cabeceras de la respuesta: incluye DNS, conexión y espera del servidor
+            self.observar('http_ttfb', ahora() - ctx.inicio, host=params.url.host)
+            self.contar('http_respuestas', host=params.url.host, estado=params.response.status)
+
+        async def request_exception(session, ctx, params):
+            self.contar('http_errores', host=params.url.host, tipo=type(params.exception).__name__)
+
+        trace.on_request_start.append(request_start)
+        trace.on_dns_resolvehost_start.append(dns_start)
+        trace.on_dns_resolvehost_end.append(dns_end)
+        trace.on_dns_cache_hit.append(dns_cache_hit)
+        trace.on_dns_cache_miss.append(dns_cache_miss)
+        trace.on_connection_create_start.append(connection_start)
+        trace.on_connection_create_end.append(connection_end)
+        trace.on_connection_reuseconn.append(connection_reuse)
+        trace.on_request_end.append(request_end)
+        trace.on_request_exception.append(request_exception)
+        return trace
+
+
+def _etiquetas_prom(etiquetas: tuple, **extra) -> str:
+    pares = list(etiquetas) + [(k, str(v)) for k, v in extra.items()]
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pares) + '}'
+
+
+def parsear_con_metricas(parse, payload):
+    """Ejecutar `parse` en un proceso del pool y devolver también lo que midió ahí"""
+    METRICAS.volcar()
+    resultado = parse(payload)
+    return resultado, METRICAS.volcar()
+
+
+# Instancia del proceso: la comparten el cliente HTTP, el pipeline, el escritor y los extractores
+METRICAS = Metricas()
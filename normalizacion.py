@@ -0,0 +1,174 @@
+import re
+import sqlite3
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+# Alias conocidos → ID canónico (el nombre genérico en inglés, que es el que usan
+# drugs.com y la FDA). Se cargan en la tabla `alias_medicamentos` con la migración v5;
+# los pares inglés/español de los scrapers los registra cada scraper al arrancar.
+ALIAS_INICIALES = {
+    # Nombres internacionales / europeos
+    'paracetamol': 'acetaminophen',
+    'salbutamol': 'albuterol',
+    'adrenalina': 'epinephrine',
+    'adrenaline': 'epinephrine',
+    'glibenclamida': 'glyburide',
+    'glibenclamide': 'glyburide',
+    'petidina': 'meperidine',
+    'pethidine': 'meperidine',
+    'vitaminas prenatales': 'prenatal vitamins',
+    # Marcas comerciales habituales
+    'tylenol': 'acetaminophen',
+    'panadol': 'acetaminophen',
+    'advil': 'ibuprofen',
+    'motrin': 'ibuprofen',
+    'aleve': 'naproxen',
+    'zithromax': 'azithromycin',
+    'glucophage': 'metformin',
+    'synthroid': 'levothyroxine',
+    'prilosec': 'omeprazole',
+    'zofran': 'ondansetron',
+    'zoloft': 'sertraline',
+    'prozac': 'fluoxetine',
+    'benadryl': 'diphenhydramine',
+    'claritin': 'loratadine',
+    'zyrtec': 'cetirizine',
+    'coumadin': 'warfarin',
+    'lasix': 'furosemide',
+}
+
+
+def normalizar(nombre: str) -> str:
+    """Forma de comparación: minúsculas, sin acentos, sin puntuación y con espacios simples"""
+    sin_acentos = unicodedata.normalize('NFKD', nombre or '')
+    sin_acentos = ''.join(c for c in sin_acentos if not unicodedata.combining(c))
+    limpio = re.sub(r'[^a-z0-9]+', ' ', sin_acentos.lower())
+    return limpio.strip()
+
+
+def crear_tabla_alias(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS alias_medicamentos (
+            alias TEXT PRIMARY KEY,
+            canonico TEXT NOT NULL,
+            tipo TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_alias_canonico ON alias_medicamentos(canonico)')
+
+
+def registrar_alias(conn: sqlite3.Connection, alias: str, canonico: str, tipo: str = 'manual'):
+    """Añadir (o reasignar) un alias; el canónico también se registra como alias de sí mismo
+    si aún no está en la tabla (si ya es alias de otro, se respeta)"""
+    canonico = normalizar(canonico)
+    conn.execute(
+        "INSERT INTO alias_medicamentos (alias, canonico, tipo) VALUES (?, ?, 'canonico') "
+        'ON CONFLICT(alias) DO NOTHING',
+        (canonico, canonico)
+    )
+    conn.execute(
+        'INSERT INTO alias_medicamentos (alias, canonico, tipo) VALUES (?, ?, ?) '
+        'ON CONFLICT(alias) DO UPDATE SET canonico = excluded.canonico, tipo = excluded.tipo',
+        (normalizar(alias), canonico, tipo)
+    )
+
+
+def cargar_alias(conn: sqlite3.Connection) -> Dict[str, str]:
+    crear_tabla_alias(conn)
+    return dict(conn.execute('SELECT alias, canonico FROM alias_medicamentos'))
+
+
+def _fusionar_tabla(conn: sqlite3.Connection, tabla: str, columnas: List[str], clave_extra: Optional[str],
+                    alias: Dict[str, str]) -> int:
+    """Fusionar las filas de `tabla` guardadas con un alias en la fila del nombre canónico"""
+    extra = f', {clave_extra}' if clave_extra else ''
+    filtro_extra = f' AND {clave_extra} = ?' if clave_extra else ''
+    # Lo que ya tiene la fila canónica manda; la del alias solo rellena huecos
+    asignaciones = ', '.join(f'{c} = COALESCE({c}, (SELECT {c} FROM {tabla} WHERE id = :alias))'
+                             for c in columnas)
+    fusionadas = 0
+    for fila_id, nombre, *valor_extra in conn.execute(f'SELECT id, nombre{extra} FROM {tabla}').fetchall():
+        canonico = alias.get(normalizar(nombre))
+        if not canonico or canonico == nombre:
+            continue
+        destino = conn.execute(f'SELECT id FROM {tabla} WHERE nombre = ?{filtro_extra}',
+                               (canonico, *valor_extra)).fetchone()
+        if destino:
+            conn.execute(f'UPDATE {tabla} SET {asignaciones}, updated_at = CURRENT_TIMESTAMP WHERE id = :destino',
+                         {'alias': fila_id, 'destino': destino[0]})
+            conn.execute(f'DELETE FROM {tabla} WHERE id = ?', (fila_id,))
+        else:
+            conn.execute(f'UPDATE {tabla} SET nombre = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                         (canonico, fila_id))
+        fusionadas += 1
+    return fusionadas
+
+
+def fusionar_duplicados(conn: sqlite3.Connection) -> int:
+    """Unificar en el nombre canónico las filas de medicamentos y evidencias guardadas con alias"""
+    from schema import COLUMNAS_MEDICAMENTO, COLUMNAS_EVIDENCIA
+    alias = cargar_alias(conn)
+    fusionadas = _fusionar_tabla(conn, 'medicamentos', [c for c in COLUMNAS_MEDICAMENTO if c != 'nombre'],
+                                 None, alias)
+    fusionadas += _fusionar_tabla(conn, 'evidencias',
+                                  [c for c in COLUMNAS_EVIDENCIA if c not in ('nombre', 'fuente')],
+                                  'fuente', alias)
+    return fusionadas
+
+
+class IndiceAlias:
+    """Índice en memoria de la tabla de alias: nombre en cualquier forma → ID canónico"""
+
+    def __init__(self, db_path: Optional[str] = "db/medicamentos.db", alias: Optional[Dict[str, str]] = None):
+        self.db_path = db_path
+        self.alias: Dict[str, str] = {}
+        for nombre, canonico in (alias or ALIAS_INICIALES).items():
+            self.alias[normalizar(canonico)] = normalizar(canonico)
+            self.alias[normalizar(nombre)] = normalizar(canonico)
+        if db_path:
+            conn = sqlite3.connect(db_path)
+            try:
+                self.alias.update(cargar_alias(conn))
+                conn.commit()
+            finally:
+                conn.close()
+
+    def registrar(self, pares: Iterable, tipo: str = 'manual', fusionar: bool = True) -> int:
+        """Persistir pares (alias, canónico) y fusionar las filas que ya estuvieran duplicadas.
+
+        El canónico de cada par se resuelve antes con el índice: un par ('tylenol',
+        'paracetamol') se guarda como alias de 'acetaminophen'.
+        """
+        pares = [(alias, self.canonico(canonico)) for alias, canonico in pares]
+        pares = [(alias, canonico) for alias, canonico in pares
+                 if self.alias.get(normalizar(alias)) != normalizar(canonico)
+                 and normalizar(alias) != normalizar(canonico)]
+        if not pares or not self.db_path:
+            return 0
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                crear_tabla_alias(conn)
+                for alias, canonico in pares:
+                    registrar_alias(conn, alias, canonico, tipo)
+                self.alias.update(cargar_alias(conn))
+                if fusionar:
+                    fusionar_duplicados(conn)
+        finally:
+            conn.close()
+        return len(pares)
+
+    def canonico(self, nombre: str) -> str:
+        """ID canónico del medicamento; un nombre desconocido se deja tal cual"""
+        return self.alias.get(normalizar(nombre), nombre)
+
+    def deduplicar(self, nombres: Iterable[str]) -> List[str]:
+        """Quitar de una lista los nombres que son alias de otro anterior"""
+        vistos = set()
+        unicos = []
+        for nombre in nombres:
+            clave = normalizar(self.canonico(nombre))
+            if clave not in vistos:
+                vistos.add(clave)
+                unicos.append(nombre)
+        return unicos
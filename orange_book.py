@@ -0,0 +1,303 @@
+"""Orange Book de la FDA desde sus ficheros de datos completos.
+
+La FDA publica el Orange Book entero como tres ficheros de texto delimitados por `~`
+(products.txt, patent.txt y exclusivity.txt, con una línea de cabecera). En vez de
+una búsqueda HTML por principio activo, se cargan una vez en tablas indexadas de
+SQLite y las consultas del integrador se responden desde un índice en memoria.
+
+    python orange_book.py /ruta/EOBZIP_2024_01            # cargar en db/orange_book.db
+    python orange_book.py /ruta/EOBZIP_2024_01 --buscar ibuprofen
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from normalizacion import ALIAS_INICIALES, normalizar
+from resultados_fda import AplicacionesFDA, fecha_anterior, fecha_iso
+
+DB_PATH = "db/orange_book.db"
+LOTE = 5000
+FUENTE = "FDA Orange Book"
+
+# Fichero → (tabla, {columna de la cabecera de la FDA: columna de la tabla})
+FICHEROS = {
+    'products.txt': ('ob_productos', {
+        'Ingredient': 'ingrediente',
+        'DF;Route': 'forma_via',
+        'Trade_Name': 'nombre_comercial',
+        'Applicant': 'laboratorio',
+        'Strength': 'concentracion',
+        'Appl_Type': 'tipo_aplicacion',
+        'Appl_No': 'numero_aplicacion',
+        'Product_No': 'numero_producto',
+        'TE_Code': 'codigo_te',
+        'Approval_Date': 'fecha_aprobacion',
+        'RLD': 'rld',
+        'RS': 'rs',
+        'Type': 'tipo',
+        'Applicant_Full_Name': 'laboratorio_completo',
+    }),
+    'patent.txt': ('ob_patentes', {
+        'Appl_Type': 'tipo_aplicacion',
+        'Appl_No': 'numero_aplicacion',
+        'Product_No': 'numero_producto',
+        'Patent_No': 'patente',
+        'Patent_Expire_Date_Text': 'vencimiento',
+        'Drug_Substance_Flag': 'sustancia',
+        'Drug_Product_Flag': 'producto',
+        'Patent_Use_Code': 'codigo_uso',
+        'Delist_Flag': 'retirada',
+        'Submission_Date': 'fecha_envio',
+    }),
+    'exclusivity.txt': ('ob_exclusividades', {
+        'Appl_Type': 'tipo_aplicacion',
+        'Appl_No': 'numero_aplicacion',
+        'Product_No': 'numero_producto',
+        'Exclusivity_Code': 'codigo',
+        'Exclusivity_Date': 'vencimiento',
+    }),
+}
+
+# Sales y ésteres que se quitan para casar 'metformin' con 'METFORMIN HYDROCHLORIDE'
+SALES = {
+    'hydrochloride', 'hcl', 'sodium', 'potassium', 'calcium', 'magnesium', 'sulfate', 'maleate',
+    'citrate', 'acetate', 'phosphate', 'tartrate', 'succinate', 'besylate', 'mesylate', 'fumarate',
+    'bromide', 'chloride', 'hydrobromide', 'monohydrate', 'dihydrate', 'trihydrate', 'anhydrous',
+    'disodium', 'dipropionate', 'propionate', 'lactate', 'gluconate', 'bitartrate', 'tosylate',
+}
+
+def _sin_sales(nombre: str) -> str:
+    return ' '.join(palabra for palabra in nombre.split() if palabra not in SALES)
+
+
+def _componentes(ingrediente: str) -> List[str]:
+    """Principios activos de una combinación ('ACETAMINOPHEN; CODEINE PHOSPHATE'), normalizados"""
+    return [normalizar(parte) for parte in ingrediente.split(';') if parte.strip()]
+
+
+def _leer_fichero(path: str, columnas: Dict[str, str]) -> Iterator[tuple]:
+    """Filas del fichero en el orden de `columnas`, localizadas por la cabecera (sin cargarlo entero)"""
+    with open(path, encoding='utf-8', errors='replace', newline='') as f:
+        cabecera = f.readline().rstrip('\r\n').split('~')
+        posiciones = [cabecera.index(nombre) if nombre in cabecera else None for nombre in columnas]
+        for linea in f:
+            campos = linea.rstrip('\r\n').split('~')
+            if len(campos) < 2:
+                continue
+            yield tuple(campos[i].strip() if i is not None and i < len(campos) else None for i in posiciones)
+
+
+def _por_lotes(filas: Iterable[tuple], n: int = LOTE) -> Iterator[List[tuple]]:
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= n:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+# Columnas calculadas de ob_productos, detrás de las del fichero
+EXTRA_PRODUCTOS = {'ingrediente_norm': 'TEXT', 'nombre_comercial_norm': 'TEXT', 'fecha_anterior': 'INTEGER'}
+
+
+def crear_tablas(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ob_carga (
+            fichero TEXT PRIMARY KEY,
+            filas INTEGER NOT NULL,
+            modificado REAL NOT NULL,
+            cargado_en TEXT NOT NULL
+        )
+    ''')
+    for tabla, columnas in FICHEROS.values():
+        extra = ''.join(f', {c} {tipo}' for c, tipo in EXTRA_PRODUCTOS.items()) if tabla == 'ob_productos' else ''
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {tabla} ({", ".join(f"{c} TEXT" for c in columnas.values())}{extra})')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{tabla}_aplicacion '
+                     f'ON {tabla}(tipo_aplicacion, numero_aplicacion, numero_producto)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_ob_productos_ingrediente ON ob_productos(ingrediente_norm)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_ob_productos_comercial ON ob_productos(nombre_comercial_norm)')
+
+
+def cargar_orange_book(directorio: str, db_path: str = DB_PATH, forzar: bool = False) -> Dict[str, int]:
+    """Cargar los ficheros del Orange Book en `db_path`. Devuelve las filas cargadas por fichero.
+
+    Cada fichero se lee en streaming y se inserta por lotes; su tabla se reemplaza en una
+    sola transacción, así que un lector nunca ve una carga a medias. Un fichero que no ha
+    cambiado desde la última carga (misma fecha de modificación) se salta.
+    """
+    carpeta = os.path.dirname(db_path)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    crear_tablas(conn)
+    conn.commit()
+
+    cargadas = {}
+    try:
+        for fichero, (tabla, columnas) in FICHEROS.items():
+            path = os.path.join(directorio, fichero)
+            if not os.path.exists(path):
+                print(f"⚠️ Falta {fichero} en {directorio}")
+                continue
+            modificado = os.path.getmtime(path)
+            previa = conn.execute('SELECT modificado FROM ob_carga WHERE fichero = ?', (fichero,)).fetchone()
+            if previa and previa[0] == modificado and not forzar:
+                continue
+
+            inicio = time.perf_counter()
+            filas = _leer_fichero(path, columnas)
+            nombres = list(columnas.values())
+            if tabla == 'ob_productos':
+                filas = _productos(filas, nombres)
+                nombres = nombres + list(EXTRA_PRODUCTOS)
+            elif 'vencimiento' in nombres:
+                i = nombres.index('vencimiento')
+                filas = (fila[:i] + (fecha_iso(fila[i]) or fila[i],) + fila[i + 1:] for fila in filas)
+
+            insertar = f'INSERT INTO {tabla} ({", ".join(nombres)}) VALUES ({", ".join("?" * len(nombres))})'
+            total = 0
+            with conn:
+                conn.execute(f'DELETE FROM {tabla}')
+                for lote in _por_lotes(filas):
+                    conn.executemany(insertar, lote)
+                    total += len(lote)
+                conn.execute('INSERT OR REPLACE INTO ob_carga VALUES (?, ?, ?, ?)',
+                             (fichero, total, modificado, datetime.now().isoformat(timespec='seconds')))
+            cargadas[fichero] = total
+            print(f"📚 {fichero}: {total} filas en {time.perf_counter() - inicio:.1f} s")
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+    return cargadas
+
+
+def _productos(filas: Iterable[tuple], nombres: List[str]) -> Iterator[tuple]:
+    i_ingrediente = nombres.index('ingrediente')
+    i_comercial = nombres.index('nombre_comercial')
+    i_fecha = nombres.index('fecha_aprobacion')
+    for fila in filas:
+        fila = list(fila)
+        anterior = int(fecha_anterior(fila[i_fecha]))
+        fila[i_fecha] = fecha_iso(fila[i_fecha])
+        yield tuple(fila) + (normalizar(fila[i_ingrediente] or ''), normalizar(fila[i_comercial] or ''), anterior)
+
+
+class IndiceOrangeBook:
+    """Consultas O(1) sobre el Orange Book cargado con `cargar_orange_book`.
+
+    Al crearlo se lee la base de datos una vez y se construyen diccionarios por principio
+    activo (completo, sin sales y por componente de las combinaciones) y por nombre
+    comercial. `buscar` devuelve lo mismo que `FDAOrangeBookScraper._parsear_fda_response`
+    (con todos los productos en `aplicaciones`) más recuentos de patentes y exclusividades;
+    el producto representativo es el de referencia (RLD) aún comercializado, o el aprobado antes.
+    """
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        self.exactos: Dict[str, dict] = {}
+        self.parciales: Dict[str, dict] = {}
+        self.cargar()
+
+    def cargar(self):
+        conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True)
+        try:
+            patentes = self._por_aplicacion(conn, 'ob_patentes')
+            exclusividades = self._por_aplicacion(conn, 'ob_exclusividades')
+            grupos: Dict[str, list] = {}
+            parciales: Dict[str, list] = {}
+            for producto in conn.execute('''
+                SELECT ingrediente, nombre_comercial, laboratorio, laboratorio_completo, tipo_aplicacion,
+                       numero_aplicacion, fecha_aprobacion, rld, tipo, forma_via, concentracion,
+                       fecha_anterior, ingrediente_norm, nombre_comercial_norm
+                FROM ob_productos
+            '''):
+                ingrediente, comercial = producto[-2:]
+                for clave in {ingrediente, _sin_sales(ingrediente)}:
+                    grupos.setdefault(clave, []).append(producto)
+                claves = {comercial}
+                componentes = _componentes(producto[0] or '')
+                if len(componentes) > 1:
+                    claves.update(componentes)
+                    claves.update(_sin_sales(componente) for componente in componentes)
+                for clave in claves:
+                    parciales.setdefault(clave, []).append(producto)
+        finally:
+            conn.close()
+        self.exactos = {clave: self._resumir(productos, patentes, exclusividades)
+                        for clave, productos in grupos.items() if clave}
+        self.parciales = {clave: self._resumir(productos, patentes, exclusividades)
+                          for clave, productos in parciales.items() if clave}
+
+    @staticmethod
+    def _por_aplicacion(conn: sqlite3.Connection, tabla: str) -> Dict[tuple, tuple]:
+        """(tipo, número de aplicación) → (número de filas, vencimiento más tardío)"""
+        return {(tipo, numero): (n, vencimiento) for tipo, numero, n, vencimiento in conn.execute(
+            f'SELECT tipo_aplicacion, numero_aplicacion, COUNT(*), MAX(vencimiento) FROM {tabla} '
+            f'GROUP BY tipo_aplicacion, numero_aplicacion')}
+
+    @staticmethod
+    def _resumir(productos: list, patentes: dict, exclusividades: dict) -> dict:
+        def prioridad(p):
+            return p[8] == 'DISCN', p[7] != 'Yes', p[6] or '9999', not p[11]
+
+        ingrediente, comercial, laboratorio, completo, tipo_aplicacion, numero, fecha, _, tipo, _, _, _, _, _ = \
+            min(productos, key=prioridad)
+        aplicaciones = {(p[4], p[5]) for p in productos}
+        filas = AplicacionesFDA()
+        for p in productos:
+            filas.anadir(p[5], nombre=p[1], laboratorio=p[3] or p[2], forma=p[9], fecha_aprobacion=p[6],
+                         estado=p[8], concentracion=p[10], tipo=p[4], anterior=bool(p[11]))
+        return {
+            'nombre': ingrediente,
+            'nombre_comercial': comercial,
+            'categoria_fda': '',   # el Orange Book no incluye la categoría de embarazo
+            'numero_aplicacion': f'{tipo_aplicacion}{numero}',
+            'fecha_aprobacion': fecha or '',
+            'laboratorio': completo or laboratorio,
+            'fuente': FUENTE,
+            'estado_aprobacion': tipo,
+            'productos': len(productos),
+            'patentes': sum(patentes.get(a, (0, None))[0] for a in aplicaciones),
+            'exclusividades': sum(exclusividades.get(a, (0, None))[0] for a in aplicaciones),
+            'vencimiento_patente': max((patentes[a][1] for a in aplicaciones if a in patentes), default=None),
+            'aplicaciones': filas,
+        }
+
+    def buscar(self, nombre: str) -> Optional[dict]:
+        clave = normalizar(nombre)
+        for candidata in (clave, ALIAS_INICIALES.get(clave), _sin_sales(clave)):
+            if candidata and candidata in self.exactos:
+                return dict(self.exactos[candidata])
+        for candidata in (clave, ALIAS_INICIALES.get(clave), _sin_sales(clave)):
+            if candidata and candidata in self.parciales:
+                return dict(self.parciales[candidata])
+        return None
+
+    def __len__(self):
+        return len(self.exactos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cargar el Orange Book de la FDA desde sus ficheros de datos")
+    parser.add_argument('directorio', help="Carpeta con products.txt, patent.txt y exclusivity.txt")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--forzar', action='store_true', help="Recargar aunque los ficheros no hayan cambiado")
+    parser.add_argument('--buscar', nargs='*', default=[], help="Nombres a consultar después de cargar")
+    args = parser.parse_args()
+
+    cargar_orange_book(args.directorio, args.db, args.forzar)
+    if args.buscar:
+        indice = IndiceOrangeBook(args.db)
+        print(f"🔎 {len(indice)} principios activos en el índice")
+        for nombre in args.buscar:
+            print(f"{nombre}: {indice.buscar(nombre)}")
+
+
+if __name__ == "__main__":
+    main()
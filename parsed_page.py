@@ -0,0 +1,61 @@
+from functools import cached_property
+from typing import List, Optional, Set, Tuple
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from html_parser import make_soup
+from keyword_matcher import KeywordMatcher
+
+
+class ParsedPage:
+    """Página HTML parseada una sola vez; texto y divisiones se calculan bajo demanda y se memorizan"""
+
+    def __init__(self, html: str, parse_only: Optional[SoupStrainer] = None, parser: Optional[str] = None):
+        self.html = html
+        self.parse_only = parse_only
+        self.parser = parser
+        self._keyword_hits = {}
+        self._keywords_found = {}
+
+    @cached_property
+    def soup(self) -> BeautifulSoup:
+        return make_soup(self.html, self.parse_only, self.parser)
+
+    @cached_property
+    def text(self) -> str:
+        return self.soup.get_text()
+
+    @cached_property
+    def text_lower(self) -> str:
+        return self.text.lower()
+
+    @cached_property
+    def paragraphs(self) -> List[str]:
+        """Líneas del texto (sin espacios en los extremos)"""
+        return [parrafo.strip() for parrafo in self.text.split('\n')]
+
+    @cached_property
+    def sentences(self) -> List[str]:
+        """Fragmentos del texto separados por punto (sin espacios en los extremos)"""
+        return [frase.strip() for frase in self.text.split('.')]
+
+    @cached_property
+    def strings(self) -> list:
+        """Todos los nodos de texto del documento, en orden"""
+        return self.soup.find_all(string=True)
+
+    @cached_property
+    def strings_lower(self) -> List[str]:
+        return [s.lower() for s in self.strings]
+
+    def keyword_hits(self, matcher: KeywordMatcher) -> List[Tuple[int, str]]:
+        """Apariciones de las palabras de `matcher` en `text_lower` (memorizado por matcher)"""
+        if matcher not in self._keyword_hits:
+            self._keyword_hits[matcher] = matcher.hits(self.text_lower)
+        return self._keyword_hits[matcher]
+
+    def keywords_found(self, matcher: KeywordMatcher) -> Set[str]:
+        """Palabras de `matcher` presentes en `text_lower` (memorizado por matcher)"""
+        if matcher not in self._keywords_found:
+            self._keywords_found[matcher] = matcher.found(self.text_lower)
+        return self._keywords_found[matcher]
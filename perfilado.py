@@ -0,0 +1,96 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+DIRECTORIO_PERFILES = "logs/perfiles"
+TOP = 30
+MOTORES = ["cprofile", "pyinstrument"]
+
+# Funciones de parseo y extracción: regex sobre "fichero:línea(función)" de pstats
+FILTRO_PARSEO = r"parsed_page|keyword_matcher|html_parser|bs4|lxml|parse|extra|es_pagina_valida|parece_ficha_valida"
+
+
+@contextmanager
+def sitio_local(**config):
+    """Servidor falso de benchmarks/fake_server.py en segundo plano; devuelve su URL base"""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+    from fake_server import FakeDrugSite, FakeSiteConfig
+
+    sitio = FakeDrugSite(FakeSiteConfig(**config))
+    try:
+        yield sitio.start()
+    finally:
+        sitio.stop()
+
+
+def _informe_cprofile(profiler: cProfile.Profile, top: int) -> str:
+    salida = io.StringIO()
+    stats = pstats.Stats(profiler, stream=salida)
+    secciones = [
+        ("Parseo y extracción, por tiempo propio", "tottime", (FILTRO_PARSEO, top)),
+        ("Parseo y extracción, por tiempo acumulado", "cumulative", (FILTRO_PARSEO, top)),
+        ("Todo el proceso, por tiempo propio", "tottime", (top,)),
+    ]
+    for titulo, orden, restricciones in secciones:
+        salida.write(f"\n===== {titulo} =====\n")
+        stats.sort_stats(orden).print_stats(*restricciones)
+    return salida.getvalue()
+
+
+def perfilar(nombre: str, ejecutar: Callable[[str, str], None], motor: str = "cprofile",
+             directorio: str = DIRECTORIO_PERFILES, top: int = TOP, latency_ms: float = 5, **config_sitio):
+    """Ejecutar un scraper contra el sitio local bajo el profiler y guardar el perfil.
+
+    `ejecutar(base_url, directorio_temporal)` lanza el scraper apuntando al servidor falso,
+    con su base de datos en un directorio temporal; quien llama debe quitar las pausas
+    (limitador con ritmo alto, pausa=0) y parsear en el propio proceso, o el parseo del
+    pool de procesos no aparecería en el perfil.
+
+    - cprofile: `<nombre>_<fecha>.prof` (pstats: snakeviz, o flameprof para la flamegraph)
+      y `<nombre>_<fecha>.txt` con el top-N de funciones de parseo y extracción.
+    - pyinstrument (si está instalado): `.speedscope.json` (flamegraph en speedscope.app)
+      y el árbol de llamadas en `.txt`.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    base = os.path.join(directorio, f"{nombre}_{time.strftime('%Y%m%d_%H%M%S')}")
+
+    with sitio_local(latency_ms=latency_ms, **config_sitio) as base_url, \
+            tempfile.TemporaryDirectory() as temporal:
+        inicio = time.perf_counter()
+        if motor == "pyinstrument":
+            from pyinstrument import Profiler
+            from pyinstrument.renderers import SpeedscopeRenderer
+
+            profiler = Profiler()
+            profiler.start()
+            try:
+                ejecutar(base_url, temporal)
+            finally:
+                profiler.stop()
+            ficheros = [base + ".speedscope.json", base + ".txt"]
+            with open(ficheros[0], "w") as f:
+                f.write(profiler.output(renderer=SpeedscopeRenderer()))
+            informe = profiler.output_text(unicode=True, color=False)
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                ejecutar(base_url, temporal)
+            finally:
+                profiler.disable()
+            ficheros = [base + ".prof", base + ".txt"]
+            profiler.dump_stats(ficheros[0])
+            informe = _informe_cprofile(profiler, top)
+        segundos = time.perf_counter() - inicio
+
+    with open(ficheros[1], "w") as f:
+        f.write(informe)
+    print(informe)
+    print(f"🔬 Perfil de {nombre} ({motor}, {segundos:.1f} s) en: {', '.join(ficheros)}")
+    return ficheros
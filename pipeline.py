@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from metricas import METRICAS, parsear_con_metricas
+
+logger = logging.getLogger(__name__)
+
+_FIN = object()
+
+
+class StagedPipeline:
+    """Pipeline por etapas: descarga (async) → parseo (pool de procesos) → persistencia.
+
+    - `fetchers` corrutinas ejecutan `fetch(item)` y dejan lo descargado en una cola acotada.
+    - El parseo (CPU) se hace con `parse(payload)` en un ProcessPoolExecutor, así que no
+      bloquea el event loop ni compite por el GIL con la red. `parse` tiene que ser una
+      función de módulo (se envía por pickle a los procesos).
+    - Una única etapa de persistencia ejecuta `persist(item, resultado)` en orden de llegada.
+
+    Las colas son acotadas: si el parseo o la escritura se atrasan, las descargas esperan.
+    Con `parse_workers=0` el parseo se hace en el propio proceso.
+    Si `fetch` devuelve None el item se da por fallido y se llama a `persist(item, None)`;
+    si `parse` falla se registra el error y también se persiste None.
+    """
+
+    def __init__(self, fetch: Callable[[Any], Awaitable[Any]], parse: Optional[Callable[[Any], Any]],
+                 persist: Callable[[Any, Any], Any], fetchers: int = 3, parse_workers: Optional[int] = None,
+                 queue_size: int = 0):
+        self.fetch = fetch
+        self.parse = parse
+        self.persist = persist
+        self.fetchers = max(1, fetchers)
+        # Por defecto un proceso por núcleo menos el del event loop (en una máquina de un
+        # núcleo el pool solo añadiría coste de IPC, así que se parsea en el propio proceso)
+        if parse_workers is None:
+            parse_workers = (os.cpu_count() or 1) - 1
+        self.parse_workers = max(0, parse_workers)
+        self.queue_size = queue_size or 2 * max(self.fetchers, self.parse_workers)
+
+    async def run(self, items: Iterable[Any]):
+        items = list(items)
+        entrada: asyncio.Queue = asyncio.Queue()
+        for item in items:
+            entrada.put_nowait(item)
+        descargados: asyncio.Queue = asyncio.Queue(self.queue_size)
+        parseados: asyncio.Queue = asyncio.Queue(self.queue_size)
+
+        # 'spawn': los procesos del pool no heredan el hilo del escritor ni el event loop
+        pool = ProcessPoolExecutor(self.parse_workers, mp_context=multiprocessing.get_context('spawn')) \
+            if self.parse and self.parse_workers else None
+        parsers = max(1, self.parse_workers)
+
+        try:
+            fetchers = [asyncio.create_task(self._fetcher(entrada, descargados))
+                        for _ in range(min(self.fetchers, len(items)) or 1)]
+            parser_tasks = [asyncio.create_task(self._parser(pool, descargados, parseados))
+                            for _ in range(parsers)]
+            persister = asyncio.create_task(self._persister(parseados))
+
+            await asyncio.gather(*fetchers)
+            for _ in parser_tasks:
+                await descargados.put(_FIN)
+            await asyncio.gather(*parser_tasks)
+            await parseados.put(_FIN)
+            await persister
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+
+    async def _fetcher(self, entrada: asyncio.Queue, descargados: asyncio.Queue):
+        while True:
+            try:
+                item = entrada.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                with METRICAS.temporizador('etapa', etapa='descarga'):
+                    payload = await self.fetch(item)
+            except Exception as e:
+                logger.error(f"💥 Error descargando {item!r}: {e}")
+                payload = None
+            await descargados.put((item, payload))
+
+    async def _parser(self, pool, descargados: asyncio.Queue, parseados: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            entrada = await descargados.get()
+            if entrada is _FIN:
+                return
+            item, payload = entrada
+            resultado = payload
+            if payload is not None and self.parse:
+                try:
+                    # Con pool el tiempo incluye el envío por pickle y la espera por un proceso libre;
+                    # lo medido dentro del proceso (extractores) vuelve con el resultado
+                    with METRICAS.temporizador('etapa', etapa='parseo'):
+                        if pool:
+                            resultado, medidas = await loop.run_in_executor(
+                                pool, parsear_con_metricas, self.parse, payload)
+                            METRICAS.fusionar(medidas)
+                        else:
+                            resultado = self.parse(payload)
+                except Exception as e:
+                    logger.error(f"💥 Error parseando {item!r}: {e}")
+                    resultado = None
+            await parseados.put((item, resultado))
+
+    async def _persister(self, parseados: asyncio.Queue):
+        while True:
+            entrada = await parseados.get()
+            if entrada is _FIN:
+                return
+            item, resultado = entrada
+            try:
+                with METRICAS.temporizador('etapa', etapa='persistencia'):
+                    salida = self.persist(item, resultado)
+                    if asyncio.iscoroutine(salida):
+                        await salida
+            except Exception as e:
+                logger.error(f"💥 Error guardando {item!r}: {e}")
@@ -0,0 +1,63 @@
+import sqlite3
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from incremental import ahora_utc
+
+REGISTRAR_IDIOMA = '''
+    INSERT INTO idiomas_busqueda (nombre, fuente, idioma, exitos, fallos, actualizado_en)
+    VALUES (:nombre, :fuente, :idioma, :exitos, :fallos, :actualizado_en)
+    ON CONFLICT(nombre, fuente, idioma) DO UPDATE SET
+        exitos = idiomas_busqueda.exitos + excluded.exitos,
+        fallos = idiomas_busqueda.fallos + excluded.fallos,
+        actualizado_en = excluded.actualizado_en
+'''
+
+
+class PreferenciaIdioma:
+    """Historial de aciertos por medicamento e idioma de una fuente (tabla `idiomas_busqueda`).
+
+    Decide en qué orden probar las variantes de un nombre (p. ej. la ficha en español y la
+    inglesa de e-lactancia) para que la primera petición sea la que más probablemente acierte.
+    Sin historial del medicamento se usa la tasa de acierto global de cada idioma; a igualdad
+    se mantiene el orden recibido.
+    """
+
+    def __init__(self, db_path: str, fuente: str):
+        self.fuente = fuente
+        self.historial: Dict[Tuple[str, str], List[int]] = {}
+        self.global_: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+
+        conn = sqlite3.connect(db_path)
+        try:
+            filas = conn.execute(
+                'SELECT nombre, idioma, exitos, fallos FROM idiomas_busqueda WHERE fuente = ?', (fuente,)
+            )
+            for nombre, idioma, exitos, fallos in filas:
+                self._sumar(nombre, idioma, exitos, fallos)
+        finally:
+            conn.close()
+
+    def _sumar(self, nombre: str, idioma: str, exitos: int, fallos: int):
+        cuenta = self.historial.setdefault((nombre.lower(), idioma), [0, 0])
+        cuenta[0] += exitos
+        cuenta[1] += fallos
+        self.global_[idioma][0] += exitos
+        self.global_[idioma][1] += fallos
+
+    def probabilidad(self, nombre: str, idioma: str) -> float:
+        """Probabilidad estimada de acierto (Laplace, con la tasa global del idioma como previa)"""
+        exitos_g, fallos_g = self.global_.get(idioma, (0, 0))
+        previa = (exitos_g + 1) / (exitos_g + fallos_g + 2)
+        exitos, fallos = self.historial.get((nombre.lower(), idioma), (0, 0))
+        return (exitos + 2 * previa) / (exitos + fallos + 2)
+
+    def ordenar(self, nombre: str, variantes: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Ordenar las variantes (nombre, idioma) de la más a la menos probable"""
+        return sorted(variantes, key=lambda variante: -self.probabilidad(nombre, variante[1]))
+
+    def registrar(self, nombre: str, idioma: str, exito: bool) -> dict:
+        """Anotar un resultado en memoria; devuelve los parámetros de REGISTRAR_IDIOMA"""
+        self._sumar(nombre, idioma, int(exito), int(not exito))
+        return dict(nombre=nombre.lower(), fuente=self.fuente, idioma=idioma, exitos=int(exito),
+                    fallos=int(not exito), actualizado_en=ahora_utc())
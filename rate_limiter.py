@@ -0,0 +1,212 @@
+import asyncio
+import json
+import os
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from metricas import METRICAS
+
+
+def _sin_puerto(host: str) -> str:
+    """Host sin puerto, como lo etiquetan las métricas del cliente HTTP"""
+    return urlparse('//' + host).hostname or host
+
+
+class TokenBucket:
+    """Token bucket asíncrono: `rate` peticiones/segundo con ráfagas de hasta `capacity`"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    async def acquire(self) -> float:
+        """Esperar hasta tener un token disponible. Devuelve los segundos esperados"""
+        waited = 0.0
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                delay = (1 - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.tokens -= 1
+        return waited
+
+
+class HostRateLimiter:
+    """Un token bucket por host, para repartir el presupuesto de peticiones entre workers"""
+
+    def __init__(self, rate: float = 0.5, burst: float = 1.0,
+                 overrides: Optional[Dict[str, float]] = None):
+        self.rate = rate
+        self.burst = burst
+        self.overrides = overrides or {}
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    def bucket(self, host: str) -> TokenBucket:
+        if host not in self.buckets:
+            rate = self.overrides.get(host, self.rate)
+            self.buckets[host] = TokenBucket(rate, self.burst)
+        return self.buckets[host]
+
+    async def acquire(self, url: str) -> float:
+        """Reservar un turno para el host de `url`"""
+        return await self._turno(urlparse(url).netloc.lower())
+
+    async def _turno(self, host: str) -> float:
+        # La espera medida incluye la cola detrás de otros workers del mismo host
+        inicio = time.perf_counter()
+        waited = await self.bucket(host).acquire()
+        METRICAS.observar('espera', time.perf_counter() - inicio, motivo='limitador', host=_sin_puerto(host))
+        return waited
+
+    def record(self, url: str, status: Optional[int], latency: float, retry_after: Optional[str] = None):
+        """Resultado de una petición; el limitador fijo no se adapta"""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Segundos indicados por una cabecera Retry-After (número o fecha HTTP)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        fecha = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, fecha.timestamp() - time.time())
+
+
+class AdaptiveRateController(HostRateLimiter):
+    """Limitador por host con control AIMD.
+
+    Como en TCP, un host nuevo arranca en "slow start": cada respuesta sana multiplica su
+    ritmo por 1 + `slow_start` hasta el primer síntoma de sobrecarga. Desde ahí cada
+    respuesta sana suma `increase` peticiones/segundo; un 429, 403,
+    5xx, error de red o una latencia por encima de `latency_factor` veces la de referencia
+    lo multiplican por `decrease` (como mucho una vez por ventana, para no hundirlo por
+    una ráfaga de fallos de peticiones que ya estaban en vuelo). Retry-After pausa el host
+    entero. Con `state_path` los ritmos aprendidos se guardan en JSON y la siguiente
+    ejecución arranca desde el último ritmo seguro.
+    """
+
+    def __init__(self, rate: float = 0.2, burst: float = 1.0, min_rate: float = 0.02, max_rate: float = 2.0,
+                 increase: float = 0.05, decrease: float = 0.5, latency_factor: float = 3.0,
+                 slow_start: float = 0.1, state_path: Optional[str] = None):
+        super().__init__(rate=min(max(rate, min_rate), max_rate), burst=burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.slow_start = slow_start
+        self.state_path = state_path
+        self.probing: Dict[str, bool] = {}        # hosts aún en slow start
+        self.latency: Dict[str, float] = {}       # media móvil de la latencia
+        self.latency_base: Dict[str, float] = {}  # latencia de referencia (la menor media vista)
+        self.pause_until: Dict[str, float] = {}
+        self.last_decrease: Dict[str, float] = {}
+        self.load()
+
+    def load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        for host, datos in state.items():
+            rate = min(self.max_rate, max(self.min_rate, datos.get('rate', self.rate)))
+            self.overrides[host] = rate
+            # El ritmo guardado ya es seguro: se sigue sondeando solo de forma aditiva
+            self.probing[host] = False
+            if datos.get('latency_base'):
+                self.latency_base[host] = datos['latency_base']
+
+    def save(self):
+        """Guardar el ritmo actual de cada host"""
+        if not self.state_path:
+            return
+        state = {}
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {}
+        for host, bucket in self.buckets.items():
+            state[host] = {
+                'rate': round(bucket.rate, 4),
+                'latency_base': self.latency_base.get(host),
+                'updated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+        directorio = os.path.dirname(self.state_path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        tmp = self.state_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp, self.state_path)
+
+    def rate_for(self, url: str) -> float:
+        return self.bucket(urlparse(url).netloc.lower()).rate
+
+    async def acquire(self, url: str) -> float:
+        host = urlparse(url).netloc.lower()
+        waited = 0.0
+        pause = self.pause_until.get(host, 0) - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+            waited += pause
+            METRICAS.observar('espera', pause, motivo='retry_after', host=_sin_puerto(host))
+        return waited + await self._turno(host)
+
+    def _decrease(self, host: str, bucket: TokenBucket, now: float):
+        window = max(1.0, 1 / bucket.rate)
+        if now - self.last_decrease.get(host, 0) < window:
+            return
+        self.last_decrease[host] = now
+        self.probing[host] = False
+        bucket._refill()
+        bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+
+    def record(self, url: str, status: Optional[int], latency: float, retry_after: Optional[str] = None):
+        """Ajustar el ritmo del host según el resultado (status None = error de red)"""
+        host = urlparse(url).netloc.lower()
+        bucket = self.bucket(host)
+        now = time.monotonic()
+
+        espera = parse_retry_after(retry_after)
+        if espera:
+            self.pause_until[host] = max(self.pause_until.get(host, 0), now + espera)
+
+        if status is None or status in (403, 429) or status >= 500:
+            self._decrease(host, bucket, now)
+            return
+
+        media = self.latency.get(host)
+        media = latency if media is None else 0.8 * media + 0.2 * latency
+        self.latency[host] = media
+        base = min(self.latency_base.get(host, media), media)
+        self.latency_base[host] = base
+
+        if media > base * self.latency_factor:
+            self._decrease(host, bucket, now)
+        else:
+            bucket._refill()
+            if self.probing.setdefault(host, True):
+                bucket.rate = min(self.max_rate, bucket.rate * (1 + self.slow_start))
+            else:
+                bucket.rate = min(self.max_rate, bucket.rate + self.increase)
@@ -0,0 +1,134 @@
+"""Re-extraer los datos de todas las fichas archivadas con los extractores actuales.
+
+Uso:
+    python reextract.py                              # todo el archivo
+    python reextract.py --fuente drugs.com --workers 8
+
+Después de corregir un extractor (extract_fda_category, extraer_nivel_riesgo, las
+heurísticas de trimestres de parse_medication_html...) basta con esto para aplicar la
+corrección a todo lo descargado: el parseo se reparte entre todos los núcleos y los
+resultados se escriben con los mismos upserts que usan los scrapers.
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from comprehensive_scraper import ComprehensiveMedScraper, parse_drug_page
+from db_writer import BatchedDBWriter
+from elactancia_embarazo_scraper import ELactanciaEmbarazoScraper, parsear_paginas_dual
+import elactancia_scraper
+from html_archive import ARCHIVO_PATH, descomprimir, paginas_archivadas
+from normalizacion import IndiceAlias
+from schema import aplicar_migraciones
+
+FUENTES = ['drugs.com', 'e-lactancia.org', elactancia_scraper.FUENTE]
+
+
+LOTE = 32   # medicamentos por tarea del pool
+
+
+def agrupar(paginas):
+    """Una unidad de trabajo por medicamento: (fuente, clave, [filas])"""
+    for (fuente, clave), filas in itertools.groupby(paginas, key=lambda fila: (fila[0], fila[1])):
+        yield fuente, clave, list(filas)
+
+
+def reextraer(grupo):
+    """HTML archivado → (fuente, resultado del extractor actual, descarga más antigua)"""
+    fuente, clave, filas = grupo
+    # Los datos son tan recientes como la página más antigua de la que salen
+    descargada_en = min((fila[7] for fila in filas if fila[7]), default=None)
+    if fuente == 'drugs.com':
+        _, _, nombre, _, url, html, contenido_hash, _ = filas[0]
+        return fuente, parse_drug_page((nombre, url, descomprimir(html), contenido_hash)), descargada_en
+    if fuente == 'e-lactancia.org':
+        return fuente, parsear_paginas_dual([
+            (nombre, idioma, url, descomprimir(html), contenido_hash, False)
+            for _, _, nombre, idioma, url, html, contenido_hash, _ in filas
+        ]), descargada_en
+    if fuente == elactancia_scraper.FUENTE:
+        _, _, _, _, url, html, _, _ = filas[0]
+        return fuente, (elactancia_scraper.parse_medication_html(descomprimir(html)), url), descargada_en
+    return fuente, None, descargada_en
+
+
+def reextraer_lote(grupos):
+    """Se ejecuta en el pool de procesos: un lote de medicamentos por tarea"""
+    return [reextraer(grupo) for grupo in grupos]
+
+
+def mapear_acotado(pool, grupos, en_vuelo: int):
+    """Como pool.map, pero con como mucho `en_vuelo` lotes enviados a la vez: el archivo
+    se lee a medida que se procesa en vez de cargar todas las páginas en memoria"""
+    pendientes = deque()
+    lotes = iter(lambda: list(itertools.islice(grupos, LOTE)), [])
+    for lote in lotes:
+        pendientes.append(pool.submit(reextraer_lote, lote))
+        if len(pendientes) >= en_vuelo:
+            yield from pendientes.popleft().result()
+    while pendientes:
+        yield from pendientes.popleft().result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-extraer las fichas archivadas con los extractores actuales")
+    parser.add_argument('--archivo', default=ARCHIVO_PATH, help="Archivo de HTML crudo")
+    parser.add_argument('--db', default="db/medicamentos.db", help="Base de datos a actualizar")
+    parser.add_argument('--fuente', choices=FUENTES, help="Solo una fuente")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Procesos de parseo (0 = en el propio proceso)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.archivo):
+        print(f"❌ No existe el archivo {args.archivo}")
+        return
+
+    writer = BatchedDBWriter(args.db, batch_size=500, init=aplicar_migraciones)
+    # Los métodos de guardado de los scrapers solo necesitan su escritor
+    drugs = ComprehensiveMedScraper(db_path=args.db, rate_state_path=None)
+    elactancia = ELactanciaEmbarazoScraper(db_path=args.db)
+    drugs.writer = elactancia.writer = writer
+    drugs.alias = elactancia.alias = IndiceAlias(args.db)
+
+    grupos = agrupar(paginas_archivadas(args.archivo, args.fuente))
+    pool = None
+    if args.workers:
+        pool = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context('spawn'))
+        resultados = mapear_acotado(pool, grupos, en_vuelo=args.workers * 2)
+    else:
+        resultados = map(reextraer, grupos)
+
+    inicio = time.time()
+    guardados, vacios = Counter(), Counter()
+    try:
+        for fuente, resultado, descargada_en in resultados:
+            # verificado_en = fecha de descarga archivada, no la de hoy: el modo incremental
+            # tiene que seguir viendo la antigüedad real de la página
+            if fuente == 'drugs.com' and resultado:
+                drugs.save_medication(resultado, verificado_en=descargada_en)
+            elif fuente == 'e-lactancia.org' and resultado:
+                elactancia.save_medication(resultado, verificado_en=descargada_en)
+            elif fuente == elactancia_scraper.FUENTE and resultado[0]:
+                elactancia_scraper.save_to_db(writer, *resultado)
+            else:
+                vacios[fuente] += 1
+                continue
+            guardados[fuente] += 1
+    finally:
+        if pool:
+            pool.shutdown()
+        writer.close()
+
+    elapsed = time.time() - inicio
+    for fuente in sorted(set(guardados) | set(vacios)):
+        print(f"✅ {fuente}: {guardados[fuente]} re-extraídos, {vacios[fuente]} sin datos")
+    print(f"⏱️  {sum(guardados.values()) + sum(vacios.values())} medicamentos en {elapsed:.1f}s "
+          f"({writer.rows_written} filas escritas)")
+
+
+if __name__ == "__main__":
+    main()
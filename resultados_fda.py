@@ -0,0 +1,199 @@
+import threading
+from array import array
+from datetime import datetime
+from itertools import compress
+from typing import Dict, Iterator, List, Optional
+
+FORMATOS_FECHA = ('%b %d, %Y', '%b %d,%Y', '%m/%d/%Y', '%Y-%m-%d')
+
+# Tabla de textos común a todos los resultados: un laboratorio o una forma farmacéutica
+# se guarda una sola vez en el proceso y cada fila lleva solo su código
+_TEXTOS: List[str] = ['']
+_CODIGOS: Dict[str, int] = {'': 0}
+_LOCK = threading.Lock()
+
+
+PREFIJO_ANTERIOR = 'approved prior to'
+
+
+def fecha_iso(texto: str) -> Optional[str]:
+    """'Jan 1, 1982', 'Approved Prior to Jan 1, 1982' o '12/31/2030' → 'YYYY-MM-DD'
+
+    De 'Approved Prior to ...' queda solo la cota: ver `fecha_anterior`.
+    """
+    texto = (texto or '').strip()
+    if texto.lower().startswith(PREFIJO_ANTERIOR):
+        texto = texto[len(PREFIJO_ANTERIOR):].strip()
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+
+def fecha_anterior(texto: Optional[str]) -> bool:
+    """'Approved Prior to Jan 1, 1982': aprobada en fecha desconocida anterior a la indicada"""
+    return (texto or '').strip().lower().startswith(PREFIJO_ANTERIOR)
+
+
+def _codigo(texto: Optional[str]) -> int:
+    texto = (texto or '').strip()
+    codigo = _CODIGOS.get(texto)
+    if codigo is None:
+        with _LOCK:
+            codigo = _CODIGOS.get(texto)
+            if codigo is None:
+                codigo = _CODIGOS[texto] = len(_TEXTOS)
+                _TEXTOS.append(texto)
+    return codigo
+
+
+def _fecha_entera(fecha: Optional[str]) -> int:
+    if fecha and len(fecha) == 10 and fecha[4] == '-' and fecha[7] == '-':
+        return int(fecha[:4] + fecha[5:7] + fecha[8:])   # ya en ISO (Orange Book cargado)
+    iso = fecha_iso(fecha) if fecha else None
+    return int(iso.replace('-', '')) if iso else 0
+
+
+def _fecha_texto(fecha: int) -> str:
+    return f'{fecha // 10000:04d}-{fecha // 100 % 100:02d}-{fecha % 100:02d}' if fecha else ''
+
+
+class AplicacionesFDA:
+    """Todas las filas de aplicación de la FDA de una búsqueda, por columnas.
+
+    Cada columna es un `array` compacto: tipo de aplicación (N = NDA, A = ANDA, B = BLA, como byte),
+    número, fecha de aprobación como entero AAAAMMDD, si esa fecha es solo una cota
+    ('Approved Prior to Jan 1, 1982': 1 en `anteriores`, `aprobada_antes` en `fila`) y códigos
+    de la tabla de textos compartida para nombre, laboratorio, forma, concentración y estado
+    (RX, OTC, DISCN). Una fila ocupa unos 30 bytes en vez de los ~1 KB de un dict con sus cadenas.
+
+    `filtrar` recorre solo las columnas implicadas y devuelve otro `AplicacionesFDA`.
+    """
+
+    __slots__ = ('tipos', 'numeros', 'fechas', 'anteriores', 'nombres', 'laboratorios', 'formas', 'concentraciones', 'estados')
+
+    def __init__(self):
+        self.tipos = array('B')
+        self.numeros = array('I')
+        self.fechas = array('I')
+        self.anteriores = array('B')
+        self.nombres = array('I')
+        self.laboratorios = array('I')
+        self.formas = array('I')
+        self.concentraciones = array('I')
+        self.estados = array('I')
+
+    def anadir(self, numero_aplicacion: str, nombre: str = '', laboratorio: str = '', forma: str = '',
+               fecha_aprobacion: str = '', estado: str = '', concentracion: str = '', tipo: str = '',
+               anterior: Optional[bool] = None):
+        """Añadir una fila; `numero_aplicacion` puede llevar el tipo delante ('N017463').
+
+        `anterior` marca la fecha como cota ('Approved Prior to ...'); por defecto se deduce
+        del texto de `fecha_aprobacion` (las fechas ya en ISO tienen que indicarlo).
+        """
+        numero_aplicacion = (numero_aplicacion or '').strip().upper()
+        if numero_aplicacion[:1].isalpha():
+            tipo, numero_aplicacion = numero_aplicacion[0], numero_aplicacion[1:]
+        self.tipos.append(ord((tipo or ' ')[0]))
+        self.numeros.append(int(numero_aplicacion) if numero_aplicacion.isdigit() else 0)
+        self.fechas.append(_fecha_entera(fecha_aprobacion))
+        self.anteriores.append(fecha_anterior(fecha_aprobacion) if anterior is None else bool(anterior))
+        self.nombres.append(_codigo(nombre))
+        self.laboratorios.append(_codigo(laboratorio))
+        self.formas.append(_codigo(forma))
+        self.concentraciones.append(_codigo(concentracion))
+        self.estados.append(_codigo(estado.upper() if estado else estado))
+
+    def __len__(self):
+        return len(self.numeros)
+
+    # Los códigos solo valen en este proceso: al serializar (pool de procesos) viajan los textos
+    _TEXTUALES = ('nombres', 'laboratorios', 'formas', 'concentraciones', 'estados')
+
+    def __getstate__(self):
+        return {columna: ([_TEXTOS[codigo] for codigo in getattr(self, columna)]
+                          if columna in self._TEXTUALES else getattr(self, columna))
+                for columna in self.__slots__}
+
+    def __setstate__(self, estado):
+        for columna, valores in estado.items():
+            if columna in self._TEXTUALES:
+                valores = array('I', map(_codigo, valores))
+            setattr(self, columna, valores)
+
+    def fila(self, i: int) -> dict:
+        tipo = chr(self.tipos[i]).strip()
+        return {
+            'numero_aplicacion': f'{tipo}{self.numeros[i]:06d}' if self.numeros[i] else '',
+            'tipo_aplicacion': tipo,
+            'nombre': _TEXTOS[self.nombres[i]],
+            'laboratorio': _TEXTOS[self.laboratorios[i]],
+            'forma': _TEXTOS[self.formas[i]],
+            'concentracion': _TEXTOS[self.concentraciones[i]],
+            'fecha_aprobacion': _fecha_texto(self.fechas[i]),
+            'aprobada_antes': bool(self.anteriores[i]),
+            'estado_aprobacion': _TEXTOS[self.estados[i]],
+        }
+
+    def __iter__(self) -> Iterator[dict]:
+        return (self.fila(i) for i in range(len(self)))
+
+    def _seleccionar(self, mascara: Iterator[bool]) -> 'AplicacionesFDA':
+        indices = list(compress(range(len(self)), mascara))
+        subconjunto = AplicacionesFDA()
+        for columna in self.__slots__:
+            origen = getattr(self, columna)
+            setattr(subconjunto, columna, array(origen.typecode, [origen[i] for i in indices]))
+        return subconjunto
+
+    def filtrar(self, laboratorio: Optional[str] = None, tipo: Optional[str] = None,
+                desde: Optional[str] = None, hasta: Optional[str] = None,
+                estado: Optional[str] = None) -> 'AplicacionesFDA':
+        """Filas del laboratorio (subcadena, sin distinguir mayúsculas), del tipo de aplicación,
+        del estado y aprobadas entre `desde` y `hasta` (fechas en cualquier formato de `fecha_iso`).
+
+        Una fila 'Approved Prior to' entra en `hasta` si su cota no lo supera, pero nunca en
+        `desde`: no se sabe cuándo se aprobó.
+        """
+        mascara = [True] * len(self)
+
+        def aplicar(columna, condicion):
+            for i, valor in enumerate(columna):
+                if mascara[i] and not condicion(valor):
+                    mascara[i] = False
+
+        if laboratorio:
+            buscado = laboratorio.upper()
+            # La condición se resuelve una vez por texto distinto, no por fila
+            codigos = {codigo for codigo in set(self.laboratorios) if buscado in _TEXTOS[codigo].upper()}
+            aplicar(self.laboratorios, codigos.__contains__)
+        if tipo:
+            aplicar(self.tipos, ord(tipo.upper()[0]).__eq__)
+        if estado:
+            aplicar(self.estados, _CODIGOS.get(estado.upper(), -1).__eq__)
+        if desde:
+            minima = _fecha_entera(desde)
+            aplicar(self.fechas, lambda fecha: fecha and fecha >= minima)
+            aplicar(self.anteriores, (0).__eq__)
+        if hasta:
+            maxima = _fecha_entera(hasta)
+            aplicar(self.fechas, lambda fecha: fecha and fecha <= maxima)
+        return self._seleccionar(mascara)
+
+    def laboratorios_distintos(self) -> List[str]:
+        return sorted(_TEXTOS[codigo] for codigo in set(self.laboratorios) if codigo)
+
+    def mas_antigua(self) -> Optional[dict]:
+        """Primera aprobación (las filas sin fecha van al final; a igual fecha, una
+        'Approved Prior to' es anterior a la aprobada ese día)"""
+        if not len(self):
+            return None
+        return self.fila(min(range(len(self)), key=lambda i: (self.fechas[i] or 99999999, not self.anteriores[i])))
+
+    def nbytes(self) -> int:
+        return sum(getattr(self, columna).itemsize * len(self) for columna in self.__slots__)
+
+    def __repr__(self):
+        return f'<AplicacionesFDA {len(self)} filas, {len(self.laboratorios_distintos())} laboratorios>'
@@ -0,0 +1,243 @@
+import os
+import sqlite3
+from typing import Callable, List
+
+# Columnas de la tabla unificada `medicamentos` (además de id, created_at y updated_at)
+COLUMNAS_MEDICAMENTO = [
+    'nombre', 'categoria_fda', 'notas', 'trimestres_seguro', 'trimestre_1', 'trimestre_2',
+    'trimestre_3', 'fuente', 'observaciones', 'confianza_score', 'fecha_actualizacion'
+]
+
+# Columnas de `evidencias`: lo que aportó cada fuente para cada medicamento
+COLUMNAS_EVIDENCIA = [
+    'nombre', 'fuente', 'url', 'categoria_fda', 'notas', 'trimestres_seguro', 'trimestre_1',
+    'trimestre_2', 'trimestre_3', 'observaciones', 'confianza_score', 'fecha_actualizacion',
+    'contenido_hash', 'verificado_en'
+]
+
+CREATE_MEDICAMENTOS = '''
+    CREATE TABLE {tabla} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT UNIQUE NOT NULL,
+        categoria_fda TEXT,
+        notas TEXT,
+        trimestres_seguro TEXT,
+        trimestre_1 INTEGER DEFAULT 0,
+        trimestre_2 INTEGER DEFAULT 0,
+        trimestre_3 INTEGER DEFAULT 0,
+        fuente TEXT,
+        observaciones TEXT,
+        confianza_score INTEGER DEFAULT 0,
+        fecha_actualizacion TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def _columnas(conn: sqlite3.Connection, tabla: str) -> List[str]:
+    return [fila[1] for fila in conn.execute(f'PRAGMA table_info({tabla})')]
+
+
+def _v1_medicamentos_unificada(conn: sqlite3.Connection):
+    """Tabla `medicamentos` única; migra cualquiera de los esquemas antiguos de los scrapers"""
+    antiguas = _columnas(conn, 'medicamentos')
+    if not antiguas:
+        conn.execute(CREATE_MEDICAMENTOS.format(tabla='medicamentos'))
+        return
+
+    def col(nombre, defecto='NULL'):
+        return nombre if nombre in antiguas else defecto
+
+    # notas / notas_clinicas, trimestre_N / trimestres_seguro, fecha / ultima_fuente_actualizada
+    notas = ', '.join(c for c in ('notas', 'notas_clinicas') if c in antiguas) or 'NULL'
+    if ',' in notas:
+        notas = f'COALESCE({notas})'
+    fecha = col('fecha_actualizacion', 'NULL')
+    if 'ultima_fuente_actualizada' in antiguas:
+        fecha = f"COALESCE({fecha}, substr(ultima_fuente_actualizada, 1, 10))"
+
+    def trimestre(n):
+        if f'trimestre_{n}' in antiguas:
+            return f'COALESCE(trimestre_{n}, 0)'
+        if 'trimestres_seguro' in antiguas:
+            return f"(COALESCE(trimestres_seguro, '') LIKE '%trimestre {n}%')"
+        return '0'
+
+    select = {
+        'nombre': 'nombre',
+        'categoria_fda': col('categoria_fda'),
+        'notas': notas,
+        'trimestres_seguro': col('trimestres_seguro'),
+        'trimestre_1': trimestre(1),
+        'trimestre_2': trimestre(2),
+        'trimestre_3': trimestre(3),
+        'fuente': col('fuente'),
+        'observaciones': col('observaciones'),
+        'confianza_score': col('confianza_score', '0'),
+        'fecha_actualizacion': fecha,
+        'created_at': col('created_at', 'CURRENT_TIMESTAMP'),
+        'updated_at': col('updated_at', 'CURRENT_TIMESTAMP'),
+    }
+
+    conn.execute(CREATE_MEDICAMENTOS.format(tabla='medicamentos_v1'))
+    conn.execute(f'''
+        INSERT INTO medicamentos_v1 ({', '.join(select)})
+        SELECT {', '.join(select.values())} FROM medicamentos WHERE nombre IS NOT NULL
+    ''')
+    conn.execute('DROP TABLE medicamentos')
+    conn.execute('ALTER TABLE medicamentos_v1 RENAME TO medicamentos')
+
+
+def _v2_evidencias(conn: sqlite3.Connection):
+    """Datos por fuente, para no perder lo que aporta cada una al sobrescribir `medicamentos`"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS evidencias (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            fuente TEXT NOT NULL,
+            url TEXT,
+            categoria_fda TEXT,
+            notas TEXT,
+            trimestres_seguro TEXT,
+            trimestre_1 INTEGER DEFAULT 0,
+            trimestre_2 INTEGER DEFAULT 0,
+            trimestre_3 INTEGER DEFAULT 0,
+            observaciones TEXT,
+            confianza_score INTEGER DEFAULT 0,
+            fecha_actualizacion TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (nombre, fuente)
+        )
+    ''')
+
+
+def _v3_indices(conn: sqlite3.Connection):
+    """Índices para las búsquedas de la app y del validador"""
+    conn.execute('DROP INDEX IF EXISTS idx_nombre')
+    conn.execute('DROP INDEX IF EXISTS idx_categoria')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_medicamentos_nombre_nocase ON medicamentos(nombre COLLATE NOCASE)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_medicamentos_categoria ON medicamentos(categoria_fda)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_medicamentos_fecha ON medicamentos(fecha_actualizacion)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_evidencias_fuente_fecha ON evidencias(fuente, fecha_actualizacion)')
+
+
+def _v4_hash_evidencias(conn: sqlite3.Connection):
+    """Hash de la página de origen y fecha de la última comprobación, para el modo incremental"""
+    columnas = _columnas(conn, 'evidencias')
+    if 'contenido_hash' not in columnas:
+        conn.execute('ALTER TABLE evidencias ADD COLUMN contenido_hash TEXT')
+    if 'verificado_en' not in columnas:
+        conn.execute('ALTER TABLE evidencias ADD COLUMN verificado_en TEXT')
+
+
+def _v5_alias(conn: sqlite3.Connection):
+    """Tabla de alias (inglés/español/marca → ID canónico) y fusión de los duplicados existentes"""
+    from normalizacion import ALIAS_INICIALES, crear_tabla_alias, registrar_alias, fusionar_duplicados
+    crear_tabla_alias(conn)
+    for alias, canonico in ALIAS_INICIALES.items():
+        registrar_alias(conn, alias, canonico, 'inicial')
+    fusionar_duplicados(conn)
+
+
+def _v6_idiomas_busqueda(conn: sqlite3.Connection):
+    """Aciertos y fallos por medicamento e idioma, para probar primero la variante buena"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS idiomas_busqueda (
+            nombre TEXT NOT NULL,
+            fuente TEXT NOT NULL,
+            idioma TEXT NOT NULL,
+            exitos INTEGER DEFAULT 0,
+            fallos INTEGER DEFAULT 0,
+            actualizado_en TEXT,
+            PRIMARY KEY (nombre, fuente, idioma)
+        )
+    ''')
+
+
+# Migraciones en orden; la versión aplicada se guarda en PRAGMA user_version
+MIGRACIONES: List[Callable[[sqlite3.Connection], None]] = [
+    _v1_medicamentos_unificada,
+    _v2_evidencias,
+    _v3_indices,
+    _v4_hash_evidencias,
+    _v5_alias,
+    _v6_idiomas_busqueda,
+]
+
+
+def version_esquema(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def aplicar_migraciones(conn: sqlite3.Connection) -> int:
+    """Aplicar las migraciones pendientes, cada una en su transacción. Devuelve la versión final"""
+    version = version_esquema(conn)
+    for numero, migracion in enumerate(MIGRACIONES[version:], start=version + 1):
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            migracion(conn)
+            conn.execute(f'PRAGMA user_version = {numero}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return version_esquema(conn)
+
+
+def inicializar_db(db_path: str) -> int:
+    """Crear la base de datos si hace falta y dejarla en la última versión del esquema"""
+    directorio = os.path.dirname(db_path)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        return aplicar_migraciones(conn)
+    finally:
+        conn.close()
+
+
+def _upsert(tabla: str, columnas: List[str], clave: List[str]) -> str:
+    actualizar = ',\n            '.join(
+        f'{c} = COALESCE(excluded.{c}, {tabla}.{c})' for c in columnas if c not in clave
+    )
+    return f'''
+        INSERT INTO {tabla} ({', '.join(columnas)})
+        VALUES ({', '.join(':' + c for c in columnas)})
+        ON CONFLICT({', '.join(clave)}) DO UPDATE SET
+            {actualizar},
+            updated_at = CURRENT_TIMESTAMP
+    '''
+
+
+# Upserts con parámetros por nombre; un campo a None no borra lo que ya había
+UPSERT_MEDICAMENTO = _upsert('medicamentos', COLUMNAS_MEDICAMENTO, ['nombre'])
+UPSERT_EVIDENCIA = _upsert('evidencias', COLUMNAS_EVIDENCIA, ['nombre', 'fuente'])
+
+# La página no cambió: solo se registra que se comprobó
+TOCAR_EVIDENCIA = '''
+    UPDATE evidencias SET verificado_en = :verificado_en
+    WHERE nombre = :nombre AND fuente = :fuente
+'''
+
+
+def _completar(columnas: List[str], campos: dict) -> dict:
+    fila = {c: campos.get(c) for c in columnas}
+    trimestres = fila.get('trimestres_seguro') or ''
+    for n in (1, 2, 3):
+        clave = f'trimestre_{n}'
+        if clave in fila and fila[clave] is None:
+            fila[clave] = int(f'trimestre {n}' in trimestres) if trimestres else None
+    return fila
+
+
+def fila_medicamento(**campos) -> dict:
+    """Parámetros para UPSERT_MEDICAMENTO; deriva trimestre_N de trimestres_seguro si falta"""
+    return _completar(COLUMNAS_MEDICAMENTO, campos)
+
+
+def fila_evidencia(**campos) -> dict:
+    """Parámetros para UPSERT_EVIDENCIA"""
+    return _completar(COLUMNAS_EVIDENCIA, campos)
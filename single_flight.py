@@ -0,0 +1,180 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit, urlunsplit
+
+from metricas import METRICAS
+
+MEMORIA_MAX = 64 * 1024 * 1024   # bytes de respuestas que se recuerdan durante la ejecución
+PUERTOS_POR_DEFECTO = {'http': 80, 'https': 443}
+_REINTENTAR = object()           # resultado de una descarga cancelada a medias
+
+
+def clave_url(url: str, params: Optional[dict] = None) -> str:
+    """URL normalizada para reconocer la misma petición escrita de otra forma.
+
+    Esquema y host en minúsculas, sin puerto por defecto ni fragmento, ruta con el mismo
+    escapado (`%C3%A1` y `á` son lo mismo) y parámetros (los de la URL y `params`) ordenados.
+    """
+    partes = urlsplit(url)
+    esquema = partes.scheme.lower()
+    host = (partes.hostname or '').lower()
+    if partes.port and partes.port != PUERTOS_POR_DEFECTO.get(esquema):
+        host = f'{host}:{partes.port}'
+    ruta = quote(unquote(partes.path or '/'), safe="/:@!$&'()*+,;=-._~")
+    consulta = parse_qsl(partes.query, keep_blank_values=True)
+    if params:
+        pares = params.items() if isinstance(params, dict) else params
+        consulta += [(str(k), str(v)) for k, v in pares]
+    return urlunsplit((esquema, host, ruta, urlencode(sorted(consulta)), ''))
+
+
+def memorizable(estado: Optional[int]) -> bool:
+    """Estado HTTP que se puede recordar el resto de la ejecución: 2xx, 3xx y 404.
+
+    Un 403 (bloqueo anti-bot), un 5xx o un error de red pueden cambiar al reintentar
+    (p. ej. los reintentos de la frontera de crawl), así que no se recuerdan.
+    """
+    return estado is not None and (200 <= estado < 400 or estado == 404)
+
+
+def _tamano(resultado: Any) -> int:
+    if isinstance(resultado, str):
+        return len(resultado)
+    if isinstance(resultado, tuple):
+        return sum(_tamano(valor) for valor in resultado)
+    contenido = getattr(resultado, 'content', None)   # requests.Response
+    return len(contenido) if isinstance(contenido, bytes) else 64
+
+
+class SingleFlight:
+    """Una sola descarga por URL en todo el proceso.
+
+    - Peticiones concurrentes a la misma clave (ver `clave_url`) esperan a la que ya está
+      en vuelo y reciben su resultado, en vez de salir cada una a la red.
+    - Los resultados que `guardar` acepte (respuestas definitivas, no errores transitorios)
+      se recuerdan durante la ejecución, hasta MEMORIA_MAX bytes (LRU), y las repeticiones
+      se sirven de memoria.
+
+    Sirve a la vez a los scrapers async (`compartir`; las esperas en vuelo son por event
+    loop) y a los síncronos con hilos (`compartir_sync`). La caché HTTP en disco va por
+    debajo: esto evita incluso la consulta a la caché y la revalidación.
+
+    Cada llamador devuelve un tipo de resultado distinto (texto, (estado, html), Response...),
+    así que la clave empieza por su espacio de nombres: ('texto', clave_url(...)), etc.
+    """
+
+    def __init__(self, memoria_max: int = MEMORIA_MAX):
+        self.memoria_max = memoria_max
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Olvidar lo recordado (p. ej. entre ejecuciones dentro del mismo proceso)"""
+        with self._lock:
+            self.memoria: 'OrderedDict[Any, tuple]' = OrderedDict()
+            self.bytes = 0
+            self._en_vuelo: Dict[Any, asyncio.Future] = {}
+            self._en_vuelo_sync: Dict[Any, '_Vuelo'] = {}
+
+    def _recordado(self, clave):
+        with self._lock:
+            if clave in self.memoria:
+                self.memoria.move_to_end(clave)
+                METRICAS.contar('peticiones_compartidas', motivo='memoria')
+                return True, self.memoria[clave][0]
+        return False, None
+
+    def _recordar(self, clave, resultado):
+        tamano = _tamano(resultado)
+        if tamano > self.memoria_max:
+            return
+        with self._lock:
+            if clave in self.memoria:
+                self.bytes -= self.memoria.pop(clave)[1]
+            self.memoria[clave] = (resultado, tamano)
+            self.bytes += tamano
+            while self.bytes > self.memoria_max:
+                _, (_, liberado) = self.memoria.popitem(last=False)
+                self.bytes -= liberado
+
+    async def compartir(self, clave, fabrica: Callable[[], Awaitable], guardar: Callable[[Any], bool] = bool):
+        """Resultado de `fabrica()` para `clave`, descargando como mucho una vez a la vez"""
+        while True:
+            hay, resultado = self._recordado(clave)
+            if hay:
+                return resultado
+            loop = asyncio.get_running_loop()
+            futuro = self._en_vuelo.get(clave)
+            if futuro is None or futuro.get_loop() is not loop:
+                break
+            METRICAS.contar('peticiones_compartidas', motivo='en_vuelo')
+            # shield: si cancelan a quien espera, la descarga sigue para los demás
+            resultado = await asyncio.shield(futuro)
+            if resultado is not _REINTENTAR:
+                return resultado
+            # Cancelaron la tarea que descargaba: otra toma el relevo
+
+        futuro = self._en_vuelo[clave] = loop.create_future()
+        try:
+            resultado = await fabrica()
+        except asyncio.CancelledError:
+            futuro.set_result(_REINTENTAR)
+            raise
+        except Exception as e:
+            futuro.set_exception(e)
+            futuro.exception()   # marcada como recogida aunque nadie más esperase
+            raise
+        else:
+            if guardar(resultado):
+                self._recordar(clave, resultado)
+            futuro.set_result(resultado)
+            return resultado
+        finally:
+            if self._en_vuelo.get(clave) is futuro:
+                del self._en_vuelo[clave]
+
+    def compartir_sync(self, clave, fabrica: Callable[[], Any], guardar: Callable[[Any], bool] = bool):
+        """Como `compartir`, para código síncrono con varios hilos"""
+        while True:
+            hay, resultado = self._recordado(clave)
+            if hay:
+                return resultado
+            with self._lock:
+                vuelo = self._en_vuelo_sync.get(clave)
+                propio = vuelo is None
+                if propio:
+                    vuelo = self._en_vuelo_sync[clave] = _Vuelo()
+            if propio:
+                break
+            METRICAS.contar('peticiones_compartidas', motivo='en_vuelo')
+            vuelo.evento.wait()
+            if vuelo.hecho:
+                return vuelo.resultado
+            # La descarga de la que esperábamos falló: se vuelve a intentar
+
+        try:
+            vuelo.resultado = fabrica()
+            vuelo.hecho = True
+            if guardar(vuelo.resultado):
+                self._recordar(clave, vuelo.resultado)
+            return vuelo.resultado
+        finally:
+            with self._lock:
+                self._en_vuelo_sync.pop(clave, None)
+            vuelo.evento.set()
+
+
+class _Vuelo:
+    """Descarga síncrona en curso: los hilos que esperan leen aquí el resultado"""
+    __slots__ = ('evento', 'hecho', 'resultado')
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.hecho = False
+        self.resultado = None
+
+
+# Instancia del proceso: la comparten todos los scrapers e integradores
+PETICIONES = SingleFlight()
@@ -1,9 +1,11 @@
 import sqlite3
+from schema import aplicar_migraciones
 
 DB_PATH = "db/medicamentos.db"
 
 def validar_registros():
     conn = sqlite3.connect(DB_PATH)
+    aplicar_migraciones(conn)
     cursor = conn.cursor()
 
     cursor.execute("SELECT COUNT(*) FROM medicamentos")
@@ -15,7 +17,7 @@ def validar_registros():
     cursor.execute("SELECT COUNT(*) FROM medicamentos WHERE notas IS NULL OR TRIM(notas) = ''")
     sin_notas = cursor.fetchone()[0]
 
-    cursor.execute("SELECT COUNT(*) FROM medicamentos WHERE trimestre_1 = 0 AND trimestre_2 = 0 AND trimestre_3 = 0")
+    cursor.execute("SELECT COUNT(*) FROM medicamentos WHERE COALESCE(trimestre_1, 0) = 0 AND COALESCE(trimestre_2, 0) = 0 AND COALESCE(trimestre_3, 0) = 0")
     sin_trimestres = cursor.fetchone()[0]
 
     cursor.execute("SELECT COUNT(*) FROM medicamentos WHERE observaciones IS NOT NULL AND TRIM(observaciones) != ''")